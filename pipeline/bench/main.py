@@ -0,0 +1,104 @@
+import os
+import json
+import argparse
+import logging
+import platform
+
+from pipeline.utils.config import get_config
+from pipeline.utils.log import setup_logging
+from pipeline.bench.synthetic import generate_session, generate_session_from_samples
+from pipeline.bench.runner import STAGES, run_stage_isolated, compare_reports
+
+setup_logging()
+logger = logging.getLogger(__name__)
+config = get_config()
+capture_dir = os.path.abspath(config.get("capture_dir"))
+
+def generate(args):
+    session_dir = os.path.join(capture_dir, args.name)
+    if args.from_session:
+        generate_session_from_samples(
+            session_dir,
+            os.path.join(capture_dir, args.from_session),
+            args.frames,
+            storage=args.storage,
+            image_format=args.format)
+        return
+
+    generate_session(
+        session_dir,
+        args.frames,
+        size=(args.width, args.height),
+        num_objects=args.objects,
+        storage=args.storage,
+        image_format=args.format,
+        seed=args.seed)
+
+def run(args):
+    session_dir = os.path.join(capture_dir, args.capture_name)
+    report = {
+        "capture_name": args.capture_name,
+        "machine": {"platform": platform.platform(), "processor": platform.processor(), "cpu_count": os.cpu_count()},
+        "stages": {}
+    }
+
+    for stage in args.stages:
+        logger.info(f"Benchmarking stage: {stage}")
+        stage_report = run_stage_isolated(stage, session_dir)
+        report["stages"][stage] = stage_report
+        logger.info(
+            f"{stage}: {stage_report['items']} items in {stage_report['seconds']:.2f} seconds "
+            f"({stage_report['items_per_second']:.2f} items/s), latency p50 {stage_report['latency_p50']:.4f} / "
+            f"p95 {stage_report['latency_p95']:.4f} seconds, peak RSS {stage_report['peak_rss_mb']:.0f} MB"
+        )
+        if stage == "startup":
+            logger.info(
+                f"startup: --help {stage_report['help_seconds']:.2f} seconds, import {stage_report['import_seconds']:.2f} seconds, "
+                f"first frame processed after {stage_report['first_frame_seconds']:.2f} seconds"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        logger.info(f"Benchmark report saved to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+        regressions = compare_reports(report, baseline, tolerance=args.tolerance)
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        logger.info(f"No regressions against baseline: {args.baseline}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the processing pipeline on synthetic or captured sessions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="generate a synthetic capture session under capture_dir")
+    generate_parser.add_argument("name", type=str, help="name of the session subfolder to create")
+    generate_parser.add_argument("--frames", type=int, default=300, help="number of frames")
+    generate_parser.add_argument("--width", type=int, default=640, help="frame width")
+    generate_parser.add_argument("--height", type=int, default=480, help="frame height")
+    generate_parser.add_argument("--objects", type=int, default=2, help="number of moving objects")
+    generate_parser.add_argument("--storage", type=str, default="files", choices=["files", "chunked"], help="session storage")
+    generate_parser.add_argument("--format", type=str, default="png", help="image format")
+    generate_parser.add_argument("--seed", type=int, default=0, help="random seed")
+    generate_parser.add_argument("--from_session", type=str, default=None, help="name of a captured session under capture_dir to take real frames and RFID readings from instead of drawing objects, needed for the detection, analysis and end_to_end stages")
+    generate_parser.set_defaults(func=generate)
+
+    run_parser = subparsers.add_parser("run", help="benchmark stages on a session under capture_dir")
+    run_parser.add_argument("capture_name", type=str, help="name of the subfolder under capture_dir containing the session")
+    run_parser.add_argument("--stages", type=str, nargs="+", default=list(STAGES), choices=list(STAGES), help="stages to benchmark")
+    run_parser.add_argument("--output", type=str, default=None, help="path to save the JSON report, e.g. as a new baseline")
+    run_parser.add_argument("--baseline", type=str, default=None, help="path of a saved JSON report to compare against")
+    run_parser.add_argument("--tolerance", type=float, default=0.1, help="relative slowdown or growth flagged as a regression")
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
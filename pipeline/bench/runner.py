@@ -0,0 +1,229 @@
+import sys
+import time
+import random
+import resource
+import logging
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Stage runners import the pipeline lazily so each benchmark process only loads what its stage needs
+
+def _stage_report(items, latencies, seconds):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    return {
+        "items": items,
+        "seconds": seconds,
+        "items_per_second": items / seconds if seconds else 0.0,
+        "latency_p50": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "latency_p95": float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+    }
+
+def _track_results(capture_dir, frame_store):
+    from pipeline.process.tracking import deepsort
+    return deepsort(capture_dir, frame_store=frame_store)
+
+def _require_tracks(stage, objs, capture_dir):
+    # A stage that sees no tracks only measures its overhead, which would make a meaningless baseline
+    if not objs:
+        raise RuntimeError(
+            f"The {stage} benchmark found no tracks in {capture_dir}. Sessions with drawn objects only exercise "
+            f"tracking; generate the session from real frames with --from_session."
+        )
+
+def _bench_per_track(objs, stage_fn):
+    # Latency per frame is the time spent on a track spread over the frames of that track
+    latencies = []
+    start_time = time.time()
+    for obj in objs:
+        track_start_time = time.time()
+        stage_fn([obj])
+        frames = max(1, len(obj["images"]))
+        latencies.extend([(time.time() - track_start_time) / frames] * frames)
+    return _stage_report(len(latencies), latencies, time.time() - start_time)
+
+def bench_tracking(capture_dir):
+    from pipeline.utils.frame_store import FrameStore, FramePrefetcher
+    from pipeline.utils.session_store import open_session
+    from pipeline.process.tracking import TrackingSession, resolve_decode_reduction
+    from pipeline.process.models import load_face_model
+
+    model = load_face_model()
+    frame_store = FrameStore(open_session(capture_dir))
+    decode_reduction = resolve_decode_reduction(frame_store, model)
+    session = TrackingSession(model=model, decode_reduction=decode_reduction)
+
+    latencies = []
+    start_time = time.time()
+    # Frame latencies include the time spent waiting on the prefetcher for each frame
+    frame_start_time = time.time()
+    for image_name, frame in FramePrefetcher(frame_store, frame_store.names(), decode_reduction):
+        if frame is not None:
+            session.update(image_name, frame)
+        latencies.append(time.time() - frame_start_time)
+        frame_start_time = time.time()
+
+    return _stage_report(len(latencies), latencies, time.time() - start_time)
+
+def bench_detection(capture_dir):
+    from pipeline.utils.frame_store import FrameStore
+    from pipeline.utils.session_store import open_session
+    from pipeline.process.detection import detect_objects
+    from pipeline.process.models import load_detection_model
+
+    frame_store = FrameStore(open_session(capture_dir))
+    tracking_results = _track_results(capture_dir, frame_store)
+    _require_tracks("detection", tracking_results, capture_dir)
+    model = load_detection_model()
+
+    return _bench_per_track(tracking_results, lambda objs: detect_objects(objs, capture_dir, frame_store=frame_store, model=model))
+
+def bench_analysis(capture_dir):
+    from pipeline.utils.frame_store import FrameStore
+    from pipeline.utils.session_store import open_session
+    from pipeline.process.detection import detect_objects
+    from pipeline.process.analysis import analyze_detections
+    from pipeline.process.models import load_ocr_model
+
+    frame_store = FrameStore(open_session(capture_dir))
+    detection_results = detect_objects(_track_results(capture_dir, frame_store), capture_dir, frame_store=frame_store)
+    _require_tracks("analysis", detection_results, capture_dir)
+    load_ocr_model()
+
+    return _bench_per_track(detection_results, lambda objs: analyze_detections(objs, capture_dir, frame_store=frame_store))
+
+def bench_ocr_correct(capture_dir, registry_size=20000, queries=2000, batch_size=64):
+    from pipeline.process.matcher import EartagMatcher
+
+    rng = random.Random(0)
+    registry = [f"{rng.randrange(10 ** 6):0{rng.choice([4, 5, 6])}d}" for _ in range(registry_size)]
+    detected_values = [
+        "".join(char if rng.random() > 0.2 else rng.choice("0123456789") for char in rng.choice(registry))
+        for _ in range(queries)
+    ]
+
+    # Queries are corrected in batches the way analysis corrects the eartag crops of a round
+    matcher = EartagMatcher(registry)
+    latencies = []
+    start_time = time.time()
+    for start in range(0, len(detected_values), batch_size):
+        batch = detected_values[start:start + batch_size]
+        batch_start_time = time.time()
+        matcher.match_batch(batch, max_distance=3)
+        latencies.extend([(time.time() - batch_start_time) / len(batch)] * len(batch))
+
+    return _stage_report(len(latencies), latencies, time.time() - start_time)
+
+def bench_end_to_end(capture_dir):
+    from pipeline.process.main import run_pipeline
+    from pipeline.process.models import warm_up_models
+
+    warm_up_models()
+    start_time = time.time()
+    analysis_results, frame_store = run_pipeline(capture_dir, use_checkpoints=False)
+    seconds = time.time() - start_time
+    _require_tracks("end_to_end", analysis_results, capture_dir)
+
+    # Stages overlap across frames end to end, so only the mean latency per frame is meaningful
+    frames = len(frame_store.names())
+    return _stage_report(frames, [seconds / frames] * frames if frames else [], seconds)
+
+# Printed by the first frame probe once the first frame went through tracking
+_FIRST_FRAME_MARKER = "first frame processed"
+_startup_runs = 3
+
+def first_frame_probe(capture_dir):
+    # Entry point of a fresh interpreter: imports the processing entry point, loads the face model and
+    # tracks the first frame of the session, as a processing run does before anything else
+    import pipeline.process.main
+    from pipeline.utils.frame_store import FrameStore
+    from pipeline.utils.session_store import open_session
+    from pipeline.process.tracking import TrackingSession, resolve_decode_reduction
+    from pipeline.process.models import load_face_model
+
+    model = load_face_model()
+    frame_store = FrameStore(open_session(capture_dir))
+    decode_reduction = resolve_decode_reduction(frame_store, model)
+    session = TrackingSession(model=model, decode_reduction=decode_reduction)
+
+    image_name = frame_store.names()[0]
+    session.update(image_name, frame_store.get(image_name, decode_reduction))
+    print(_FIRST_FRAME_MARKER, flush=True)
+
+def _time_command(args, marker=None):
+    # Wall time from starting a fresh interpreter until it exits, or until it prints the marker line
+    start_time = time.time()
+    with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as process:
+        for line in process.stdout:
+            if marker is not None and line.strip() == marker:
+                elapsed = time.time() - start_time
+                process.kill()
+                return elapsed
+        if process.wait() != 0:
+            raise RuntimeError(f"Startup benchmark command failed: {' '.join(args)}")
+    if marker is not None:
+        raise RuntimeError(f"Startup benchmark command exited before printing {marker!r}: {' '.join(args)}")
+    return time.time() - start_time
+
+def bench_startup(capture_dir):
+    # Cold start of the processing entry point in fresh interpreters: --help, importing it, and the time until
+    # the first frame is tracked. Latencies are the time to first frame of each run.
+    commands = {
+        "help": [sys.executable, "-m", "pipeline.process.main", "--help"],
+        "import": [sys.executable, "-c", "import pipeline.process.main"],
+        "first_frame": [sys.executable, "-c", f"from pipeline.bench.runner import first_frame_probe; first_frame_probe({capture_dir!r})"]
+    }
+
+    timings = {name: [] for name in commands}
+    start_time = time.time()
+    for _ in range(_startup_runs):
+        for name, args in commands.items():
+            timings[name].append(_time_command(args, _FIRST_FRAME_MARKER if name == "first_frame" else None))
+
+    report = _stage_report(_startup_runs, timings["first_frame"], time.time() - start_time)
+    for name, seconds in timings.items():
+        report[f"{name}_seconds"] = float(np.median(seconds))
+    return report
+
+STAGES = {
+    "tracking": bench_tracking,
+    "detection": bench_detection,
+    "analysis": bench_analysis,
+    "ocr_correct": bench_ocr_correct,
+    "end_to_end": bench_end_to_end,
+    "startup": bench_startup
+}
+
+def _run_stage(stage, capture_dir):
+    from pipeline.utils.log import setup_logging
+
+    setup_logging(logging.WARNING)
+    report = STAGES[stage](capture_dir)
+
+    # ru_maxrss is reported in kilobytes on Linux
+    report["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return report
+
+def run_stage_isolated(stage, capture_dir):
+    # Each stage runs in a fresh process so its peak RSS isn't inflated by earlier stages
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_run_stage, stage, capture_dir).result()
+
+def compare_reports(report, baseline, tolerance=0.1):
+    # Flags stages that got slower or bigger than the baseline by more than the tolerance
+    regressions = []
+    for stage, current in report["stages"].items():
+        previous = baseline["stages"].get(stage)
+        if previous is None:
+            continue
+
+        if current["items_per_second"] < previous["items_per_second"] * (1 - tolerance):
+            regressions.append(f"{stage}: throughput {previous['items_per_second']:.2f} -> {current['items_per_second']:.2f} items/s")
+        for metric in ("latency_p50", "latency_p95", "peak_rss_mb"):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{stage}: {metric} {previous[metric]:.4f} -> {current[metric]:.4f}")
+    return regressions
@@ -0,0 +1,98 @@
+import os
+import logging
+
+import numpy as np
+import cv2
+
+from pipeline.capture.mock_image import render_mock_image
+from pipeline.utils.rfid_log import RfidLogWriter, RFID_LOG_FILENAME, load_rfid_readings
+from pipeline.utils.session_store import open_session, open_session_writer
+
+logger = logging.getLogger(__name__)
+
+class _MovingObject:
+    # A face-like blob carrying an eartag number, crossing the frame at constant speed and bouncing off the borders
+    def __init__(self, rng, size, eartag_number):
+        width, height = size
+        self.radius = int(rng.integers(min(width, height) // 10, min(width, height) // 5))
+        self.position = rng.uniform([self.radius, self.radius], [width - self.radius, height - self.radius])
+        self.velocity = rng.uniform(-1, 1, size=2) * max(width, height) / 60
+        self.color = tuple(int(c) for c in rng.integers(60, 200, size=3))
+        self.eartag_number = eartag_number
+
+    def step(self, size):
+        self.position += self.velocity
+        for axis, limit in enumerate(size):
+            if not self.radius <= self.position[axis] <= limit - self.radius:
+                self.velocity[axis] = -self.velocity[axis]
+                self.position[axis] = np.clip(self.position[axis], self.radius, limit - self.radius)
+
+    def draw(self, image):
+        cx, cy = (int(v) for v in self.position)
+        r = self.radius
+        cv2.ellipse(image, (cx, cy), (r, int(r * 1.3)), 0, 0, 360, self.color, -1)
+
+        # Muzzle and eartag patches
+        cv2.ellipse(image, (cx, cy + r // 2), (r // 2, r // 3), 0, 0, 360, (40, 40, 40), -1)
+        tag_x, tag_y = cx + r // 2, cy - r
+        cv2.rectangle(image, (tag_x, tag_y), (tag_x + r, tag_y + r // 2), (0, 220, 255), -1)
+        cv2.putText(image, self.eartag_number, (tag_x + 2, tag_y + r // 3), cv2.FONT_HERSHEY_SIMPLEX, r / 120, (0, 0, 0), 1, cv2.LINE_AA)
+
+def generate_session(session_dir, num_frames, size=(640, 480), num_objects=2, storage="files", image_format="png", seed=0):
+    # Writes a capture session of mock camera frames with moving objects, and RFID readings listing the
+    # eartag numbers of the objects in view, in the same layout capture produces. The drawn objects exercise
+    # decoding, tracking and storage, but the face and detection models don't find anything in them, so
+    # benchmarks of the later stages need a session generated from real sample frames.
+    rng = np.random.default_rng(seed)
+    os.makedirs(session_dir, exist_ok=True)
+
+    session_writer = open_session_writer(session_dir, storage, image_format)
+    rfid_log = RfidLogWriter(os.path.join(session_dir, RFID_LOG_FILENAME))
+    objects = [_MovingObject(rng, size, f"{rng.integers(1, 10000):04d}") for _ in range(num_objects)]
+
+    for counter in range(1, num_frames + 1):
+        capture_id = f"{counter:04d}"
+        image = render_mock_image(counter, size)
+
+        for obj in objects:
+            obj.step(size)
+            obj.draw(image)
+
+        session_writer.write(f"{capture_id}.{image_format}", image)
+        rfid_log.append(capture_id, [obj.eartag_number for obj in objects])
+
+    session_writer.close()
+    rfid_log.close()
+    logger.info(f"Generated synthetic session with {num_frames} frames of {size[0]}x{size[1]} and {num_objects} objects: {session_dir}")
+    return [obj.eartag_number for obj in objects]
+
+def generate_session_from_samples(session_dir, sample_dir, num_frames, storage="files", image_format="png"):
+    # Writes a capture session of num_frames frames taken from a captured sample session, which is played
+    # forwards and backwards until enough frames are written so tracks continue across the turns. Each frame
+    # keeps the RFID readings of its sample capture.
+    sample_reader = open_session(sample_dir)
+    sample_names = sample_reader.names()
+    if not sample_names:
+        raise ValueError(f"No frames found in sample session: {sample_dir}")
+    sample_readings = load_rfid_readings(sample_dir)
+
+    order = sample_names + sample_names[-2:0:-1] if len(sample_names) > 1 else sample_names
+    os.makedirs(session_dir, exist_ok=True)
+
+    session_writer = open_session_writer(session_dir, storage, image_format)
+    rfid_log = RfidLogWriter(os.path.join(session_dir, RFID_LOG_FILENAME))
+
+    for counter in range(1, num_frames + 1):
+        capture_id = f"{counter:04d}"
+        sample_name = order[(counter - 1) % len(order)]
+        image = sample_reader.read(sample_name)
+        if image is None:
+            raise IOError(f"Failed to read sample frame {sample_name} from {sample_dir}")
+
+        session_writer.write(f"{capture_id}.{image_format}", image)
+        rfid_log.append(capture_id, sample_readings.get(os.path.splitext(sample_name)[0], []))
+
+    session_writer.close()
+    rfid_log.close()
+    sample_reader.close()
+    logger.info(f"Generated session with {num_frames} frames from {len(sample_names)} sample frames of {sample_dir}: {session_dir}")
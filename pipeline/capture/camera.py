@@ -1,12 +1,10 @@
 import logging
 
-import numpy as np
-import cv2
-
-from pipeline.utils.config import load_yaml_config
+from pipeline.utils.config import get_config
+from pipeline.capture.mock_image import render_mock_image
 
 logger = logging.getLogger(__name__)
-config = load_yaml_config("pipeline/config.yaml")
+config = get_config()
 use_mock_camera = config.get("use_mock_camera", False)
 
 if not use_mock_camera:
@@ -38,9 +36,6 @@ def capture_image(picam2):
     if use_mock_camera:
         # Return a mock image
         _mock_camera_frame_number += 1
-        image = np.zeros((480, 640, 3), dtype=np.uint8)
-        text = f"Mock Image {_mock_camera_frame_number}"
-        cv2.putText(image, text, (220, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-        return image    
+        return render_mock_image(_mock_camera_frame_number)
     
     return picam2.capture_array()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import time
+import queue
+import logging
+import threading
+
+from pipeline.utils.config import get_config
+from pipeline.utils import metrics
+
+logger = logging.getLogger(__name__)
+config = get_config()
+image_writer_workers = config.get("image_writer_workers", 2)
+image_writer_queue_size = config.get("image_writer_queue_size", 32)
+image_writer_full_policy = config.get("image_writer_full_policy", "block")
+
+FULL_POLICIES = ("block", "drop")
+
+# Encodes and saves captured images through a session writer on worker threads so the capture
+# loop is not held up by image encoding. When the queue is full, submit either blocks or drops the frame.
+class ImageWriter:
+    def __init__(self, session_writer, num_workers=None, max_queue_size=None, full_policy=None):
+        self.session_writer = session_writer
+        self.full_policy = full_policy or image_writer_full_policy
+        if self.full_policy not in FULL_POLICIES:
+            raise ValueError(f"Unknown image writer full policy: {self.full_policy} (expected one of {FULL_POLICIES})")
+
+        self._queue = queue.Queue(maxsize=max_queue_size or image_writer_queue_size)
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self.total_encode_time = 0.0
+        self.max_encode_time = 0.0
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"image-writer-{i}", daemon=True)
+            for i in range(num_workers or image_writer_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, name, image):
+        if self.full_policy == "block":
+            self._queue.put((name, image))
+        else:
+            try:
+                self._queue.put_nowait((name, image))
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                metrics.inc("capture_frames_dropped_total")
+                logger.warning(f"Image writer queue full, dropped frame: {name}")
+                return False
+
+        with self._lock:
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            name, image = item
+            encode_start_time = time.time()
+            try:
+                success = self.session_writer.write(name, image)
+            except Exception as e:
+                logger.exception(f"Error while writing image {name}: {e}")
+                success = False
+            encode_time = time.time() - encode_start_time
+
+            with self._lock:
+                if success:
+                    self.written += 1
+                else:
+                    self.failed += 1
+                self.total_encode_time += encode_time
+                self.max_encode_time = max(self.max_encode_time, encode_time)
+
+            metrics.inc("capture_frames_written_total" if success else "capture_frames_failed_total")
+            if not success:
+                logger.warning(f"Failed to write image: {name}")
+
+    def stats(self):
+        with self._lock:
+            completed = self.written + self.failed
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "written": self.written,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "avg_encode_time": self.total_encode_time / completed if completed else 0.0,
+                "max_encode_time": self.max_encode_time,
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Image writer: queue depth {stats['queue_depth']} (max {stats['max_queue_depth']}), "
+            f"{stats['written']} written, {stats['dropped']} dropped, {stats['failed']} failed, "
+            f"encode latency avg {stats['avg_encode_time']:.4f} / max {stats['max_encode_time']:.4f} seconds"
+        )
+
+    def close(self):
+        # Pending images are written before the workers stop
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self.session_writer.close()
@@ -1,4 +1,5 @@
 import os
+import argparse
 import logging
 import time
 import json
@@ -6,61 +7,116 @@ import json
 import cv2
 
 from pipeline.utils.log import setup_logging
-from pipeline.utils.config import load_yaml_config
+from pipeline.utils.config import get_config
+from pipeline.utils import metrics
+from pipeline.utils.rfid_log import RfidLogWriter, RFID_LOG_FILENAME
+from pipeline.utils.session_store import open_session_writer
 from pipeline.capture.camera import initialize_camera, capture_image
 from pipeline.capture.rfid_reader import initialize_rfid_reader, get_rfid_readings
+from pipeline.capture.image_writer import ImageWriter
 
 setup_logging()
 logger = logging.getLogger(__name__)
-config = load_yaml_config("pipeline/config.yaml")
+config = get_config()
 capture_dir = os.path.abspath(config.get("capture_dir"))
 capture_image_format = config.get("capture_image_format")
+capture_storage = config.get("capture_storage", "files")
 capture_fps = config.get("capture_fps", 1)
+live_processing = config.get("live_processing", False)
+archive_captures = config.get("archive_captures", True)
+image_writer_log_interval = config.get("image_writer_log_interval", 100)
 
 def main():
+    parser = argparse.ArgumentParser(description="Capture camera images and RFID readings")
+    parser.add_argument("--live", action="store_true", default=live_processing, help="flag to process captured frames in-process while capturing")
+    parser.add_argument("--no_archive", dest="archive", action="store_false", default=archive_captures, help="flag to skip saving captured images to disk")
+
+    args = parser.parse_args()
+
     camera = initialize_camera()
     rfid_reader = initialize_rfid_reader()
 
     # Create timestamped session directory
     timestamp_ms = str(int(time.time() * 1000))
     session_dir = os.path.abspath(os.path.join(capture_dir, timestamp_ms))
-    images_dir = os.path.join(session_dir, "images")
-    rfid_readings_path = os.path.join(session_dir, "rfid_readings.json")
+    rfid_readings_path = os.path.join(session_dir, RFID_LOG_FILENAME)
+    live_results_path = os.path.join(session_dir, "live_results.jsonl")
 
-    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(session_dir, exist_ok=True)
     logger.info(f"Captured data will be saved to {session_dir}")
-    
+
+    if metrics.registry.enabled and metrics.metrics_port:
+        metrics.start_metrics_server()
+
     counter = 0
-    rfid_data = {}
+    rfid_log = RfidLogWriter(rfid_readings_path)
+    session_writer = open_session_writer(session_dir, capture_storage, capture_image_format) if args.archive else None
+    image_writer = ImageWriter(session_writer) if session_writer is not None else None
+
+    live_processor = None
+    if args.live:
+        # Imported here so plain capture does not load the processing models
+        from pipeline.process.live import LiveProcessor
+
+        def save_live_result(result):
+            with open(live_results_path, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+        # Frames evicted from the live frame cache are read back through the session writer, which already
+        # knows about frames that aren't in an index on disk yet
+        session_reader = session_writer.open_reader() if session_writer is not None else None
+        live_processor = LiveProcessor(session_dir, on_result=save_live_result, session_reader=session_reader)
+        logger.info(f"Live processing enabled, results will be saved to {live_results_path}")
 
     # Calculate delay based on capture_fps
     delay = int(1000 / capture_fps)
     
     while True:
+        frame_start_time = time.time()
+
         # Define a counter based id to uniquely identify the current capture
         counter += 1
         capture_id = f"{counter:04d}"
 
-        image = capture_image(camera)
+        with metrics.timed("capture_frame_seconds"):
+            image = capture_image(camera)
+        metrics.inc("captured_frames_total")
         rfid_readings = get_rfid_readings(rfid_reader)
 
         # Save image
         image_filename = f"{capture_id}.{capture_image_format}"
-        image_path = os.path.join(images_dir, image_filename)
-        cv2.imwrite(image_path, image)
+        if image_writer is not None:
+            image_writer.submit(image_filename, image)
+
+            if counter % image_writer_log_interval == 0:
+                image_writer.log_stats()
+
+        if live_processor is not None:
+            live_processor.process_frame(image_filename, image)
 
         # Save RFID readings
-        rfid_data[capture_id] = rfid_readings
-        with open(rfid_readings_path, "w") as f:
-            json.dump(rfid_data, f, indent=4)
+        rfid_log.append(capture_id, rfid_readings)
 
         # Display image
         cv2.imshow("Image", image)
-        
-        if cv2.waitKey(delay) & 0xFF == ord('q'):
+
+        # Wait only for what is left of the frame interval after capturing and saving
+        elapsed_ms = int((time.time() - frame_start_time) * 1000)
+        if cv2.waitKey(max(1, delay - elapsed_ms)) & 0xFF == ord('q'):
             break
 
-    cv2.destroyAllWindows()      
+    cv2.destroyAllWindows()
+    rfid_log.close()
+
+    # Remaining live tracks may still read frames back through the session writer, so they are processed first
+    if live_processor is not None:
+        live_processor.close()
+
+    if image_writer is not None:
+        image_writer.close()
+        image_writer.log_stats()
+
+    metrics.save_snapshot(os.path.join(session_dir, metrics.METRICS_FILENAME))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,10 @@
+import numpy as np
+import cv2
+
+# Kept apart from the camera module, which needs picamera2 unless the mock camera is used
+def render_mock_image(frame_number, size=(640, 480)):
+    width, height = size
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    text = f"Mock Image {frame_number}"
+    cv2.putText(image, text, (width // 2 - 100, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+    return image
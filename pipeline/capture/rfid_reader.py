@@ -1,9 +1,9 @@
 import logging
 
-from pipeline.utils.config import load_yaml_config
+from pipeline.utils.config import get_config
 
 logger = logging.getLogger(__name__)
-config = load_yaml_config("pipeline/config.yaml")
+config = get_config()
 use_mock_rfid_reader = config.get("use_mock_rfid_reader", False)
 
 def initialize_rfid_reader():
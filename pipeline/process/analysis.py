@@ -1,64 +1,160 @@
-import os
+import hashlib
 import logging
 from collections import Counter
 
-import cv2
-
-from pipeline.process.ocr import perform_ocr
+from pipeline.process.ocr import perform_batch_ocr, correct_ocr_texts
+from pipeline.process.rfid_index import load_rfid_index, rfid_candidates
+from pipeline.process.results import ResultStore
+from pipeline.utils.config import get_config
+from pipeline.utils.frame_store import FrameStore
+from pipeline.utils.session_store import open_session
 
 logger = logging.getLogger(__name__)
+config = get_config()
+key_frame_vote_margin = config.get("key_frame_vote_margin", 0)
+key_frame_ocr_round_size = config.get("key_frame_ocr_round_size", 2)
+
+def _crop_key(image):
+    return (image.shape, hashlib.sha1(image.tobytes()).hexdigest())
+
+def _correct_per_track(crop_keys, eartag_crops, raw_texts, track_matchers):
+    # Texts are corrected against the tags read near each track, in one batch per distinct candidate set.
+    # Tracks without nearby readings have no matcher and fall back to the expected numbers of the herd.
+    positions_by_matcher = {}
+    for pos, (track_id, _, _) in enumerate(eartag_crops):
+        positions_by_matcher.setdefault(track_matchers.get(track_id), []).append(pos)
+
+    texts = [None] * len(eartag_crops)
+    for matcher, positions in positions_by_matcher.items():
+        matches = correct_ocr_texts([raw_texts[crop_keys[pos]] for pos in positions], matcher)
+        for pos, text in zip(positions, matches):
+            texts[pos] = text
+    return texts
+
+def _run_eartag_ocr(eartag_crops, ocr_model, track_matchers=None):
+    # Identical crops (e.g. repeated frames of a stationary animal) are recognized only once
+    crop_keys = [_crop_key(crop) for _, _, crop in eartag_crops]
+    unique_crops = {}
+    for key, (_, _, crop) in zip(crop_keys, eartag_crops):
+        unique_crops.setdefault(key, crop)
+
+    logger.info(f"Running OCR on {len(unique_crops)} unique eartag crops out of {len(eartag_crops)}")
+    recognized = dict(zip(unique_crops, perform_batch_ocr(list(unique_crops.values()), ocr_model=ocr_model, correct=track_matchers is None)))
+    if track_matchers is None:
+        texts = [recognized[key] for key in crop_keys]
+    else:
+        texts = _correct_per_track(crop_keys, eartag_crops, recognized, track_matchers)
+
+    for text, (track_id, detection, _) in zip(texts, eartag_crops):
+        detection["eartag_number"] = text
+        logger.info(f"Track {track_id} eartag number OCR: {text}")
+
+def _vote_margin(votes):
+    counts = [count for _, count in votes.most_common(2)]
+    return counts[0] - (counts[1] if len(counts) > 1 else 0) if counts else 0
+
+def _run_eartag_ocr_rounds(track_eartag_crops, ocr_model, vote_margin, round_size, track_matchers=None):
+    # Crops of each track are recognized best key frame first, a few per track per round, with all tracks
+    # still voting batched together. A track stops once its leading number is vote_margin votes ahead.
+    pending = [list(crops) for crops in track_eartag_crops if crops]
+    votes = [Counter() for _ in pending]
+    total_crops = sum(len(crops) for crops in pending)
+    recognized_crops = 0
+
+    while pending:
+        round_crops = []
+        for crops, track_votes in zip(pending, votes):
+            round_crops.append((crops[:round_size], track_votes))
+            del crops[:round_size]
+
+        _run_eartag_ocr([crop for crops, _ in round_crops for crop in crops], ocr_model, track_matchers)
+        recognized_crops += sum(len(crops) for crops, _ in round_crops)
+
+        for crops, track_votes in round_crops:
+            track_votes.update(detection["eartag_number"] for _, detection, _ in crops if detection["eartag_number"] != "")
+
+        remaining = [(crops, track_votes) for crops, track_votes in zip(pending, votes) if crops and _vote_margin(track_votes) < vote_margin]
+        pending = [crops for crops, _ in remaining]
+        votes = [track_votes for _, track_votes in remaining]
+
+    logger.info(f"Eartag votes settled after OCR on {recognized_crops} of {total_crops} eartag crops")
+
+def _track_matchers(detection_results, rfid_index):
+    track_matchers = {}
+    for obj in detection_results:
+        matcher = rfid_index.matcher_for([image_entry["name"] for image_entry in obj["images"]])
+        track_matchers[obj["id"]] = matcher
+        if matcher is not None:
+            logger.info(f"Track {obj['id']} eartag candidates from RFID: {len(matcher)}")
+        else:
+            logger.info(f"No RFID readings near Track {obj['id']}, correcting against all expected eartag numbers")
+    return track_matchers
 
-from collections import Counter
+def analyze_detections(detection_results, capture_dir, frame_store=None, ocr_model=None, vote_margin=None, rfid_index=None, gallery_crops=None):
+    vote_margin = vote_margin if vote_margin is not None else key_frame_vote_margin
 
-def analyze_detections(detection_results, capture_dir):
-    images_dir = os.path.join(capture_dir, "images")
+    if frame_store is None:
+        frame_store = FrameStore(open_session(capture_dir))
+
+    # OCR text of each track is corrected against the RFID tags read around the time it was tracked
+    if rfid_index is None and rfid_candidates:
+        rfid_index = load_rfid_index(capture_dir)
+    track_matchers = _track_matchers(detection_results, rfid_index) if rfid_index is not None else None
 
     logger.info("Starting analysis of detected objects")
 
+    # Eartag crops of the whole session are gathered first and recognized together in batches
+    track_eartag_crops = []
+    track_eartag_detections = []
+    track_muzzle_clean_status = []
+
+    # Track and detection crops are cut straight from the frames through the columnar results
+    result_store = ResultStore.from_results(detection_results)
+    image_row = -1
+
     for obj in detection_results:
         track_id = obj["id"]
         
-        # Initialize lists to store eartag_number and is_muzzle_clean for later analysis
-        eartag_numbers = []
+        # Initialize lists to store eartag detections and is_muzzle_clean for later analysis
+        eartag_detections = []
         muzzle_clean_status = []
+        eartag_crops = []
+        track_eartag_crops.append(eartag_crops)
+        track_eartag_detections.append(eartag_detections)
+        track_muzzle_clean_status.append(muzzle_clean_status)
+        if gallery_crops is not None:
+            gallery_crops.add_track(track_id)
 
         for image_entry in obj["images"]:
+            image_row += 1
             image_name = image_entry["name"]
-            bbox_track = image_entry.get("track_bbox", None)
             detections = image_entry.get("detections", [])
 
-            image_path = os.path.join(images_dir, image_name)
-            original_img = cv2.imread(image_path)
-            if original_img is None:
-                logger.warning(f"Could not load original image: {image_path}")
+            # Frames without detections, e.g. frames that were not key frames, are only read for the first
+            # thumbnails of the track gallery
+            needs_track_crop = gallery_crops is not None and gallery_crops.needs_track_crop(track_id)
+            if not detections and not needs_track_crop:
                 continue
 
-            h, w = original_img.shape[:2]
+            frame = frame_store.get(image_name)
+            if frame is None:
+                logger.warning(f"Could not load original image: {image_name}")
+                continue
 
-            if bbox_track:
-                x1 = max(0, bbox_track["x1"])
-                y1 = max(0, bbox_track["y1"])
-                x2 = min(w, bbox_track["x2"])
-                y2 = min(h, bbox_track["y2"])
-                track_crop = original_img[y1:y2, x1:x2]
-            else:
-                track_crop = original_img
+            # Thumbnails for the track gallery are kept while the frame is at hand
+            if needs_track_crop:
+                gallery_crops.add_track_crop(track_id, image_name, result_store.track_crop(image_row, frame))
 
-            for det_idx, detection in enumerate(detections):
+            for det_idx, (detection, det_img) in enumerate(zip(detections, result_store.detection_crops(image_row, frame))):
                 cls_name = detection["class"].lower()
-                bbox = detection["bbox"]
-
-                dx1 = max(0, bbox["x1"])
-                dy1 = max(0, bbox["y1"])
-                dx2 = max(dx1, bbox["x2"])
-                dy2 = max(dy1, bbox["y2"])
-
-                det_img = track_crop[dy1:dy2, dx1:dx2]
 
                 if det_img.size == 0:
                     logger.warning(f"Empty detection crop for track {track_id}, image {image_name}, detection {det_idx}")
                     continue
 
+                if gallery_crops is not None:
+                    gallery_crops.add_detection_crop(track_id, detection, det_img)
+
                 if cls_name == "muzzle":
                     # TODO: Add muzzle cleanliness classification logic
                     is_muzzle_clean = True
@@ -69,13 +165,23 @@ def analyze_detections(detection_results, capture_dir):
                     muzzle_clean_status.append(detection["is_muzzle_clean"])
 
                 elif cls_name == "eartag" or cls_name == "tag":
-                    text = perform_ocr(det_img)
-                    detection["eartag_number"] = text
-                    logger.info(f"Track {track_id} eartag number OCR: {text}")
+                    # Copy the crop so the pending OCR queue does not keep whole frames alive
+                    eartag_crops.append((image_entry.get("key_frame_score", 0.0), track_id, detection, det_img.copy()))
+
+                    # Track eartag detections for later analysis
+                    eartag_detections.append(detection)
+
+    # Best key frames first; the sort is stable so unscored frames keep their frame order
+    track_eartag_crops = [[crop[1:] for crop in sorted(crops, key=lambda crop: -crop[0])] for crops in track_eartag_crops]
+
+    if vote_margin > 0:
+        _run_eartag_ocr_rounds(track_eartag_crops, ocr_model, vote_margin, key_frame_ocr_round_size, track_matchers)
+    elif any(track_eartag_crops):
+        _run_eartag_ocr([crop for crops in track_eartag_crops for crop in crops], ocr_model, track_matchers)
 
-                    # Track eartag numbers for later analysis
-                    if text != "":
-                        eartag_numbers.append(text)
+    for obj, eartag_detections, muzzle_clean_status in zip(detection_results, track_eartag_detections, track_muzzle_clean_status):
+        # Detections skipped after the vote settled have no eartag number
+        eartag_numbers = [detection["eartag_number"] for detection in eartag_detections if detection.get("eartag_number", "") != ""]
 
         # After processing all detections for the track, calculate the most common values
         if eartag_numbers:
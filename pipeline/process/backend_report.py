@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import argparse
+import logging
+
+import numpy as np
+
+from pipeline.utils.config import get_config
+from pipeline.utils.log import setup_logging
+from pipeline.utils.session_store import open_session
+from pipeline.process.backends import load_yolo, INFERENCE_BACKENDS
+from pipeline.process.models import FACE_MODEL_FILENAME, DETECTION_MODEL_FILENAME
+
+setup_logging()
+logger = logging.getLogger(__name__)
+config = get_config()
+models_dir = os.path.abspath(config.get("models_dir"))
+
+def _predict(model, image):
+    start_time = time.time()
+    boxes = model(image, verbose=False)[0].boxes
+    latency = time.time() - start_time
+    return boxes.xyxy.cpu().numpy().reshape(-1, 4), boxes.cls.cpu().numpy().astype(int), latency
+
+def _iou_matrix(boxes_a, boxes_b):
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+def _agreement(baseline, candidate, iou_threshold):
+    # Fraction of boxes matched one-to-one between the two backends with the same class and IoU above the threshold
+    boxes_a, classes_a, _ = baseline
+    boxes_b, classes_b, _ = candidate
+    if len(boxes_a) == 0 and len(boxes_b) == 0:
+        return 1.0
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return 0.0
+
+    iou = _iou_matrix(boxes_a, boxes_b)
+    iou[classes_a[:, None] != classes_b[None, :]] = 0
+
+    matches = 0
+    while True:
+        a, b = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[a, b] < iou_threshold:
+            break
+        matches += 1
+        iou[a, :] = 0
+        iou[:, b] = 0
+
+    return matches / max(len(boxes_a), len(boxes_b))
+
+def _summarize(baseline_latencies, candidate_latencies, agreements):
+    baseline_latencies = np.asarray(baseline_latencies)
+    candidate_latencies = np.asarray(candidate_latencies)
+    return {
+        "frames": len(agreements),
+        "baseline_latency": {
+            "mean": float(baseline_latencies.mean()),
+            "p50": float(np.percentile(baseline_latencies, 50)),
+            "p95": float(np.percentile(baseline_latencies, 95))
+        },
+        "candidate_latency": {
+            "mean": float(candidate_latencies.mean()),
+            "p50": float(np.percentile(candidate_latencies, 50)),
+            "p95": float(np.percentile(candidate_latencies, 95))
+        },
+        "speedup": float(baseline_latencies.mean() / candidate_latencies.mean()),
+        "mean_agreement": float(np.mean(agreements)),
+        "exact_agreement_ratio": float(np.mean(np.asarray(agreements) == 1.0))
+    }
+
+def compare_backends(capture_dir, backend, int8=False, calibration_capture=None, max_frames=None, iou_threshold=0.5):
+    face_path = os.path.join(models_dir, FACE_MODEL_FILENAME)
+    detection_path = os.path.join(models_dir, DETECTION_MODEL_FILENAME)
+
+    baseline_face, baseline_detection = load_yolo(face_path, "pytorch"), load_yolo(detection_path, "pytorch")
+    candidate_face = load_yolo(face_path, backend, int8, calibration_capture)
+    candidate_detection = load_yolo(detection_path, backend, int8, calibration_capture)
+
+    reader = open_session(capture_dir)
+    names = reader.names()[:max_frames]
+
+    face_stats = ([], [], [])
+    detection_stats = ([], [], [])
+
+    for idx, name in enumerate(names, 1):
+        frame = reader.read(name)
+        if frame is None:
+            logger.warning(f"Failed to load image: {name}")
+            continue
+
+        baseline = _predict(baseline_face, frame)
+        candidate = _predict(candidate_face, frame)
+        face_stats[0].append(baseline[2])
+        face_stats[1].append(candidate[2])
+        face_stats[2].append(_agreement(baseline, candidate, iou_threshold))
+
+        # The muzzle/eartag model is compared on the face crops found by the baseline face model
+        h, w = frame.shape[:2]
+        for x1, y1, x2, y2 in baseline[0].astype(int):
+            crop = frame[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
+            if crop.size == 0:
+                continue
+
+            baseline_crop = _predict(baseline_detection, crop)
+            candidate_crop = _predict(candidate_detection, crop)
+            detection_stats[0].append(baseline_crop[2])
+            detection_stats[1].append(candidate_crop[2])
+            detection_stats[2].append(_agreement(baseline_crop, candidate_crop, iou_threshold))
+
+        logger.info(f"Compared {idx}/{len(names)} images")
+
+    report = {
+        "backend": backend,
+        "int8": int8,
+        "iou_threshold": iou_threshold,
+        "face_model": _summarize(*face_stats) if face_stats[2] else None,
+        "detection_model": _summarize(*detection_stats) if detection_stats[2] else None
+    }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an inference backend against the PyTorch baseline on captured data")
+    parser.add_argument("capture_name", type=str, help="name of the subfolder under capture_dir containing the captured data")
+    parser.add_argument("--backend", type=str, choices=INFERENCE_BACKENDS[1:], default="onnx", help="inference backend to compare")
+    parser.add_argument("--int8", action="store_true", default=config.get("inference_int8", False), help="flag to compare the INT8 quantized models")
+    parser.add_argument("--calibration_capture", type=str, default=config.get("int8_calibration_capture"), help="capture session used for INT8 calibration")
+    parser.add_argument("--max_frames", type=int, default=None, help="maximum number of frames to compare")
+
+    args = parser.parse_args()
+    capture_dir = os.path.abspath(os.path.join(config.get("capture_dir"), args.capture_name))
+
+    report = compare_backends(capture_dir, args.backend, args.int8, args.calibration_capture, args.max_frames)
+
+    report_path = os.path.join(capture_dir, f"backend_report_{args.backend}{'_int8' if args.int8 else ''}.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=4)
+
+    for model_name in ("face_model", "detection_model"):
+        summary = report[model_name]
+        if summary is None:
+            continue
+        logger.info(
+            f"{model_name}: {summary['frames']} inputs, latency {summary['baseline_latency']['mean']:.4f} -> "
+            f"{summary['candidate_latency']['mean']:.4f} seconds ({summary['speedup']:.2f}x), "
+            f"mean agreement {summary['mean_agreement']:.1%}"
+        )
+    logger.info(f"Backend comparison report saved to: {report_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import logging
+import importlib.util
+
+import numpy as np
+import cv2
+import yaml
+
+from pipeline.utils.config import get_config
+from pipeline.utils.session_store import open_session
+
+logger = logging.getLogger(__name__)
+config = get_config()
+capture_dir = os.path.abspath(config.get("capture_dir"))
+int8_calibration_frames = config.get("int8_calibration_frames", 200)
+
+INFERENCE_BACKENDS = ("pytorch", "onnx", "openvino")
+
+# Runtimes of the exported backends, installed from requirements-optional.txt only where they are used
+BACKEND_PACKAGES = {"onnx": "onnxruntime", "openvino": "openvino"}
+
+def _sample_calibration_names(session_dir, num_frames):
+    names = open_session(session_dir).names()
+    if not names:
+        raise ValueError(f"No frames found for INT8 calibration in: {session_dir}")
+
+    step = max(1, len(names) // num_frames)
+    return names[::step][:num_frames]
+
+def _square_letterbox(image, imgsz):
+    h, w = image.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    return cv2.copyMakeBorder(image, top, imgsz - new_h - top, left, imgsz - new_w - left, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+def _build_calibration_dataset(session_dir, model, output_dir, num_frames):
+    # Writes sampled session frames as an unlabeled YOLO dataset, which is what ultralytics calibrates INT8 exports on
+    images_dir = os.path.join(output_dir, "images")
+    os.makedirs(images_dir, exist_ok=True)
+
+    reader = open_session(session_dir)
+    for name in _sample_calibration_names(session_dir, num_frames):
+        frame = reader.read(name)
+        if frame is not None:
+            cv2.imwrite(os.path.join(images_dir, f"{os.path.splitext(name)[0]}.png"), frame)
+
+    data_path = os.path.join(output_dir, "calibration.yaml")
+    with open(data_path, "w") as f:
+        yaml.safe_dump({"path": output_dir, "train": "images", "val": "images", "names": model.names}, f)
+    return data_path
+
+def _quantize_onnx(fp32_path, int8_path, session_dir, imgsz, num_frames):
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    reader = open_session(session_dir)
+    names = _sample_calibration_names(session_dir, num_frames)
+
+    class FrameCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._names = iter(names)
+
+        def get_next(self):
+            for name in self._names:
+                frame = reader.read(name)
+                if frame is None:
+                    continue
+                image = _square_letterbox(frame, imgsz)[:, :, ::-1].transpose(2, 0, 1)
+                return {input_name: (np.ascontiguousarray(image, dtype=np.float32) / 255.0)[None]}
+            return None
+
+    quantize_static(
+        fp32_path,
+        int8_path,
+        FrameCalibrationReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True)
+
+def _require_backend_package(backend):
+    package = BACKEND_PACKAGES.get(backend)
+    if package is not None and importlib.util.find_spec(package) is None:
+        raise ImportError(f"The {backend} inference backend needs the optional {package} package: pip install {package}")
+
+def export_model(model_path, backend, int8=False, calibration_capture=None):
+    # Exports a PyTorch YOLO model for the given backend once and returns the path of the exported model
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {INFERENCE_BACKENDS})")
+    if backend == "pytorch":
+        return model_path
+    _require_backend_package(backend)
+
+    if int8 and not calibration_capture:
+        raise ValueError("INT8 quantization needs int8_calibration_capture to be set to a capture session")
+
+    base_path = os.path.splitext(model_path)[0]
+    suffix = "_int8" if int8 else ""
+    exported_path = f"{base_path}{suffix}.onnx" if backend == "onnx" else f"{base_path}{suffix}_openvino_model"
+    if os.path.exists(exported_path):
+        return exported_path
+
+    from ultralytics import YOLO
+
+    logger.info(f"Exporting {os.path.basename(model_path)} for {backend}{' with INT8 quantization' if int8 else ''}")
+    model = YOLO(model_path)
+    imgsz = model.overrides.get("imgsz", 640)
+    imgsz = imgsz if isinstance(imgsz, int) else max(imgsz)
+    session_dir = os.path.join(capture_dir, calibration_capture) if int8 else None
+
+    if backend == "onnx":
+        fp32_path = model.export(format="onnx", imgsz=imgsz, dynamic=True)
+        if int8:
+            _quantize_onnx(fp32_path, exported_path, session_dir, imgsz, int8_calibration_frames)
+        elif fp32_path != exported_path:
+            os.replace(fp32_path, exported_path)
+    else:
+        data_path = None
+        if int8:
+            calibration_dir = os.path.join(os.path.dirname(model_path), "calibration", calibration_capture)
+            data_path = _build_calibration_dataset(session_dir, model, calibration_dir, int8_calibration_frames)
+
+        output_path = model.export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8, data=data_path)
+        if output_path != exported_path:
+            os.replace(output_path, exported_path)
+
+    logger.info(f"Exported model saved to: {exported_path}")
+    return exported_path
+
+def load_yolo(model_path, backend, int8=False, calibration_capture=None):
+    # ultralytics pulls in torch, so it is only imported once a model is actually loaded
+    from ultralytics import YOLO
+
+    if backend == "pytorch":
+        return YOLO(model_path)
+    return YOLO(export_model(model_path, backend, int8, calibration_capture), task="detect")
@@ -0,0 +1,125 @@
+import os
+import glob
+import json
+import time
+import argparse
+import logging
+import multiprocessing
+
+from pipeline.utils.config import get_config
+from pipeline.utils.log import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+config = get_config()
+capture_dir = os.path.abspath(config.get("capture_dir"))
+batch_workers = config.get("batch_workers", 2)
+
+RESULTS_FILENAME = "results.json"
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# Set in each worker process by _init_worker
+_pipelined = False
+
+def resolve_sessions(patterns):
+    # Accepts session names or glob patterns relative to capture_dir
+    session_dirs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.join(capture_dir, pattern))) if glob.has_magic(pattern) else [os.path.join(capture_dir, pattern)]
+        for session_dir in matches:
+            if not os.path.isdir(session_dir):
+                logger.warning(f"Skipping missing session directory: {session_dir}")
+            elif session_dir not in session_dirs:
+                session_dirs.append(session_dir)
+    return session_dirs
+
+def _init_worker(num_threads, pipelined):
+    # Runs in each fresh worker process before the inference libraries are imported, so the thread limits apply
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(num_threads)
+
+    from pipeline.process.models import set_thread_budget, warm_up_models
+
+    set_thread_budget(num_threads)
+    warm_up_models()
+
+    global _pipelined
+    _pipelined = pipelined
+
+def _process_session(session_dir):
+    from pipeline.process.main import run_pipeline
+
+    start_time = time.time()
+    try:
+        analysis_results, frame_store = run_pipeline(session_dir, pipelined=_pipelined)
+    except Exception as e:
+        logger.exception(f"An error occurred while processing {session_dir}: {e}")
+        return {"session": session_dir, "error": str(e), "frames": 0, "tracks": 0, "seconds": time.time() - start_time}
+
+    with open(os.path.join(session_dir, RESULTS_FILENAME), "w") as f:
+        json.dump(analysis_results, f, indent=4)
+
+    return {
+        "session": session_dir,
+        "error": None,
+        "frames": len(frame_store.names()),
+        "tracks": len(analysis_results),
+        "seconds": time.time() - start_time
+    }
+
+def process_sessions(session_dirs, workers=None, pipelined=False):
+    workers = max(1, min(workers or batch_workers, len(session_dirs)))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"Processing {len(session_dirs)} sessions with {workers} workers, {threads_per_worker} threads each")
+
+    start_time = time.time()
+    summaries = []
+
+    # Spawned workers start from a clean interpreter, so the thread limits are in place before torch and Paddle load
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=(threads_per_worker, pipelined)) as pool:
+        for summary in pool.imap_unordered(_process_session, session_dirs):
+            summaries.append(summary)
+            if summary["error"]:
+                logger.error(f"[{len(summaries)}/{len(session_dirs)}] Failed {summary['session']}: {summary['error']}")
+            else:
+                logger.info(
+                    f"[{len(summaries)}/{len(session_dirs)}] Processed {summary['session']}: {summary['frames']} frames, "
+                    f"{summary['tracks']} tracks in {summary['seconds']:.2f} seconds"
+                )
+
+    elapsed_time = time.time() - start_time
+    total_frames = sum(summary["frames"] for summary in summaries)
+    succeeded = sum(1 for summary in summaries if not summary["error"])
+
+    return {
+        "sessions": len(session_dirs),
+        "succeeded": succeeded,
+        "failed": len(session_dirs) - succeeded,
+        "frames": total_frames,
+        "seconds": elapsed_time,
+        "frames_per_second": total_frames / elapsed_time if elapsed_time else 0.0,
+        "sessions_per_hour": succeeded * 3600 / elapsed_time if elapsed_time else 0.0,
+        "session_summaries": sorted(summaries, key=lambda summary: summary["session"])
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the processing pipeline on many captured sessions without a GUI")
+    parser.add_argument("sessions", type=str, nargs="+", help="names of subfolders under capture_dir, or glob patterns such as '17*'")
+    parser.add_argument("--workers", type=int, default=batch_workers, help="number of worker processes")
+    parser.add_argument("--pipelined", action="store_true", default=config.get("pipeline_mode", "sequential") == "pipelined", help="flag to run the stages of each session concurrently")
+
+    args = parser.parse_args()
+    session_dirs = resolve_sessions(args.sessions)
+    if not session_dirs:
+        logger.warning("No sessions to process")
+        return
+
+    summary = process_sessions(session_dirs, workers=args.workers, pipelined=args.pipelined)
+    logger.info(
+        f"Processed {summary['succeeded']}/{summary['sessions']} sessions ({summary['frames']} frames) in {summary['seconds']:.2f} seconds: "
+        f"{summary['frames_per_second']:.2f} frames/s, {summary['sessions_per_hour']:.1f} sessions/h"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+import shutil
+import logging
+import zipfile
+from functools import lru_cache
+
+import numpy as np
+
+from pipeline.process.results import ResultStore
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_DIRNAME = "checkpoints"
+
+@lru_cache(maxsize=None)
+def _cached_file_hash(path, size, mtime):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def file_hash(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return _cached_file_hash(path, stat.st_size, stat.st_mtime)
+
+def fingerprint(**inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+# Output of one processing stage saved as a columnar ResultStore to <session>/checkpoints/<stage>.npz, valid
+# only for the fingerprint of the inputs it was computed from. Tracks completed while the stage runs are saved
+# as partial progress, one file per chunk of tracks under <session>/checkpoints/<stage>.partial, so saving
+# progress only writes the new tracks and an interrupted stage resumes with the remaining tracks. A disabled
+# checkpoint never loads anything and ignores saves.
+class StageCheckpoint:
+    def __init__(self, capture_dir, stage, fingerprint, enabled=True):
+        self.stage = stage
+        self.fingerprint = fingerprint
+        self.enabled = enabled
+        self.path = os.path.join(capture_dir, CHECKPOINTS_DIRNAME, f"{stage}.npz")
+        self.partial_dir = os.path.join(capture_dir, CHECKPOINTS_DIRNAME, f"{stage}.partial")
+
+    def _read(self, path):
+        # Results saved at path, or None when they are missing, unreadable or computed from other inputs
+        if not self.enabled or not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["fingerprint"]) != self.fingerprint:
+                    logger.info(f"Inputs of {self.stage} changed since the last run, discarding its checkpoint")
+                    return None
+                store = ResultStore(data)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.warning(f"Ignoring unreadable {self.stage} checkpoint: {e}")
+            return None
+
+        return store.to_results()
+
+    def _write(self, path, results):
+        if not self.enabled:
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so an interruption never leaves a truncated checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            ResultStore.from_results(results).save(f, fingerprint=np.array(self.fingerprint))
+        os.replace(tmp_path, path)
+
+    def _partial_paths(self):
+        if not os.path.isdir(self.partial_dir):
+            return []
+        return [os.path.join(self.partial_dir, name) for name in sorted(os.listdir(self.partial_dir)) if name.endswith(".npz")]
+
+    def load(self):
+        return self._read(self.path)
+
+    def load_partial(self):
+        if not self.enabled:
+            return {}
+
+        completed = {}
+        for path in self._partial_paths():
+            results = self._read(path)
+            if results is None:
+                # Progress saved for other inputs is of no use, and later chunks must not mix with it
+                shutil.rmtree(self.partial_dir, ignore_errors=True)
+                return {}
+            completed.update((obj["id"], obj) for obj in results)
+        return completed
+
+    def save(self, results):
+        if not self.enabled:
+            return
+        self._write(self.path, results)
+        shutil.rmtree(self.partial_dir, ignore_errors=True)
+
+    def save_partial(self, results):
+        # Saves the tracks completed since the last call
+        self._write(os.path.join(self.partial_dir, f"chunk_{len(self._partial_paths()):05d}.npz"), results)
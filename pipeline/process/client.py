@@ -0,0 +1,42 @@
+import os
+import json
+from multiprocessing.connection import Client
+
+from pipeline.utils.config import get_config
+
+config = get_config()
+processing_server_host = config.get("processing_server_host", "127.0.0.1")
+processing_server_port = config.get("processing_server_port", 6010)
+processing_server_authkey = config.get("processing_server_authkey")
+processing_server_authkey_file = config.get("processing_server_authkey_file")
+
+def load_authkey():
+    # The shared key from the environment or config, otherwise from the key file. There is no default key, since
+    # anyone who knows it can submit work to the server.
+    authkey = processing_server_authkey
+    if not authkey and processing_server_authkey_file:
+        with open(os.path.expanduser(processing_server_authkey_file), "r") as f:
+            authkey = f.read().strip()
+
+    if not authkey:
+        raise RuntimeError(
+            "No processing server authentication key configured: set CATTLE_MONITOR_PROCESSING_SERVER_AUTHKEY "
+            "or processing_server_authkey_file"
+        )
+    return str(authkey).encode()
+
+def send_request(request):
+    with Client((processing_server_host, processing_server_port), authkey=load_authkey()) as conn:
+        conn.send_bytes(json.dumps(request).encode())
+        return json.loads(conn.recv_bytes().decode())
+
+def submit_capture(capture_dir, save_intermediate_results=False, pipelined=False):
+    response = send_request({
+        "capture_dir": capture_dir,
+        "save_intermediate_results": save_intermediate_results,
+        "pipelined": pipelined
+    })
+
+    if response["status"] != "ok":
+        raise RuntimeError(f"Processing server failed to process {capture_dir}: {response['error']}")
+    return response["results"]
@@ -1,14 +1,24 @@
 import os
+import time
 import logging
 
+import numpy as np
 import cv2
-from ultralytics import YOLO
-
-from pipeline.utils.config import load_yaml_config
+from pipeline.utils.config import get_config
+from pipeline.utils import metrics
+from pipeline.utils.frame_store import FrameStore
+from pipeline.utils.session_store import open_session
+from pipeline.process.models import load_detection_model
+from pipeline.process.keyframes import select_key_frames
+from pipeline.process.results import ResultStore
 
 logger = logging.getLogger(__name__)
-config = load_yaml_config("pipeline/config.yaml")
-models_dir = os.path.abspath(config.get("models_dir"))
+config = get_config()
+detection_batch_size = config.get("detection_batch_size", 1)
+
+# Stride the YOLO input size is aligned to, and the padding color used by ultralytics letterboxing
+_model_stride = 32
+_letterbox_color = (114, 114, 114)
 
 def _save_detection_result(track_image, bbox, save_dir, file_name):
     x1, y1, x2, y2 = bbox["x1"], bbox["y1"], bbox["x2"], bbox["y2"]
@@ -19,57 +29,146 @@ def _save_detection_result(track_image, bbox, save_dir, file_name):
     os.makedirs(save_dir, exist_ok=True)
     cv2.imwrite(os.path.join(save_dir, file_name), crop)
 
-def detect_objects(tracking_results, capture_dir, save_intermediate_results=False):
-    model = YOLO(os.path.join(models_dir, 'cow_muzzle_eartag_yolo11n_v1.pt'))
-    images_dir = os.path.join(capture_dir, "images")
+def _save_detection_results(detection_results, capture_dir, frame_store):
+    # Saves the detection crops of already detected tracks, e.g. of checkpointed results, as detection would
+    tracks_dir = os.path.join(capture_dir, "tracks")
+    for obj in detection_results:
+        for image_entry in obj["images"]:
+            detections = image_entry.get("detections", [])
+            if not detections:
+                continue
+
+            track_img = frame_store.get_region(image_entry["name"], image_entry["track_bbox"])
+            if track_img is None:
+                logger.warning(f"Could not load original image: {image_entry['name']}")
+                continue
+
+            for det_idx, detection in enumerate(detections):
+                save_dir = os.path.join(tracks_dir, str(obj["id"]), detection["class"])
+                file_name = f"{os.path.splitext(image_entry['name'])[0]}_{det_idx}.png"
+                _save_detection_result(track_img, detection["bbox"], save_dir, file_name)
+
+def _letterbox(image, imgsz):
+    # Mirrors the minimal-rectangle letterboxing ultralytics applies to a single image, so a
+    # batch of crops sharing the resulting shape sees exactly the input of the per-crop path
+    h, w = image.shape[:2]
+    ratio = min(imgsz[0] / h, imgsz[1] / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_w = ((imgsz[1] - new_w) % _model_stride) / 2
+    pad_h = ((imgsz[0] - new_h) % _model_stride) / 2
+
+    if (w, h) != (new_w, new_h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    return cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=_letterbox_color)
+
+def _unletterbox_boxes(xyxy, letterboxed_shape, crop_shape):
+    # Maps boxes from letterboxed coordinates back onto the crop, as ultralytics scale_boxes does
+    gain = min(letterboxed_shape[0] / crop_shape[0], letterboxed_shape[1] / crop_shape[1])
+    pad_x = round((letterboxed_shape[1] - crop_shape[1] * gain) / 2 - 0.1)
+    pad_y = round((letterboxed_shape[0] - crop_shape[0] * gain) / 2 - 0.1)
+
+    boxes = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / gain).clip(0, crop_shape[1])
+    boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / gain).clip(0, crop_shape[0])
+    return boxes.tolist()
+
+def _record_detections(model, image_entry, track_id, track_img, boxes, tracks_dir, save_intermediate_results):
+    image_name = image_entry["name"]
+
+    for det_idx, (xyxy, cls_id, conf) in enumerate(boxes):
+        x1_det, y1_det, x2_det, y2_det = map(int, xyxy)
+        cls_name = model.names.get(cls_id, str(cls_id))
+
+        detection = {
+            "class": cls_name,
+            "bbox": {
+                "x1": x1_det,
+                "y1": y1_det,
+                "x2": x2_det,
+                "y2": y2_det
+            },
+            "confidence": conf
+        }
+
+        image_entry["detections"].append(detection)
+
+        if save_intermediate_results:
+            save_dir = os.path.join(tracks_dir, str(track_id), cls_name)
+            file_name = f"{os.path.splitext(image_name)[0]}_{det_idx}.png"
+            _save_detection_result(track_img, detection["bbox"], save_dir, file_name)
+
+def _detect_batch(model, batch, tracks_dir, save_intermediate_results):
+    batch_start_time = time.time()
+    results_yolo = model([letterboxed_img for _, _, _, letterboxed_img in batch], verbose=False)
+    metrics.observe("detection_crop_seconds", (time.time() - batch_start_time) / len(batch), count=len(batch))
+    metrics.inc("detection_crops_total", len(batch))
+
+    for (image_entry, track_id, track_img, letterboxed_img), result in zip(batch, results_yolo):
+        xyxy = _unletterbox_boxes(result.boxes.xyxy.tolist(), letterboxed_img.shape, track_img.shape)
+        boxes = [(box, int(cls_id), conf) for box, cls_id, conf in zip(xyxy, result.boxes.cls.tolist(), result.boxes.conf.tolist())]
+        _record_detections(model, image_entry, track_id, track_img, boxes, tracks_dir, save_intermediate_results)
+
+def detect_objects(tracking_results, capture_dir, save_intermediate_results=False, frame_store=None, batch_size=None, model=None, key_frames=None):
+    if model is None:
+        model = load_detection_model()
+    batch_size = batch_size if batch_size is not None else detection_batch_size
+    imgsz = model.overrides.get("imgsz", 640)
+    if isinstance(imgsz, int):
+        imgsz = (imgsz, imgsz)
     tracks_dir = os.path.join(capture_dir, "tracks")
 
-    logger.info("Starting object detection")
+    if frame_store is None:
+        frame_store = FrameStore(open_session(capture_dir))
+
+    logger.info(f"Starting object detection (batch size {batch_size})")
+
+    # Crops waiting for inference, bucketed by letterboxed shape so every batch has a uniform input size
+    pending = {}
 
     for obj in tracking_results:
         track_id = obj["id"]
         logger.info(f"Running object detection on Track ID {track_id}")
 
-        for image_entry in obj["images"]:
+        # Track crops are cut through the columnar results of the track, shared with key frame selection
+        result_store = ResultStore.from_results([obj])
+        image_rows = {id(image_entry): image_row for image_row, image_entry in enumerate(obj["images"])}
+
+        # Only the best key frames of a long track are run through detection, the other frames get no detections
+        for image_entry in select_key_frames(obj, frame_store, key_frames, result_store):
             image_name = image_entry["name"]
-            bbox = image_entry["track_bbox"]
 
-            image_path = os.path.join(images_dir, image_name)
-            original_img = cv2.imread(image_path)
-            if original_img is None:
-                logger.warning(f"Could not load original image: {image_path}")
+            frame = frame_store.get(image_name)
+            if frame is None:
+                logger.warning(f"Could not load original image: {image_name}")
                 continue
-
-            h, w = original_img.shape[:2]
-            x1, y1 = max(0, bbox["x1"]), max(0, bbox["y1"])
-            x2, y2 = min(w, bbox["x2"]), min(h, bbox["y2"])
-            track_img = original_img[y1:y2, x1:x2]
+            track_img = result_store.track_crop(image_rows[id(image_entry)], frame)
 
             image_entry["detections"] = []
 
-            results_yolo = model(track_img, verbose=False)[0]
-
-            for det_idx, box in enumerate(results_yolo.boxes):
-                x1_det, y1_det, x2_det, y2_det = map(int, box.xyxy[0].tolist())
-                cls_id = int(box.cls[0])
-                cls_name = model.names.get(cls_id, str(cls_id))
-
-                detection = {
-                    "class": cls_name,
-                    "bbox": {
-                        "x1": x1_det,
-                        "y1": y1_det,
-                        "x2": x2_det,
-                        "y2": y2_det
-                    }
-                }
-
-                image_entry["detections"].append(detection)
-
-                if save_intermediate_results:
-                    save_dir = os.path.join(tracks_dir, str(track_id), cls_name)
-                    file_name = f"{os.path.splitext(image_name)[0]}_{det_idx}.png"
-                    _save_detection_result(track_img, detection["bbox"], save_dir, file_name)
+            if batch_size <= 1:
+                with metrics.timed("detection_crop_seconds"):
+                    results_yolo = model(track_img, verbose=False)[0]
+                metrics.inc("detection_crops_total")
+                boxes = [(box.xyxy[0].tolist(), int(box.cls[0]), float(box.conf[0])) for box in results_yolo.boxes]
+                _record_detections(model, image_entry, track_id, track_img, boxes, tracks_dir, save_intermediate_results)
+                continue
+
+            if track_img.size == 0:
+                logger.warning(f"Empty track crop for track {track_id}, image {image_name}")
+                continue
+
+            letterboxed_img = _letterbox(track_img, imgsz)
+            bucket = pending.setdefault(letterboxed_img.shape, [])
+            bucket.append((image_entry, track_id, track_img, letterboxed_img))
+
+            if len(bucket) >= batch_size:
+                _detect_batch(model, pending.pop(letterboxed_img.shape), tracks_dir, save_intermediate_results)
+
+    for bucket in pending.values():
+        _detect_batch(model, bucket, tracks_dir, save_intermediate_results)
 
     logger.info("Completed object detection")
     return tracking_results
\ No newline at end of file
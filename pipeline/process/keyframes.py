@@ -0,0 +1,87 @@
+import logging
+
+import numpy as np
+import cv2
+
+from pipeline.utils.config import get_config
+from pipeline.process.results import ResultStore
+
+logger = logging.getLogger(__name__)
+config = get_config()
+key_frames_per_track = config.get("key_frames_per_track", 0)
+
+# Width track crops are resized to before measuring sharpness and symmetry, so crops of different sizes compare fairly
+_feature_width = 128
+
+# Weights of the per-track normalized frame features, and the penalty for a face cut off by the frame border
+_score_weights = {"sharpness": 0.4, "size": 0.3, "symmetry": 0.3}
+_truncation_penalty = 0.25
+
+def _symmetry(gray):
+    # Correlation between the crop and its mirror image, a proxy for a frontal pose
+    centered = gray - gray.mean()
+    mirrored = centered[:, ::-1]
+    denominator = np.sqrt((centered ** 2).sum() * (mirrored ** 2).sum())
+    return float((centered * mirrored).sum() / denominator) if denominator > 0 else 0.0
+
+def frame_features(crop, bbox, frame_shape):
+    h, w = frame_shape[:2]
+    crop_h, crop_w = crop.shape[:2]
+
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    gray = cv2.resize(gray, (_feature_width, max(1, round(crop_h * _feature_width / crop_w))), interpolation=cv2.INTER_AREA)
+    gray = gray.astype(np.float32)
+
+    return {
+        "sharpness": float(cv2.Laplacian(gray, cv2.CV_32F).var()),
+        "size": crop_h * crop_w / (h * w),
+        "symmetry": max(0.0, _symmetry(gray)),
+        "truncated": bbox["x1"] <= 0 or bbox["y1"] <= 0 or bbox["x2"] >= w or bbox["y2"] >= h
+    }
+
+def score_frames(features):
+    # Sharpness and size are relative to the best frame of the same track, symmetry is already in [0, 1]
+    max_sharpness = max((f["sharpness"] for f in features), default=0) or 1.0
+    max_size = max((f["size"] for f in features), default=0) or 1.0
+
+    return [
+        _score_weights["sharpness"] * f["sharpness"] / max_sharpness
+        + _score_weights["size"] * f["size"] / max_size
+        + _score_weights["symmetry"] * f["symmetry"]
+        - (_truncation_penalty if f["truncated"] else 0.0)
+        for f in features
+    ]
+
+def select_key_frames(obj, frame_store, top_k=None, result_store=None):
+    # Scores every frame of the track, stores the score as key_frame_score on its image entry and returns the
+    # top_k entries in frame order. Frames that can't be loaded are never selected. Track crops are cut through
+    # the columnar results of the track, which are built here unless the caller already has them.
+    top_k = top_k if top_k is not None else key_frames_per_track
+    if top_k <= 0 or len(obj["images"]) <= top_k:
+        return obj["images"]
+
+    if result_store is None:
+        result_store = ResultStore.from_results([obj])
+
+    scored_entries = []
+    features = []
+    for image_row, image_entry in enumerate(obj["images"]):
+        frame = frame_store.get(image_entry["name"])
+        if frame is None:
+            continue
+
+        bbox = image_entry["track_bbox"]
+        crop = result_store.track_crop(image_row, frame)
+        if crop.size == 0:
+            continue
+
+        scored_entries.append(image_entry)
+        features.append(frame_features(crop, bbox, frame.shape))
+
+    for image_entry, score in zip(scored_entries, score_frames(features)):
+        image_entry["key_frame_score"] = score
+
+    selected = sorted(scored_entries, key=lambda entry: entry["key_frame_score"], reverse=True)[:top_k]
+    selected_ids = {id(entry) for entry in selected}
+    logger.info(f"Selected {len(selected)} key frames out of {len(obj['images'])} for Track ID {obj['id']}")
+    return [entry for entry in obj["images"] if id(entry) in selected_ids]
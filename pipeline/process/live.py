@@ -0,0 +1,96 @@
+import queue
+import logging
+import threading
+
+import cv2
+
+from pipeline.process.tracking import TrackingSession
+from pipeline.process.detection import detect_objects
+from pipeline.process.models import load_detection_model
+from pipeline.process.analysis import analyze_detections
+from pipeline.process.visualization import log_analysis_results
+from pipeline.utils.config import get_config
+from pipeline.utils.frame_store import FrameStore
+from pipeline.utils.session_store import open_session
+
+logger = logging.getLogger(__name__)
+config = get_config()
+live_queue_size = config.get("live_queue_size", 4)
+
+# Runs the processing pipeline on frames as they are captured. Frames are tracked in the capture loop, and
+# each track goes through detection and analysis on a worker thread as soon as the tracker drops it, so the
+# capture loop only waits when live_queue_size finalized tracks are already queued. Results are handed to
+# on_result from the worker thread. Without a session reader, e.g. when captures aren't archived, frames
+# can't be read back once evicted from the frame cache, so the frames of live tracks are pinned in it
+# until their track has been processed.
+class LiveProcessor:
+    def __init__(self, capture_dir, on_result=None, max_age=5, session_reader=None, queue_size=None):
+        self.capture_dir = capture_dir
+        self.on_result = on_result
+        self.pin_frames = session_reader is None
+        self.frame_store = FrameStore(session_reader if session_reader is not None else open_session(capture_dir))
+
+        self.tracking = TrackingSession(max_age=max_age)
+        self.detection_model = load_detection_model()
+        self.results = []
+
+        self._queue = queue.Queue(maxsize=queue_size or live_queue_size)
+        self._worker = threading.Thread(target=self._run, name="live-processor", daemon=True)
+        self._worker.start()
+
+    def process_frame(self, image_name, frame):
+        # Picamera2 delivers XRGB8888 frames, while frames read back from disk are 3-channel BGR
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+        self.frame_store.put(image_name, frame)
+        pinned = self.pin_frames and self.frame_store.pin(image_name)
+
+        finalized = self.tracking.update(image_name, frame)
+
+        if pinned:
+            # Every live track seen in this frame holds on to it until the track is processed
+            for obj in self.tracking.object_map.values():
+                if obj["id"] not in self.tracking.finalized_ids and obj["images"][-1]["name"] == image_name:
+                    self.frame_store.pin(image_name)
+            self.frame_store.unpin(image_name)
+
+        for obj in finalized:
+            self._queue.put(obj)
+
+    def close(self):
+        for obj in self.tracking.finish():
+            self._queue.put(obj)
+        self._queue.put(None)
+        self._worker.join()
+
+        self.tracking.log_summary()
+        self.frame_store.log_stats()
+        return self.results
+
+    def _run(self):
+        while True:
+            obj = self._queue.get()
+            if obj is None:
+                break
+
+            try:
+                self._emit(obj)
+            except Exception as e:
+                logger.exception(f"Error while processing Track ID {obj['id']}: {e}")
+            finally:
+                if self.pin_frames:
+                    for image_entry in obj["images"]:
+                        self.frame_store.unpin(image_entry["name"])
+
+    def _emit(self, obj):
+        logger.info(f"Track ID {obj['id']} finalized after {len(obj['images'])} images")
+
+        detection_results = detect_objects([obj], self.capture_dir, frame_store=self.frame_store, model=self.detection_model)
+        analysis_results = analyze_detections(detection_results, self.capture_dir, frame_store=self.frame_store)
+        log_analysis_results(analysis_results)
+
+        for result in analysis_results:
+            self.results.append(result)
+            if self.on_result is not None:
+                self.on_result(result)
@@ -1,47 +1,285 @@
 import argparse
 import logging
+import hashlib
 import time
+import json
 import os
+from importlib import metadata
 
-from pipeline.utils.config import load_yaml_config
+from pipeline.utils.config import get_config, apply_overrides
 from pipeline.utils.log import setup_logging, log_time_taken
-from pipeline.process.tracking import deepsort
-from pipeline.process.detection import detect_objects
-from pipeline.process.analysis import analyze_detections
-from pipeline.process.visualization import visualize_analysis_results
+
+# Pipeline modules are imported where they are used: most of them read their settings from the config when
+# imported, so command line overrides must be applied first, and the heavy inference libraries behind them
+# shouldn't slow down --help, --submit or runs that never reach a stage
 
 setup_logging()
 logger = logging.getLogger(__name__)
+config = get_config()
+pipeline_mode = config.get("pipeline_mode", "sequential")
+
+tracking_params = {"max_age": 5, "target_classes": [0]}
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+def _rfid_readings_hash(capture_dir):
+    from pipeline.utils.rfid_log import RFID_LOG_FILENAME, LEGACY_RFID_READINGS_FILENAME
+    from pipeline.process.checkpoint import file_hash
+
+    for filename in (RFID_LOG_FILENAME, LEGACY_RFID_READINGS_FILENAME):
+        path = os.path.join(capture_dir, filename)
+        if os.path.exists(path):
+            return file_hash(path)
+    return None
+
+def _frame_file_stats(capture_dir, frame_names):
+    # Size and modification time of the files the frames are read from, so frames replaced under the same
+    # name change the fingerprint. Chunked sessions are covered by their index and chunk files.
+    from pipeline.utils.session_store import IMAGES_DIRNAME, FRAMES_DIRNAME, FRAMES_INDEX_FILENAME
+
+    frames_dir = os.path.join(capture_dir, FRAMES_DIRNAME)
+    if os.path.exists(os.path.join(frames_dir, FRAMES_INDEX_FILENAME)):
+        paths = [os.path.join(frames_dir, name) for name in sorted(os.listdir(frames_dir))]
+    else:
+        paths = [os.path.join(capture_dir, IMAGES_DIRNAME, name) for name in frame_names]
+
+    stats = []
+    for path in paths:
+        stat = os.stat(path) if os.path.exists(path) else None
+        stats.append((os.path.basename(path), stat.st_size if stat else None, stat.st_mtime_ns if stat else None))
+    return stats
+
+def _stage_fingerprints(capture_dir, frame_names, source_id=None):
+    from pipeline.process.tracking import motion_gating, motion_gate_params, tracking_decode_reduction
+    from pipeline.process.trackers import tracker_backend, lazy_embedding_iou
+    from pipeline.process.analysis import key_frame_vote_margin, key_frame_ocr_round_size
+    from pipeline.process.keyframes import key_frames_per_track
+    from pipeline.process.rfid_index import rfid_candidates, rfid_window_captures
+    from pipeline.process.checkpoint import fingerprint, file_hash
+    from pipeline.process import models
+    from pipeline.process import ocr
+
+    # Each stage is keyed by its own inputs and parameters plus the fingerprint of the stage before it
+    backend = {
+        "inference_backend": models.inference_backend,
+        "inference_int8": models.inference_int8,
+        "int8_calibration_capture": models.int8_calibration_capture
+    }
+
+    tracking_fingerprint = fingerprint(
+        frames=frame_names,
+        frame_files=_frame_file_stats(capture_dir, frame_names) if source_id is None else None,
+        source=source_id,
+        model=file_hash(os.path.join(models.models_dir, models.FACE_MODEL_FILENAME)),
+        backend=backend,
+        motion_gate=motion_gate_params if motion_gating else None,
+        decode_reduction=tracking_decode_reduction,
+        tracker=tracker_backend,
+        lazy_embedding_iou=lazy_embedding_iou if tracker_backend == "deepsort_lazy" else None,
+        **tracking_params)
+
+    detection_fingerprint = fingerprint(
+        tracking=tracking_fingerprint,
+        model=file_hash(os.path.join(models.models_dir, models.DETECTION_MODEL_FILENAME)),
+        backend=backend,
+        key_frames=key_frames_per_track)
+
+    analysis_fingerprint = fingerprint(
+        detection=detection_fingerprint,
+        paddleocr=_package_version("paddleocr"),
+        expected_values=hashlib.sha256("\n".join(ocr.get_eartag_matcher().values).encode()).hexdigest(),
+        max_distance=ocr.ocr_max_distance,
+        rfid_readings=_rfid_readings_hash(capture_dir) if rfid_candidates else None,
+        rfid_window=rfid_window_captures if rfid_candidates else None,
+        vote_margin=key_frame_vote_margin,
+        ocr_round_size=key_frame_ocr_round_size)
+
+    return tracking_fingerprint, detection_fingerprint, analysis_fingerprint
+
+def _run_resumable_stage(checkpoint, objs, stage_fn, on_resume=None):
+    # Runs a per-track stage in chunks of tracks, saving progress after each chunk when checkpoints are enabled.
+    # on_resume is called with the tracks restored from saved progress.
+    completed = checkpoint.load_partial()
+    if completed:
+        logger.info(f"Resuming {checkpoint.stage} with {len(completed)} of {len(objs)} tracks already done")
+        if on_resume is not None:
+            on_resume(list(completed.values()))
+
+    pending = [obj for obj in objs if obj["id"] not in completed]
+    chunk_size = config.get("checkpoint_interval_tracks", 20) if checkpoint.enabled else max(1, len(pending))
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        stage_fn(chunk)
+
+        completed.update((obj["id"], obj) for obj in chunk)
+        checkpoint.save_partial(chunk)
+
+    results = [completed[obj["id"]] for obj in objs]
+    checkpoint.save(results)
+    return results
+
+def run_pipeline(capture_dir, save_intermediate_results=False, pipelined=False, use_checkpoints=True, frame_source=None, gallery_crops=None):
+    from pipeline.utils import metrics
+
+    # Metrics are collected per session, starting from zero in long-running processes that handle many sessions
+    metrics.registry.reset()
+    try:
+        return _run_pipeline(capture_dir, save_intermediate_results, pipelined, use_checkpoints, frame_source, gallery_crops)
+    finally:
+        metrics.save_snapshot(os.path.join(capture_dir, metrics.METRICS_FILENAME))
+
+def _run_pipeline(capture_dir, save_intermediate_results, pipelined, use_checkpoints, frame_source, gallery_crops):
+    from pipeline.utils.frame_store import FrameStore
+    from pipeline.utils.session_store import open_session
+    from pipeline.process.tracking import run_tracking, _save_tracking_results
+    from pipeline.process.detection import detect_objects, _save_detection_results
+    from pipeline.process.analysis import analyze_detections
+    from pipeline.process.pipelined import run_pipelined
+    from pipeline.process.checkpoint import StageCheckpoint
+
+    if save_intermediate_results:
+        logger.info(f"Intermediate results will be saved to: {capture_dir}")
+
+    # Decoded frames are shared by all stages so each image is read from disk as few times as possible
+    # Frames come from the capture session unless another source such as a video is given
+    frame_store = FrameStore(frame_source if frame_source is not None else open_session(capture_dir))
+
+    pipeline_start_time = time.time()
+
+    if pipelined:
+        # Stages overlap per track in pipelined mode, so there are no stage boundaries to checkpoint
+        analysis_results = run_pipelined(capture_dir, frame_store, save_intermediate_results=save_intermediate_results, gallery_crops=gallery_crops)
+        log_time_taken("Processing Pipeline", pipeline_start_time)
+        frame_store.log_stats()
+        return analysis_results, frame_store
+
+    fingerprints = _stage_fingerprints(capture_dir, frame_store.names(), getattr(frame_source, "source_id", None)) if use_checkpoints else (None, None, None)
+    tracking_checkpoint, detection_checkpoint, analysis_checkpoint = (
+        StageCheckpoint(capture_dir, stage, stage_fingerprint, enabled=use_checkpoints)
+        for stage, stage_fingerprint in zip(("tracking", "detection", "analysis"), fingerprints)
+    )
+
+    def save_intermediate_results_of(objs, detections=True):
+        # Stages restored from checkpoints didn't save their intermediate results in this run, so they are saved
+        # from the checkpointed results, replacing whatever an earlier run left in the tracks directory
+        logger.info(f"Saving intermediate results of checkpointed {'detection' if detections else 'tracking'} results")
+        _save_tracking_results({obj["id"]: obj for obj in objs}, capture_dir, frame_store)
+        if detections:
+            _save_detection_results(objs, capture_dir, frame_store)
+
+    analysis_results = analysis_checkpoint.load()
+    if analysis_results is not None:
+        logger.info("Inputs unchanged since the last run, reusing checkpointed analysis results")
+        if save_intermediate_results:
+            save_intermediate_results_of(analysis_results)
+        log_time_taken("Processing Pipeline", pipeline_start_time)
+        return analysis_results, frame_store
+
+    def detect_stage(objs):
+        detect_objects(objs, capture_dir, save_intermediate_results=save_intermediate_results, frame_store=frame_store)
+
+    def analyze_stage(objs):
+        analyze_detections(objs, capture_dir, frame_store=frame_store, gallery_crops=gallery_crops)
+
+    detection_results = detection_checkpoint.load()
+    if detection_results is not None:
+        logger.info("Inputs unchanged since the last run, reusing checkpointed detection results")
+        if save_intermediate_results:
+            save_intermediate_results_of(detection_results)
+    else:
+        tracking_results = tracking_checkpoint.load()
+        if tracking_results is not None:
+            logger.info("Inputs unchanged since the last run, reusing checkpointed tracking results")
+            if save_intermediate_results:
+                save_intermediate_results_of(tracking_results, detections=False)
+        else:
+            # Tracker state can't be restored mid-session, so an interrupted tracking stage starts over
+            tracking_start_time = time.time()
+            tracking_results, tracking_complete = run_tracking(capture_dir, save_intermediate_results=save_intermediate_results, frame_store=frame_store, **tracking_params)
+            log_time_taken("Tracking", tracking_start_time)
+            if tracking_complete:
+                tracking_checkpoint.save(tracking_results)
+            else:
+                # Results of the tracks found so far would pass as complete under the same fingerprints
+                logger.warning("Tracking did not finish, so no stage of this run is checkpointed")
+                detection_checkpoint.enabled = analysis_checkpoint.enabled = False
+
+        detection_start_time = time.time()
+        # Detection crops of resumed tracks are saved again, since tracking may have replaced the tracks directory
+        on_resume = (lambda objs: _save_detection_results(objs, capture_dir, frame_store)) if save_intermediate_results else None
+        detection_results = _run_resumable_stage(detection_checkpoint, tracking_results, detect_stage, on_resume)
+        log_time_taken("Object detection", detection_start_time)
+
+    analysis_start_time = time.time()
+    analysis_results = _run_resumable_stage(analysis_checkpoint, detection_results, analyze_stage)
+    log_time_taken("Analysis", analysis_start_time)
+
+    log_time_taken("Processing Pipeline", pipeline_start_time)
+    frame_store.log_stats()
+    return analysis_results, frame_store
 
 def main():
+    # Config overrides are applied before the remaining arguments are parsed, so they also change their defaults
+    override_parser = argparse.ArgumentParser(add_help=False)
+    override_parser.add_argument("--set", dest="overrides", action="append", default=[])
+    apply_overrides(override_parser.parse_known_args()[0].overrides)
+
+    from pipeline.process.visualization import GALLERY_FORMATS
+
     parser = argparse.ArgumentParser(description="Run the processing pipeline on captured data")
     parser.add_argument("capture_name", type=str, help="name of the subfolder under capture_dir containing the captured data")
     parser.add_argument("--save_intermediate_results", action="store_true", help="flag to save intermediate results")
+    parser.add_argument("--pipelined", action="store_true", default=config.get("pipeline_mode", "sequential") == "pipelined", help="flag to run the stages concurrently, handing each track downstream as soon as it is finalized")
+    parser.add_argument("--no_checkpoints", dest="use_checkpoints", action="store_false", help="flag to recompute every stage instead of reusing checkpointed results")
+    parser.add_argument("--gallery", type=str, choices=("show", "none") + GALLERY_FORMATS, default=config.get("gallery_output", "show"), help="show track summaries in windows, export them as png/jpg files or an html index, or skip them")
+    parser.add_argument("--video", type=str, default=None, help="path of a video file to process directly, with results saved under the capture_name subfolder")
+    parser.add_argument("--video_fps", type=float, default=config.get("capture_fps", 1), help="frames per second sampled from the video")
+    parser.add_argument("--video_start", type=float, default=0.0, help="timestamp in seconds of the first sampled video frame")
+    parser.add_argument("--video_end", type=float, default=None, help="timestamp in seconds where video sampling stops")
+    parser.add_argument("--submit", action="store_true", help="flag to submit the capture to a running processing server instead of processing it in this process")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE", help="override a config value for this run, e.g. --set tracker_backend=bytetrack (repeatable)")
     
     args = parser.parse_args()
-    config = load_yaml_config("pipeline/config.yaml")
     capture_dir = os.path.abspath(os.path.join(config.get("capture_dir"), args.capture_name))
 
-    logger.info(f"Starting processing pipeline for capture: {args.capture_name}")
-    if args.save_intermediate_results:
-        logger.info(f"Intermediate results will be saved to: {capture_dir}")
+    if args.submit:
+        from pipeline.process.client import submit_capture
 
-    pipeline_start_time = time.time()
+        logger.info(f"Submitting capture to processing server: {args.capture_name}")
+        analysis_results = submit_capture(capture_dir, save_intermediate_results=args.save_intermediate_results, pipelined=args.pipelined)
+        print(json.dumps(analysis_results, indent=4))
+        return
 
-    tracking_start_time = time.time()
-    tracking_results = deepsort(capture_dir, save_intermediate_results=args.save_intermediate_results)
-    log_time_taken("Tracking", tracking_start_time)
+    frame_source = None
+    if args.video:
+        from pipeline.utils.video import VideoFrameSource
 
-    detection_start_time = time.time()
-    detection_results = detect_objects(tracking_results, capture_dir, save_intermediate_results=args.save_intermediate_results)
-    log_time_taken("Object detection", detection_start_time)
+        # Sampled video frames are streamed into the pipeline without being written out as images first
+        frame_source = VideoFrameSource(args.video, args.video_fps, start_time=args.video_start, end_time=args.video_end)
+        os.makedirs(capture_dir, exist_ok=True)
+        logger.info(f"Sampling {len(frame_source.names())} frames from video: {args.video}")
 
-    analysis_start_time = time.time()
-    analysis_results = analyze_detections(detection_results, capture_dir)
-    log_time_taken("Analysis", analysis_start_time)
+    logger.info(f"Starting processing pipeline for capture: {args.capture_name}")
+    try:
+        from pipeline.process.visualization import GalleryCrops, visualize_analysis_results, export_analysis_results
 
-    log_time_taken("Processing Pipeline", pipeline_start_time)
-    visualize_analysis_results(analysis_results, capture_dir)
+        # Gallery thumbnails are kept during analysis, so galleries only read frames for tracks analysis didn't crop
+        gallery_crops = GalleryCrops() if args.gallery != "none" else None
+        analysis_results, frame_store = run_pipeline(capture_dir, save_intermediate_results=args.save_intermediate_results, pipelined=args.pipelined, use_checkpoints=args.use_checkpoints, frame_source=frame_source, gallery_crops=gallery_crops)
+
+        # Galleries of checkpointed tracks crop from the frame store, so a video source stays open until they are rendered
+        if args.gallery == "show":
+            visualize_analysis_results(analysis_results, capture_dir, frame_store=frame_store, gallery_crops=gallery_crops)
+        elif args.gallery != "none":
+            export_analysis_results(analysis_results, capture_dir, frame_store=frame_store, output_format=args.gallery, gallery_crops=gallery_crops)
+    finally:
+        if frame_source is not None:
+            frame_source.log_stats()
+            frame_source.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+confusion_map = {
+    '0': ['6', '8', '9'],
+    '1': ['7'],
+    '2': ['3', '7'],
+    '3': ['2', '5', '8', '9'],
+    '4': ['1', '7', '9'],
+    '3': ['8', '9'],
+    '5': ['2', '6'],
+    '6': ['5', '8', '0'],
+    '7': ['1'],
+    '8': ['0', '6', '9', '3'],
+    '9': ['8', '0', '3'],
+}
+
+# Upper bound on the number of cost cells computed at once when matching a batch
+_max_batch_cells = 1 << 24
+
+# Code shared by all characters outside Latin-1, which never occur in tag numbers
+_OTHER_CHAR_CODE = 255
+
+def _build_cost_table(similar_penalty):
+    # cost_table[detected_char, expected_char] is the cost of reading expected_char as detected_char: 0 for the
+    # same character, similar_penalty for digits OCR confuses with each other and 1 for any other character.
+    # Characters sharing the code for characters outside Latin-1 may differ, so they always cost 1.
+    cost_table = np.ones((256, 256), dtype=np.float32)
+    np.fill_diagonal(cost_table, 0)
+    cost_table[_OTHER_CHAR_CODE, _OTHER_CHAR_CODE] = 1
+    for char_a, similar_chars in confusion_map.items():
+        for char_b in similar_chars:
+            cost_table[ord(char_a), ord(char_b)] = similar_penalty
+    return cost_table
+
+def _encode(values):
+    # Characters outside Latin-1 all map to _OTHER_CHAR_CODE, which the cost table never treats as a match
+    return np.array([[min(ord(char), _OTHER_CHAR_CODE) for char in value] for value in values], dtype=np.uint8)
+
+# Prebuilt index over the expected eartag numbers. Candidates are grouped by length, with per-position
+# inverted lists used to prune candidates that cannot be within max_distance before the vectorized
+# distance computation. The distance of two values of the same length is the sum of the substitution costs
+# of their characters, and values of other lengths never match.
+class EartagMatcher:
+    def __init__(self, expected_values, similar_penalty=0.5):
+        self.values = list(expected_values)
+        self.similar_penalty = similar_penalty
+        self.cost_table = _build_cost_table(similar_penalty)
+        self.min_mismatch_cost = min(similar_penalty, 1.0)
+
+        values_by_length = {}
+        for idx, value in enumerate(self.values):
+            values_by_length.setdefault(len(value), []).append(idx)
+
+        self.groups = {}
+        for length, indices in values_by_length.items():
+            codes = _encode([self.values[idx] for idx in indices]).reshape(len(indices), length)
+            inverted_lists = [
+                {code: np.flatnonzero(codes[:, pos] == code) for code in np.unique(codes[:, pos])}
+                for pos in range(length)
+            ]
+            self.groups[length] = (np.asarray(indices), codes, inverted_lists)
+
+    @classmethod
+    def from_registry(cls, path, similar_penalty=0.5):
+        return cls(load_registry(path), similar_penalty)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _prune(self, codes, inverted_lists, detected_codes, max_distance):
+        # A candidate needs at least length - max_mismatches exact positional matches to stay within max_distance
+        length = len(detected_codes)
+        min_exact_matches = length - int(max_distance // self.min_mismatch_cost)
+        if min_exact_matches <= 0:
+            return None
+
+        exact_matches = np.zeros(len(codes), dtype=np.int32)
+        for pos, code in enumerate(detected_codes):
+            if code == _OTHER_CHAR_CODE:
+                continue
+            rows = inverted_lists[pos].get(code)
+            if rows is not None:
+                exact_matches[rows] += 1
+        return np.flatnonzero(exact_matches >= min_exact_matches)
+
+    def match(self, detected_value, max_distance=1.0):
+        group = self.groups.get(len(detected_value))
+        if group is None:
+            return detected_value
+
+        indices, codes, inverted_lists = group
+        detected_codes = _encode([detected_value]).reshape(len(detected_value))
+
+        rows = self._prune(codes, inverted_lists, detected_codes, max_distance)
+        if rows is not None:
+            if len(rows) == 0:
+                return detected_value
+            indices, codes = indices[rows], codes[rows]
+
+        distances = self.cost_table[detected_codes[None, :], codes].sum(axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] <= max_distance:
+            return self.values[indices[best]]
+        return detected_value
+
+    def match_batch(self, detected_values, max_distance=1.0):
+        matches = list(detected_values)
+
+        positions_by_length = {}
+        for pos, value in enumerate(detected_values):
+            if len(value) in self.groups:
+                positions_by_length.setdefault(len(value), []).append(pos)
+
+        for length, positions in positions_by_length.items():
+            indices, codes, inverted_lists = self.groups[length]
+            detected_codes = _encode([detected_values[pos] for pos in positions]).reshape(len(positions), length)
+
+            # Bound the size of the (detected, candidates, length) cost array
+            chunk_size = max(1, _max_batch_cells // max(1, len(codes) * length))
+            for start in range(0, len(positions), chunk_size):
+                chunk = detected_codes[start:start + chunk_size]
+                if self._prune(codes, inverted_lists, chunk[0], max_distance) is not None:
+                    best = self._best_pruned(chunk, codes, inverted_lists, max_distance)
+                else:
+                    distances = self.cost_table[chunk[:, None, :], codes[None, :, :]].sum(axis=2)
+                    best = np.argmin(distances, axis=1)
+                    best = [(offset, candidate) for offset, candidate in enumerate(best.tolist()) if distances[offset, candidate] <= max_distance]
+
+                for offset, candidate in best:
+                    matches[positions[start + offset]] = self.values[indices[candidate]]
+
+        return matches
+
+    def _best_pruned(self, chunk, codes, inverted_lists, max_distance):
+        # Each detected value is compared only with the candidates left after pruning, with the (value, candidate)
+        # pairs of the chunk costed together. Returns (offset, candidate) of the values with a match in range.
+        rows = [self._prune(codes, inverted_lists, value_codes, max_distance) for value_codes in chunk]
+        pair_value = np.repeat(np.arange(len(chunk)), [len(value_rows) for value_rows in rows])
+        if len(pair_value) == 0:
+            return []
+        pair_row = np.concatenate(rows)
+
+        distances = self.cost_table[chunk[pair_value], codes[pair_row]].sum(axis=1)
+
+        # Lowest distance first within each value; the sort is stable so ties keep the first candidate like argmin
+        order = np.lexsort((distances, pair_value))
+        first = order[np.r_[True, pair_value[order][1:] != pair_value[order][:-1]]]
+        return [
+            (int(pair_value[pair]), int(pair_row[pair]))
+            for pair in first if distances[pair] <= max_distance
+        ]
+
+def load_registry(path):
+    # Reads expected eartag numbers from a JSON list, or from a text/CSV file with one number per row in the first column
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, "r") as f:
+            values = [str(value) for value in json.load(f)]
+    else:
+        with open(path, "r", newline="") as f:
+            values = [row[0].strip() for row in csv.reader(f) if row and row[0].strip() and not row[0].startswith("#")]
+
+    logger.info(f"Loaded {len(values)} eartag numbers from registry: {path}")
+    return values
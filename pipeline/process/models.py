@@ -0,0 +1,65 @@
+import os
+import logging
+from functools import lru_cache
+
+import numpy as np
+import cv2
+
+from pipeline.utils.config import get_config
+from pipeline.process.backends import load_yolo
+
+logger = logging.getLogger(__name__)
+config = get_config()
+models_dir = os.path.abspath(config.get("models_dir"))
+inference_backend = config.get("inference_backend", "pytorch")
+inference_int8 = config.get("inference_int8", False)
+int8_calibration_capture = config.get("int8_calibration_capture")
+
+# CPU threads PaddleOCR may use, limited when several processes share the machine
+ocr_cpu_threads = None
+
+FACE_MODEL_FILENAME = "cow_face_yolo11n_v1.pt"
+DETECTION_MODEL_FILENAME = "cow_muzzle_eartag_yolo11n_v1.pt"
+
+def create_face_model():
+    logger.info(f"Loading face model: {FACE_MODEL_FILENAME} ({inference_backend} backend)")
+    return load_yolo(os.path.join(models_dir, FACE_MODEL_FILENAME), inference_backend, inference_int8, int8_calibration_capture)
+
+def create_detection_model():
+    logger.info(f"Loading muzzle/eartag model: {DETECTION_MODEL_FILENAME} ({inference_backend} backend)")
+    return load_yolo(os.path.join(models_dir, DETECTION_MODEL_FILENAME), inference_backend, inference_int8, int8_calibration_capture)
+
+def create_ocr_model():
+    # paddleocr pulls in paddle, so it is only imported once the OCR model is needed
+    from paddleocr import PaddleOCR
+
+    logger.info("Loading PaddleOCR model")
+    thread_options = {"cpu_threads": ocr_cpu_threads} if ocr_cpu_threads else {}
+    return PaddleOCR(
+        use_doc_orientation_classify=False,
+        use_doc_unwarping=False,
+        use_textline_orientation=False,
+        **thread_options)
+
+# Shared models are loaded once per process and used by every session processed in it. Models are not
+# thread-safe, so concurrent workers create their own instances with the create_* functions.
+load_face_model = lru_cache(maxsize=None)(create_face_model)
+load_detection_model = lru_cache(maxsize=None)(create_detection_model)
+load_ocr_model = lru_cache(maxsize=None)(create_ocr_model)
+
+def set_thread_budget(num_threads):
+    # Limits the intra-op threads of torch, OpenCV and PaddleOCR models created afterwards
+    global ocr_cpu_threads
+    import torch
+
+    torch.set_num_threads(num_threads)
+    cv2.setNumThreads(num_threads)
+    ocr_cpu_threads = num_threads
+    logger.info(f"Limited inference to {num_threads} CPU threads")
+
+def warm_up_models():
+    # Runs each model once on a blank input so the first real frame doesn't pay for lazy initialization
+    load_face_model()(np.zeros((480, 640, 3), dtype=np.uint8), verbose=False)
+    load_detection_model()(np.zeros((160, 160, 3), dtype=np.uint8), verbose=False)
+    load_ocr_model().predict(input=np.zeros((48, 160, 3), dtype=np.uint8))
+    logger.info("Models loaded and warmed up")
@@ -1,68 +1,62 @@
+import time
 import logging
+from functools import lru_cache
 
-from paddleocr import PaddleOCR
+from pipeline.utils.config import get_config
+from pipeline.utils import metrics
+from pipeline.process.models import load_ocr_model
+from pipeline.process.matcher import EartagMatcher
 
 logger = logging.getLogger(__name__)
+config = get_config()
+ocr_batch_size = config.get("ocr_batch_size", 8)
+ocr_max_distance = config.get("ocr_max_distance", 3)
+eartag_registry_path = config.get("eartag_registry_path")
 
-ocr_model = PaddleOCR(
-    use_doc_orientation_classify=False,
-    use_doc_unwarping=False,
-    use_textline_orientation=False)
+@lru_cache(maxsize=None)
+def get_eartag_matcher():
+    if eartag_registry_path:
+        return EartagMatcher.from_registry(eartag_registry_path)
 
-def digit_edit_distance(a, b, confusion_map, similar_penalty=0.5):
-    if len(a) != len(b):
-        return float('inf')  # Don't compare if lengths are different
-
-    distance = 0
-    for char_a, char_b in zip(a, b):
-        if char_a == char_b:
-            continue
-        elif char_b in confusion_map.get(char_a, []):
-            distance += similar_penalty  # Less penalty for similar digits
-        else:
-            distance += 1  # Full penalty for unrelated digits
-    return distance
-
-def ocr_digit_correct(expected_values, detected_value, max_distance=1.0):
-    confusion_map = {
-        '0': ['6', '8', '9'],
-        '1': ['7'],
-        '2': ['3', '7'],
-        '3': ['2', '5', '8', '9'],
-        '4': ['1', '7', '9'],
-        '3': ['8', '9'],
-        '5': ['2', '6'],
-        '6': ['5', '8', '0'],
-        '7': ['1'],
-        '8': ['0', '6', '9', '3'],
-        '9': ['8', '0', '3'],
-    }
-
-    candidates = []
-    for value in expected_values:
-        dist = digit_edit_distance(detected_value, value, confusion_map)
-        if dist <= max_distance:
-            candidates.append((value, dist))
-
-    if candidates:
-        candidates.sort(key=lambda x: x[1])  # Sort by lowest distance
-        return candidates[0][0]
-
-    return detected_value  # No good match found
-
-
-def perform_ocr(image):
-    result = ocr_model.predict(input=image)
-
-    texts = []
-    for res in result:  
-        rec_texts = "".join(res.get('rec_texts', []))
-        texts.append(rec_texts)
-    
-    ocr_value = "".join(texts)
-
-    # TODO: Replace hardcoded expected OCR values with values from RFID readings
+    # Fallback for tracks without RFID readings nearby, see rfid_index
     expected_ocr_values = ["1785", "1120", "1032", "2292", "321"]
     expected_ocr_values.extend([str(i).zfill(3) for i in range(1, 51)])
-    
-    return ocr_digit_correct(expected_ocr_values, ocr_value, max_distance=3)
\ No newline at end of file
+    return EartagMatcher(expected_ocr_values)
+
+def _recognized_text(result):
+    return "".join(result.get('rec_texts', []))
+
+def correct_ocr_texts(texts, matcher=None):
+    # Corrects recognized texts against the given matcher, or against the expected eartag numbers of the herd
+    matcher = matcher if matcher is not None else get_eartag_matcher()
+    match_start_time = time.time()
+    matches = matcher.match_batch(texts, max_distance=ocr_max_distance)
+    if texts:
+        metrics.observe("ocr_match_seconds", (time.time() - match_start_time) / len(texts), count=len(texts))
+    return matches
+
+def perform_batch_ocr(images, batch_size=None, ocr_model=None, correct=True):
+    # With correct=False the raw recognized texts are returned, for callers that correct them against their own candidates
+    batch_size = batch_size or ocr_batch_size
+    if ocr_model is None:
+        ocr_model = load_ocr_model()
+    total_batches = (len(images) + batch_size - 1) // batch_size
+
+    texts = []
+    for batch_idx, start in enumerate(range(0, len(images), batch_size), 1):
+        batch = images[start:start + batch_size]
+
+        batch_start_time = time.time()
+        results = ocr_model.predict(input=batch)
+        batch_time = time.time() - batch_start_time
+        metrics.observe("ocr_crop_seconds", batch_time / len(batch), count=len(batch))
+        metrics.inc("ocr_crops_total", len(batch))
+
+        batch_texts = [_recognized_text(res) for res in results]
+        texts.extend(correct_ocr_texts(batch_texts) if correct else batch_texts)
+        logger.info(
+            f"OCR batch {batch_idx}/{total_batches}: {len(batch)} crops in {batch_time:.4f} seconds "
+            f"({batch_time / len(batch):.4f} seconds per crop)"
+        )
+
+    return texts
@@ -0,0 +1,150 @@
+import time
+import queue
+import logging
+import threading
+
+from pipeline.utils.config import get_config
+from pipeline.utils.frame_store import FramePrefetcher
+from pipeline.process.tracking import TrackingSession, resolve_decode_reduction, _clear_tracking_results, _save_track_result
+from pipeline.process.detection import detect_objects
+from pipeline.process.analysis import analyze_detections
+from pipeline.process.models import load_face_model, load_detection_model, create_detection_model, load_ocr_model, create_ocr_model
+
+logger = logging.getLogger(__name__)
+config = get_config()
+pipeline_detection_workers = config.get("pipeline_detection_workers", 1)
+pipeline_analysis_workers = config.get("pipeline_analysis_workers", 1)
+pipeline_queue_size = config.get("pipeline_queue_size", 8)
+
+class _StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_time = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, busy_time):
+        with self._lock:
+            self.items += 1
+            self.busy_time += busy_time
+
+    def log(self):
+        average = self.busy_time / self.items if self.items else 0
+        logger.info(f"{self.name} stage: {self.items} items, {self.busy_time:.2f} seconds busy ({average:.4f} seconds per item)")
+
+def _start_workers(name, models, target):
+    workers = [threading.Thread(target=target, args=(model,), name=f"{name}-{idx}", daemon=True) for idx, model in enumerate(models)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+def run_pipelined(capture_dir, frame_store, save_intermediate_results=False, detection_workers=None, analysis_workers=None, queue_size=None, gallery_crops=None):
+    # Tracking runs on the calling thread and hands each track to the detection workers as soon as it is
+    # finalized, and detected tracks flow on to the analysis workers, so decode, detection and OCR overlap
+    detection_workers = detection_workers or pipeline_detection_workers
+    analysis_workers = analysis_workers or pipeline_analysis_workers
+    queue_size = queue_size or pipeline_queue_size
+
+    detection_queue = queue.Queue(maxsize=queue_size)
+    analysis_queue = queue.Queue(maxsize=queue_size)
+
+    tracking_stats = _StageStats("Tracking")
+    detection_stats = _StageStats("Object detection")
+    analysis_stats = _StageStats("Analysis")
+
+    results = []
+    results_lock = threading.Lock()
+
+    # Models are not thread-safe: the first worker of a stage uses the shared model and additional workers get their own
+    detection_models = [load_detection_model()] + [create_detection_model() for _ in range(detection_workers - 1)]
+    ocr_models = [load_ocr_model()] + [create_ocr_model() for _ in range(analysis_workers - 1)]
+
+    def detection_worker(model):
+        while True:
+            obj = detection_queue.get()
+            if obj is None:
+                break
+
+            start_time = time.time()
+            try:
+                detect_objects([obj], capture_dir, save_intermediate_results=save_intermediate_results, frame_store=frame_store, model=model)
+            except Exception as e:
+                logger.exception(f"An error occurred during object detection on Track ID {obj['id']}: {e}")
+            detection_stats.record(time.time() - start_time)
+            analysis_queue.put(obj)
+
+    def analysis_worker(ocr_model):
+        while True:
+            obj = analysis_queue.get()
+            if obj is None:
+                break
+
+            start_time = time.time()
+            try:
+                analyze_detections([obj], capture_dir, frame_store=frame_store, ocr_model=ocr_model, gallery_crops=gallery_crops)
+            except Exception as e:
+                logger.exception(f"An error occurred during analysis of Track ID {obj['id']}: {e}")
+            analysis_stats.record(time.time() - start_time)
+
+            with results_lock:
+                results.append(obj)
+
+    if save_intermediate_results:
+        _clear_tracking_results(capture_dir)
+
+    def finalize_track(obj):
+        # Track crops are saved before detection adds its per-class crops under the same track directory
+        if save_intermediate_results:
+            _save_track_result(obj, capture_dir, frame_store)
+        detection_queue.put(obj)
+
+    detection_threads = _start_workers("detection", detection_models, detection_worker)
+    analysis_threads = _start_workers("analysis", ocr_models, analysis_worker)
+
+    logger.info(f"Starting pipelined processing ({detection_workers} detection workers, {analysis_workers} analysis workers)")
+    face_model = load_face_model()
+    decode_reduction = resolve_decode_reduction(frame_store, face_model)
+    session = TrackingSession(model=face_model, decode_reduction=decode_reduction)
+    image_names = frame_store.names()
+    total_images = len(image_names)
+
+    prefetcher = FramePrefetcher(frame_store, image_names, decode_reduction)
+    try:
+        for idx, (image_name, frame) in enumerate(prefetcher, 1):
+            if frame is None:
+                logger.warning(f"Failed to load image: {image_name}")
+                continue
+
+            # Time spent waiting for the frame is reported by the prefetcher
+            start_time = time.time()
+            finalized = session.update(image_name, frame)
+            tracking_stats.record(time.time() - start_time)
+
+            for obj in finalized:
+                finalize_track(obj)
+            logger.info(f"Processed {idx}/{total_images} images")
+
+        for obj in session.finish():
+            finalize_track(obj)
+
+    except Exception as e:
+        logger.exception(f"An error occurred during tracking: {e}")
+    finally:
+        for _ in detection_threads:
+            detection_queue.put(None)
+        for thread in detection_threads:
+            thread.join()
+
+        for _ in analysis_threads:
+            analysis_queue.put(None)
+        for thread in analysis_threads:
+            thread.join()
+
+    session.log_summary()
+    prefetcher.log_stats()
+    for stats in (tracking_stats, detection_stats, analysis_stats):
+        stats.log()
+
+    # Tracks finish in the order they are dropped by the tracker; report them in the order they were first seen
+    track_order = {track_id: idx for idx, track_id in enumerate(session.object_map)}
+    return sorted(results, key=lambda obj: track_order[obj["id"]])
@@ -0,0 +1,225 @@
+import numpy as np
+
+# Column arrays written by ResultStore.save and read back by ResultStore.load
+_ARRAY_NAMES = (
+    "track_ids", "frame_names", "class_names", "texts",
+    "track_has_result", "track_eartag", "track_muzzle_clean",
+    "image_track", "image_frame", "image_bbox", "image_key_frame_score", "image_has_detections",
+    "det_image", "det_class", "det_bbox", "det_confidence", "det_eartag", "det_muzzle_clean"
+)
+
+# Optional booleans are stored as int8 with -1 for missing values
+_UNSET = -1
+
+def _table_index(table, index, value):
+    idx = index.get(value)
+    if idx is None:
+        idx = index[value] = len(table)
+        table.append(value)
+    return idx
+
+def _bbox_row(bbox):
+    return (bbox["x1"], bbox["y1"], bbox["x2"], bbox["y2"])
+
+def _bbox_dict(row):
+    return {"x1": row[0], "y1": row[1], "x2": row[2], "y2": row[3]}
+
+def _optional_bool(value):
+    return _UNSET if value is None else int(bool(value))
+
+def _string_array(values):
+    return np.array(values, dtype=str) if values else np.zeros(0, dtype="<U1")
+
+# Tracking, detection and analysis results of a session held as NumPy columns instead of nested dicts.
+# Every image entry of every track is a row of the image columns, every detection a row of the detection
+# columns pointing at its image row, and track ids, frame names, class names and OCR texts are kept once in
+# string tables that the id columns index into. Rows are in the order of the nested results, so results
+# converted with from_results come back from to_results as they were, with confidences at single precision.
+# Stages crop track and detection images through the vectorized bbox helpers, computed once per frame size
+# for every row, and stage checkpoints are saved in this form.
+class ResultStore:
+    def __init__(self, arrays):
+        for name in _ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+
+        # Detection rows are grouped by image row, in image row order
+        image_rows = np.arange(len(self.image_track))
+        self._det_starts = np.searchsorted(self.det_image, image_rows, side="left")
+        self._det_ends = np.searchsorted(self.det_image, image_rows, side="right")
+        self._frame_bboxes = {}
+
+    @classmethod
+    def from_results(cls, results):
+        track_ids, frame_names, class_names, texts = [], [], [], []
+        frame_index, class_index, text_index = {}, {}, {}
+
+        track_has_result, track_eartag, track_muzzle_clean = [], [], []
+        image_track, image_frame, image_bbox, image_key_frame_score, image_has_detections = [], [], [], [], []
+        det_image, det_class, det_bbox, det_confidence, det_eartag, det_muzzle_clean = [], [], [], [], [], []
+
+        for track_idx, obj in enumerate(results):
+            track_ids.append(str(obj["id"]))
+
+            result = obj.get("result")
+            track_has_result.append(result is not None)
+            eartag_number = result.get("eartag_number") if result is not None else None
+            track_eartag.append(_table_index(texts, text_index, eartag_number) if eartag_number is not None else _UNSET)
+            track_muzzle_clean.append(_optional_bool(result.get("is_muzzle_clean") if result is not None else None))
+
+            for image_entry in obj["images"]:
+                image_idx = len(image_track)
+                image_track.append(track_idx)
+                image_frame.append(_table_index(frame_names, frame_index, image_entry["name"]))
+                image_bbox.append(_bbox_row(image_entry["track_bbox"]))
+                image_key_frame_score.append(image_entry.get("key_frame_score", np.nan))
+                image_has_detections.append("detections" in image_entry)
+
+                for detection in image_entry.get("detections", []):
+                    det_image.append(image_idx)
+                    det_class.append(_table_index(class_names, class_index, detection["class"]))
+                    det_bbox.append(_bbox_row(detection["bbox"]))
+                    det_confidence.append(detection.get("confidence", np.nan))
+                    eartag_number = detection.get("eartag_number")
+                    det_eartag.append(_table_index(texts, text_index, eartag_number) if eartag_number is not None else _UNSET)
+                    det_muzzle_clean.append(_optional_bool(detection.get("is_muzzle_clean")))
+
+        return cls({
+            "track_ids": _string_array(track_ids),
+            "frame_names": _string_array(frame_names),
+            "class_names": _string_array(class_names),
+            "texts": _string_array(texts),
+            "track_has_result": np.array(track_has_result, dtype=bool),
+            "track_eartag": np.array(track_eartag, dtype=np.int32),
+            "track_muzzle_clean": np.array(track_muzzle_clean, dtype=np.int8),
+            "image_track": np.array(image_track, dtype=np.int32),
+            "image_frame": np.array(image_frame, dtype=np.int32),
+            "image_bbox": np.array(image_bbox, dtype=np.int32).reshape(-1, 4),
+            "image_key_frame_score": np.array(image_key_frame_score, dtype=np.float64),
+            "image_has_detections": np.array(image_has_detections, dtype=bool),
+            "det_image": np.array(det_image, dtype=np.int32),
+            "det_class": np.array(det_class, dtype=np.int32),
+            "det_bbox": np.array(det_bbox, dtype=np.int32).reshape(-1, 4),
+            "det_confidence": np.array(det_confidence, dtype=np.float32),
+            "det_eartag": np.array(det_eartag, dtype=np.int32),
+            "det_muzzle_clean": np.array(det_muzzle_clean, dtype=np.int8)
+        })
+
+    def to_results(self):
+        # Nested dict results as produced by the stages, for visualization, logging and JSON output
+        track_ids = self.track_ids.tolist()
+        frame_names = self.frame_names.tolist()
+        class_names = self.class_names.tolist()
+        texts = self.texts.tolist()
+
+        results = []
+        for track_id, has_result, eartag, muzzle_clean in zip(track_ids, self.track_has_result.tolist(), self.track_eartag.tolist(), self.track_muzzle_clean.tolist()):
+            obj = {"id": track_id, "images": []}
+            if has_result:
+                obj["result"] = {
+                    "eartag_number": texts[eartag] if eartag != _UNSET else None,
+                    "is_muzzle_clean": bool(muzzle_clean) if muzzle_clean != _UNSET else None
+                }
+            results.append(obj)
+
+        image_entries = []
+        for track_idx, frame_idx, bbox, score, has_detections in zip(
+            self.image_track.tolist(), self.image_frame.tolist(), self.image_bbox.tolist(),
+            self.image_key_frame_score.tolist(), self.image_has_detections.tolist()
+        ):
+            image_entry = {"name": frame_names[frame_idx], "track_bbox": _bbox_dict(bbox)}
+            if score == score:
+                image_entry["key_frame_score"] = score
+            if has_detections:
+                image_entry["detections"] = []
+            results[track_idx]["images"].append(image_entry)
+            image_entries.append(image_entry)
+
+        for image_idx, class_idx, bbox, confidence, eartag, muzzle_clean in zip(
+            self.det_image.tolist(), self.det_class.tolist(), self.det_bbox.tolist(),
+            self.det_confidence.tolist(), self.det_eartag.tolist(), self.det_muzzle_clean.tolist()
+        ):
+            detection = {"class": class_names[class_idx], "bbox": _bbox_dict(bbox)}
+            if confidence == confidence:
+                detection["confidence"] = confidence
+            if eartag != _UNSET:
+                detection["eartag_number"] = texts[eartag]
+            if muzzle_clean != _UNSET:
+                detection["is_muzzle_clean"] = bool(muzzle_clean)
+            image_entries[image_idx]["detections"].append(detection)
+
+        return results
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in _ARRAY_NAMES}
+
+    def save(self, file, **extra_arrays):
+        # Uncompressed so loading is a plain read of each column; extra arrays are saved alongside the columns
+        np.savez(file, **self.arrays(), **extra_arrays)
+    @classmethod
+    def load(cls, file):
+        with np.load(file, allow_pickle=False) as data:
+            return cls({name: data[name] for name in _ARRAY_NAMES})
+
+    def clipped_track_bboxes(self, frame_height, frame_width):
+        # Track bboxes clamped to the frame the way FrameStore.get_region crops them, with empty crops
+        # collapsed onto their top-left corner. Frame sizes are scalars or per image row arrays.
+        x1 = np.clip(self.image_bbox[:, 0], 0, frame_width)
+        y1 = np.clip(self.image_bbox[:, 1], 0, frame_height)
+        x2 = np.maximum(x1, np.minimum(self.image_bbox[:, 2], frame_width))
+        y2 = np.maximum(y1, np.minimum(self.image_bbox[:, 3], frame_height))
+        return np.stack((x1, y1, x2, y2), axis=1)
+
+    def detection_crop_bboxes(self):
+        # Detection bboxes relative to their track crop, clamped at the crop origin and never inverted
+        x1 = np.maximum(0, self.det_bbox[:, 0])
+        y1 = np.maximum(0, self.det_bbox[:, 1])
+        x2 = np.maximum(x1, self.det_bbox[:, 2])
+        y2 = np.maximum(y1, self.det_bbox[:, 3])
+        return np.stack((x1, y1, x2, y2), axis=1)
+
+    def detection_frame_bboxes(self, frame_height, frame_width):
+        # Frame coordinates of the pixels each detection crop covers, for cropping detections straight from
+        # full frames without cutting out the track crop first
+        track_bboxes = self.clipped_track_bboxes(frame_height, frame_width)[self.det_image]
+        crop_bboxes = self.detection_crop_bboxes()
+
+        crop_width = (track_bboxes[:, 2] - track_bboxes[:, 0])[:, None]
+        crop_height = (track_bboxes[:, 3] - track_bboxes[:, 1])[:, None]
+        crop_bboxes[:, [0, 2]] = np.minimum(crop_bboxes[:, [0, 2]], crop_width) + track_bboxes[:, [0]]
+        crop_bboxes[:, [1, 3]] = np.minimum(crop_bboxes[:, [1, 3]], crop_height) + track_bboxes[:, [1]]
+        return crop_bboxes
+
+    def class_mask(self, *class_names):
+        # Detection rows of the given classes, compared case-insensitively
+        wanted = {name.lower() for name in class_names}
+        class_ids = [idx for idx, name in enumerate(self.class_names.tolist()) if name.lower() in wanted]
+        return np.isin(self.det_class, class_ids)
+
+    def stats(self):
+        return {
+            "tracks": len(self.track_ids),
+            "images": len(self.image_track),
+            "detections": len(self.det_image),
+            "bytes": sum(array.nbytes for array in self.arrays().values())
+        }
+
+    def frame_bboxes(self, frame_shape):
+        # Clamped track bboxes and detection crop bboxes in frame coordinates for frames of the given shape
+        key = tuple(frame_shape[:2])
+        bboxes = self._frame_bboxes.get(key)
+        if bboxes is None:
+            bboxes = self._frame_bboxes[key] = (self.clipped_track_bboxes(*key).tolist(), self.detection_frame_bboxes(*key).tolist())
+        return bboxes
+
+    def detection_rows(self, image_row):
+        return range(self._det_starts[image_row], self._det_ends[image_row])
+
+    def track_crop(self, image_row, frame):
+        # Same pixels as FrameStore.get_region with the track bbox of the image row
+        x1, y1, x2, y2 = self.frame_bboxes(frame.shape)[0][image_row]
+        return frame[y1:y2, x1:x2]
+
+    def detection_crops(self, image_row, frame):
+        # Crops of the detections of the image row, cut straight from the frame, in detection order
+        det_bboxes = self.frame_bboxes(frame.shape)[1]
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in (det_bboxes[row] for row in self.detection_rows(image_row))]
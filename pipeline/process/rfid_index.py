@@ -0,0 +1,100 @@
+import os
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from pipeline.utils.config import get_config
+from pipeline.utils.rfid_log import load_rfid_readings, RFID_LOG_FILENAME, LEGACY_RFID_READINGS_FILENAME
+from pipeline.process.matcher import EartagMatcher
+
+logger = logging.getLogger(__name__)
+config = get_config()
+rfid_candidates = config.get("rfid_candidates", True)
+rfid_window_captures = config.get("rfid_window_captures", 5)
+
+def capture_position(image_name):
+    # Captures are named after their zero-padded capture counter, e.g. 0042.png is capture 42
+    capture_id = os.path.splitext(os.path.basename(image_name))[0]
+    return int(capture_id) if capture_id.isdigit() else None
+
+# RFID tags read during a session, indexed by capture position. Readings are kept as parallel arrays of
+# positions and tag ids sorted by position, so the tags read within a window of captures are one binary
+# search and a slice away. Each distinct set of nearby tags gets one small EartagMatcher.
+class RfidIndex:
+    def __init__(self, readings, window=None):
+        self.window = window if window is not None else rfid_window_captures
+
+        positioned_readings = []
+        for capture_id, tags in readings.items():
+            position = capture_position(capture_id)
+            if position is None:
+                logger.warning(f"Ignoring RFID readings of capture with a non-numeric id: {capture_id}")
+                continue
+            positioned_readings.append((position, {str(tag) for tag in tags}))
+
+        self.tags = sorted({tag for _, tags in positioned_readings for tag in tags})
+        tag_ids = {tag: idx for idx, tag in enumerate(self.tags)}
+
+        positions, reading_tags = [], []
+        for position, tags in positioned_readings:
+            for tag in tags:
+                positions.append(position)
+                reading_tags.append(tag_ids[tag])
+
+        order = np.argsort(positions, kind="stable")
+        self.positions = np.asarray(positions, dtype=np.int64)[order]
+        self.reading_tags = np.asarray(reading_tags, dtype=np.int32)[order]
+
+        self._matchers = {}
+
+    @classmethod
+    def from_session(cls, session_dir, window=None):
+        return cls(load_rfid_readings(session_dir), window)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def tags_between(self, first_position, last_position):
+        start = np.searchsorted(self.positions, first_position - self.window, side="left")
+        end = np.searchsorted(self.positions, last_position + self.window, side="right")
+        return [self.tags[idx] for idx in np.unique(self.reading_tags[start:end])]
+
+    def tags_near(self, image_names):
+        # Tags read within the window around the captures spanned by the given frames
+        positions = [position for position in map(capture_position, image_names) if position is not None]
+        if not positions:
+            return []
+        return self.tags_between(min(positions), max(positions))
+
+    def matcher_for(self, image_names):
+        # Matcher over the tags read near the frames, or None when no tag was read there
+        tags = tuple(self.tags_near(image_names))
+        if not tags:
+            return None
+
+        matcher = self._matchers.get(tags)
+        if matcher is None:
+            matcher = self._matchers[tags] = EartagMatcher(tags)
+        return matcher
+
+@lru_cache(maxsize=8)
+def _cached_rfid_index(session_dir, stamp, window):
+    return RfidIndex.from_session(session_dir, window)
+
+def _readings_stamp(session_dir):
+    # Readings of a live session keep being appended, so the index is rebuilt whenever the file changes
+    for filename in (RFID_LOG_FILENAME, LEGACY_RFID_READINGS_FILENAME):
+        path = os.path.join(session_dir, filename)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            return (filename, stat.st_size, stat.st_mtime)
+    return None
+
+def load_rfid_index(session_dir, window=None):
+    # Index of a session's RFID readings, or None when the session has none
+    stamp = _readings_stamp(session_dir)
+    if stamp is None:
+        return None
+    index = _cached_rfid_index(os.path.abspath(session_dir), stamp, window if window is not None else rfid_window_captures)
+    return index if len(index) else None
@@ -0,0 +1,58 @@
+import os
+import json
+import time
+import logging
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+
+from pipeline.utils.log import setup_logging, log_time_taken
+from pipeline.process.models import warm_up_models
+from pipeline.process.main import run_pipeline, pipeline_mode
+from pipeline.process.client import processing_server_host, processing_server_port, load_authkey
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+def handle_request(request):
+    capture_dir = request.get("capture_dir")
+    if not capture_dir or not os.path.isdir(capture_dir):
+        return {"status": "error", "error": f"Capture directory not found: {capture_dir}"}
+
+    try:
+        analysis_results, _ = run_pipeline(
+            capture_dir,
+            save_intermediate_results=request.get("save_intermediate_results", False),
+            pipelined=request.get("pipelined", pipeline_mode == "pipelined"))
+    except Exception as e:
+        logger.exception(f"An error occurred while processing {capture_dir}: {e}")
+        return {"status": "error", "error": str(e)}
+
+    return {"status": "ok", "results": analysis_results}
+
+def main():
+    # Checked before the models are loaded, so a missing key fails right away
+    authkey = load_authkey()
+
+    startup_time = time.time()
+    warm_up_models()
+    log_time_taken("Model loading", startup_time)
+
+    address = (processing_server_host, processing_server_port)
+    with Listener(address, authkey=authkey) as listener:
+        logger.info(f"Processing server listening on {address[0]}:{address[1]}")
+
+        # Requests are served one at a time since the models are shared and not thread-safe
+        while True:
+            try:
+                with listener.accept() as conn:
+                    request = json.loads(conn.recv_bytes().decode())
+                    logger.info(f"Received request: {request}")
+                    conn.send_bytes(json.dumps(handle_request(request)).encode())
+            except (EOFError, ConnectionError, AuthenticationError, json.JSONDecodeError) as e:
+                logger.warning(f"Dropped malformed or interrupted request: {e}")
+            except KeyboardInterrupt:
+                logger.info("Processing server stopped")
+                break
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import time
+import logging
+
+import numpy as np
+
+from pipeline.utils.config import get_config
+from pipeline.utils import metrics
+
+logger = logging.getLogger(__name__)
+config = get_config()
+tracker_backend = config.get("tracker_backend", "deepsort")
+lazy_embedding_iou = config.get("lazy_embedding_iou", 0.5)
+
+TRACKER_BACKENDS = ("deepsort", "bytetrack", "deepsort_lazy")
+
+# Every tracker backend takes detections as ([left, top, width, height], confidence, class) tuples and the
+# frame they were found in, and returns its live tracks. Tracks have a string track_id, is_confirmed() and
+# to_ltrb(), like DeepSort tracks. Confirmed tracks that missed detections are kept until max_age frames.
+
+# ByteTrack association: detections above _high_score are matched first, the rest down to _low_score only
+# to tracks that were matched in the previous frame. New tracks start from unmatched detections above _new_track_score.
+_high_score = 0.5
+_low_score = 0.1
+_new_track_score = 0.6
+_high_match_iou = 0.2
+_low_match_iou = 0.5
+_tentative_match_iou = 0.3
+
+# Detections overlapping more than one track (or a track overlapping more than one detection) above this IoU
+# are ambiguous for the lazy DeepSort backend
+_ambiguity_iou = 0.1
+
+def _ltwh_to_ltrb(boxes):
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4).copy()
+    boxes[:, 2:] += boxes[:, :2]
+    return boxes
+
+def _xyah_to_ltrb(xyah):
+    xyah = np.asarray(xyah, dtype=np.float64).reshape(-1, 4)
+    w = xyah[:, 2] * xyah[:, 3]
+    return np.stack([xyah[:, 0] - w / 2, xyah[:, 1] - xyah[:, 3] / 2, xyah[:, 0] + w / 2, xyah[:, 1] + xyah[:, 3] / 2], axis=1)
+
+def _ltrb_to_xyah(boxes):
+    w, h = boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w / np.maximum(h, 1e-9), h], axis=1)
+
+def _iou_matrix(boxes_a, boxes_b):
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+def _associate(track_boxes, det_boxes, min_iou):
+    # Optimal one-to-one assignment on IoU, keeping only pairs that overlap at least min_iou
+    if len(track_boxes) == 0 or len(det_boxes) == 0:
+        return [], list(range(len(track_boxes))), list(range(len(det_boxes)))
+
+    from scipy.optimize import linear_sum_assignment
+
+    iou = _iou_matrix(track_boxes, det_boxes)
+    rows, cols = linear_sum_assignment(-iou)
+    matches = [(row, col) for row, col in zip(rows, cols) if iou[row, col] >= min_iou]
+
+    matched_tracks = {row for row, _ in matches}
+    matched_dets = {col for _, col in matches}
+    return (
+        matches,
+        [idx for idx in range(len(track_boxes)) if idx not in matched_tracks],
+        [idx for idx in range(len(det_boxes)) if idx not in matched_dets]
+    )
+
+class DeepSortTracker:
+    def __init__(self, max_age=5):
+        # deep_sort_realtime pulls in torch for its embedder, so it is only imported when a tracker is created
+        from deep_sort_realtime.deepsort_tracker import DeepSort
+
+        self.deepsort = DeepSort(max_age=max_age, n_init=2, half=True)
+        self.embedding_time = 0.0
+
+        # Embeddings are kept for the last detections list, so detections reused for an unchanged frame aren't embedded again
+        self._embedded_detections = None
+        self._embeds = []
+
+    def _generate_embeds(self, frame, detections):
+        if not detections:
+            return []
+
+        embedding_start_time = time.time()
+        embeds = self.deepsort.generate_embeds(frame, detections)
+        self.embedding_time += time.time() - embedding_start_time
+        metrics.inc("embedded_detections_total", len(detections))
+        return list(embeds)
+
+    def _embed(self, frame, detections):
+        return self._generate_embeds(frame, detections)
+
+    def update(self, detections, frame):
+        if detections is not self._embedded_detections:
+            self._embeds = self._embed(frame, detections)
+            self._embedded_detections = detections
+        return self.deepsort.update_tracks(detections, embeds=self._embeds)
+
+class LazyDeepSortTracker(DeepSortTracker):
+    # DeepSort that only runs the embedder on ambiguous detections. A detection that overlaps the predicted box of
+    # exactly one track above lazy_embedding_iou, with that track overlapping no other detection, reuses the track's
+    # latest feature, so the appearance metric matches it to that track without a new embedding.
+    def __init__(self, max_age=5, match_iou=None):
+        super().__init__(max_age)
+        self.match_iou = match_iou if match_iou is not None else lazy_embedding_iou
+
+    def _embed(self, frame, detections):
+        tracks = [track for track in self.deepsort.tracker.tracks if track.features]
+        if not detections or not tracks:
+            return self._generate_embeds(frame, detections)
+
+        kf = self.deepsort.tracker.kf
+        predicted = _xyah_to_ltrb([kf.predict(track.mean, track.covariance)[0][:4] for track in tracks])
+        iou = _iou_matrix(predicted, _ltwh_to_ltrb([ltwh for ltwh, _, _ in detections]))
+
+        overlaps = iou >= _ambiguity_iou
+        unambiguous = overlaps & (overlaps.sum(axis=0, keepdims=True) == 1) & (overlaps.sum(axis=1, keepdims=True) == 1)
+        track_indices, det_indices = np.nonzero(unambiguous & (iou >= self.match_iou))
+
+        embeds = [None] * len(detections)
+        for track_idx, det_idx in zip(track_indices, det_indices):
+            embeds[det_idx] = tracks[track_idx].get_feature()
+        metrics.inc("reused_embeddings_total", len(det_indices))
+
+        missing = [idx for idx, embed in enumerate(embeds) if embed is None]
+        for idx, embed in zip(missing, self._generate_embeds(frame, [detections[idx] for idx in missing])):
+            embeds[idx] = embed
+        return embeds
+
+# Constant velocity Kalman filter over (center x, center y, aspect ratio, height) boxes with the noise model of
+# DeepSort, run on all tracks at once
+class _BoxKalmanFilter:
+    std_weight_position = 1 / 20
+    std_weight_velocity = 1 / 160
+
+    def __init__(self):
+        self.motion_mat = np.eye(8)
+        self.motion_mat[:4, 4:] = np.eye(4)
+        self.update_mat = np.eye(4, 8)
+
+    def _std(self, heights, position_scale, velocity_scale, aspect_position, aspect_velocity):
+        ones = np.ones_like(heights)
+        return np.stack([
+            position_scale * heights, position_scale * heights, aspect_position * ones, position_scale * heights,
+            velocity_scale * heights, velocity_scale * heights, aspect_velocity * ones, velocity_scale * heights
+        ], axis=1)
+
+    def initiate(self, measurements):
+        means = np.concatenate([measurements, np.zeros_like(measurements)], axis=1)
+        std = self._std(measurements[:, 3], 2 * self.std_weight_position, 10 * self.std_weight_velocity, 1e-2, 1e-5)
+        return means, np.stack([np.diag(s) for s in np.square(std)])
+
+    def predict(self, means, covariances):
+        std = self._std(means[:, 3], self.std_weight_position, self.std_weight_velocity, 1e-2, 1e-5)
+        means = means @ self.motion_mat.T
+        covariances = self.motion_mat @ covariances @ self.motion_mat.T + np.stack([np.diag(s) for s in np.square(std)])
+        return means, covariances
+
+    def update(self, means, covariances, measurements):
+        std = np.square(self._std(means[:, 3], self.std_weight_position, 0, 1e-1, 0)[:, :4])
+        projected_means = means @ self.update_mat.T
+        projected_covariances = self.update_mat @ covariances @ self.update_mat.T + np.stack([np.diag(s) for s in std])
+
+        # Kalman gain K = P H^T S^-1, solved as S K^T = H P since S is symmetric
+        gains = np.linalg.solve(projected_covariances, self.update_mat @ covariances).transpose(0, 2, 1)
+        innovations = measurements - projected_means
+        means = means + (gains @ innovations[:, :, None])[:, :, 0]
+        covariances = covariances - gains @ projected_covariances @ gains.transpose(0, 2, 1)
+        return means, covariances
+
+class _KalmanTrack:
+    def __init__(self, track_id, mean, covariance, n_init):
+        self.track_id = track_id
+        self.mean = mean
+        self.covariance = covariance
+        self.hits = 1
+        self.time_since_update = 0
+        self.confirmed = n_init <= 1
+
+    def is_confirmed(self):
+        return self.confirmed
+
+    def to_ltrb(self):
+        return _xyah_to_ltrb(self.mean[:4])[0]
+
+# Motion-only tracker in the style of ByteTrack: Kalman-predicted track boxes are matched to detections by IoU
+# in two passes over high and low confidence detections, without any appearance embeddings.
+class ByteTracker:
+    def __init__(self, max_age=5, n_init=2):
+        self.max_age = max_age
+        self.n_init = n_init
+        self.kf = _BoxKalmanFilter()
+        self.tracks = []
+        self.embedding_time = 0.0
+        self._next_id = 1
+
+    def _predict(self):
+        if not self.tracks:
+            return
+
+        means, covariances = self.kf.predict(np.stack([t.mean for t in self.tracks]), np.stack([t.covariance for t in self.tracks]))
+        for track, mean, covariance in zip(self.tracks, means, covariances):
+            track.mean, track.covariance = mean, covariance
+            track.time_since_update += 1
+
+    def _update(self, tracks, boxes):
+        if not tracks:
+            return
+
+        means, covariances = self.kf.update(
+            np.stack([t.mean for t in tracks]), np.stack([t.covariance for t in tracks]), _ltrb_to_xyah(boxes))
+        for track, mean, covariance in zip(tracks, means, covariances):
+            track.mean, track.covariance = mean, covariance
+            track.hits += 1
+            track.time_since_update = 0
+            if track.hits >= self.n_init:
+                track.confirmed = True
+
+    def _match(self, tracks, boxes, det_indices, min_iou):
+        track_boxes = np.stack([t.to_ltrb() for t in tracks]) if tracks else np.empty((0, 4))
+        matches, unmatched_tracks, unmatched_dets = _associate(track_boxes, boxes[det_indices], min_iou)
+
+        self._update([tracks[row] for row, _ in matches], boxes[[det_indices[col] for _, col in matches]])
+        return [tracks[idx] for idx in unmatched_tracks], [det_indices[idx] for idx in unmatched_dets]
+
+    def update(self, detections, frame=None):
+        boxes = _ltwh_to_ltrb([ltwh for ltwh, _, _ in detections])
+        scores = np.array([conf for _, conf, _ in detections], dtype=np.float64)
+        high_indices = np.flatnonzero(scores >= _high_score)
+        low_indices = np.flatnonzero((scores < _high_score) & (scores >= _low_score))
+
+        self._predict()
+        confirmed = [t for t in self.tracks if t.confirmed]
+        tentative = [t for t in self.tracks if not t.confirmed]
+
+        # Confirmed tracks first take the confident detections, then tracks seen in the previous frame
+        # take the weak ones, and tentative tracks get what is left of the confident detections
+        unmatched_confirmed, remaining_high = self._match(confirmed, boxes, high_indices, _high_match_iou)
+        recent = [t for t in unmatched_confirmed if t.time_since_update == 1]
+        self._match(recent, boxes, low_indices, _low_match_iou)
+        unmatched_tentative, remaining_high = self._match(tentative, boxes, remaining_high, _tentative_match_iou)
+
+        # Unmatched tentative tracks are dropped right away, confirmed tracks after max_age missed frames
+        lost = {id(t) for t in unmatched_tentative}
+        lost.update(id(t) for t in unmatched_confirmed if t.time_since_update > self.max_age)
+        self.tracks = [t for t in self.tracks if id(t) not in lost]
+
+        new_indices = [idx for idx in remaining_high if scores[idx] >= _new_track_score]
+        if new_indices:
+            means, covariances = self.kf.initiate(_ltrb_to_xyah(boxes[new_indices]))
+            for mean, covariance in zip(means, covariances):
+                self.tracks.append(_KalmanTrack(str(self._next_id), mean, covariance, self.n_init))
+                self._next_id += 1
+
+        return list(self.tracks)
+
+def create_tracker(backend=None, max_age=5):
+    backend = backend or tracker_backend
+    if backend == "deepsort":
+        return DeepSortTracker(max_age)
+    if backend == "deepsort_lazy":
+        return LazyDeepSortTracker(max_age)
+    if backend == "bytetrack":
+        return ByteTracker(max_age)
+    raise ValueError(f"Unknown tracker backend: {backend} (expected one of {TRACKER_BACKENDS})")
@@ -1,138 +1,283 @@
 import os
 import shutil
-import glob
 import time
 import logging
 
+import numpy as np
 import cv2
-from ultralytics import YOLO
-from deep_sort_realtime.deepsort_tracker import DeepSort
 
-from pipeline.utils.config import load_yaml_config
+from pipeline.utils.config import get_config
+from pipeline.utils import metrics
+from pipeline.utils.frame_store import FrameStore, FramePrefetcher
+from pipeline.utils.session_store import open_session, REDUCED_READ_FLAGS
+from pipeline.process.models import load_face_model
+from pipeline.process.trackers import create_tracker
 
 logger = logging.getLogger(__name__)
-config = load_yaml_config("pipeline/config.yaml")
-models_dir = os.path.abspath(config.get("models_dir"))
+config = get_config()
+tracking_decode_reduction = config.get("tracking_decode_reduction", 1)
+motion_gating = config.get("motion_gating", False)
+motion_gate_params = {
+    "width": config.get("motion_gate_width", 64),
+    "pixel_threshold": config.get("motion_gate_pixel_threshold", 12),
+    "changed_ratio": config.get("motion_gate_changed_ratio", 0.005),
+    "max_skip": config.get("motion_gate_max_skip", 10)
+}
 
-def _save_tracking_results(object_map, capture_dir):
-    image_dir = os.path.join(capture_dir, "images")
+def _clear_tracking_results(capture_dir):
     tracks_dir = os.path.join(capture_dir, "tracks")
 
     if os.path.exists(tracks_dir):
         shutil.rmtree(tracks_dir)
     os.makedirs(tracks_dir, exist_ok=True)
 
+def _save_track_result(obj, capture_dir, frame_store):
+    track_id = obj["id"]
+    track_dir = os.path.join(capture_dir, "tracks", str(track_id))
+    os.makedirs(track_dir, exist_ok=True)
+
+    for image_entry in obj["images"]:
+        image_name = image_entry["name"]
+        bbox = image_entry["track_bbox"]
+
+        crop = frame_store.get_region(image_name, bbox)
+        if crop is None:
+            logger.warning(f"Could not load image: {image_name}")
+            continue
+
+        if crop.size == 0:
+            logger.warning(f"Empty crop for image {image_name}, track {track_id}")
+            continue
+
+        save_path = os.path.join(track_dir, f"{os.path.splitext(image_name)[0]}.png")
+        cv2.imwrite(save_path, crop)
+
+def _save_tracking_results(object_map, capture_dir, frame_store):
+    _clear_tracking_results(capture_dir)
+
     for obj in object_map.values():
-        track_id = obj["id"]
-        track_dir = os.path.join(tracks_dir, str(track_id))
-        os.makedirs(track_dir, exist_ok=True)
-
-        for image_entry in obj["images"]:
-            image_name = image_entry["name"]
-            bbox = image_entry["track_bbox"]
-
-            image_path = os.path.join(image_dir, image_name)
-            img = cv2.imread(image_path)
-            if img is None:
-                logger.warning(f"Could not load image: {image_path}")
-                continue
+        _save_track_result(obj, capture_dir, frame_store)
+
+# Cheap change detector run before face inference. Frames are compared in grayscale at a small width
+# against the last frame that went through full inference, so slow drift still adds up to a change.
+# Full inference is forced after max_skip unchanged frames in a row.
+class MotionGate:
+    def __init__(self, width=64, pixel_threshold=12, changed_ratio=0.005, max_skip=10):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.changed_ratio = changed_ratio
+        self.max_skip = max_skip
+
+        self.reference = None
+        self.skipped = 0
+
+    def _downscale(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, round(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY if small.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def is_unchanged(self, frame):
+        small = self._downscale(frame)
+
+        if self.reference is not None and self.reference.shape == small.shape and self.skipped < self.max_skip:
+            changed = np.count_nonzero(cv2.absdiff(small, self.reference) > self.pixel_threshold)
+            if changed < self.changed_ratio * small.size:
+                self.skipped += 1
+                return True
+
+        self.reference = small
+        self.skipped = 0
+        return False
+
+def resolve_decode_reduction(frame_store, model, reduction=None):
+    # Frames for tracking are decoded at 1/reduction of their resolution. "auto" picks the largest reduction
+    # that still leaves the long side of a frame at least the model input size, so the model never upsamples.
+    reduction = reduction if reduction is not None else tracking_decode_reduction
+    if reduction != "auto":
+        if reduction not in REDUCED_READ_FLAGS:
+            raise ValueError(f"Unsupported tracking decode reduction: {reduction} (expected auto or one of {tuple(REDUCED_READ_FLAGS)})")
+        return reduction
+
+    names = frame_store.names()
+    frame = frame_store.get(names[0]) if names else None
+    if frame is None:
+        return 1
+
+    imgsz = model.overrides.get("imgsz", 640)
+    imgsz = imgsz if isinstance(imgsz, int) else max(imgsz)
+    long_side = max(frame.shape[:2])
+    return max((r for r in REDUCED_READ_FLAGS if long_side // r >= imgsz), default=1)
+
+class TrackingSession:
+    # Incremental face tracking: frames are fed one at a time and a track is handed back
+    # as finalized as soon as the tracker drops it. Frames decoded at reduced resolution are tracked
+    # as they are, and track bboxes are scaled back to full resolution by decode_reduction.
+    def __init__(self, max_age=5, target_classes=[0], model=None, use_motion_gate=None, decode_reduction=1, tracker_backend=None):
+        self.model = model if model is not None else load_face_model()
+        self.tracker = create_tracker(tracker_backend, max_age=max_age)
+        self.target_classes = target_classes
+        self.decode_reduction = decode_reduction
+
+        use_motion_gate = motion_gating if use_motion_gate is None else use_motion_gate
+        self.motion_gate = MotionGate(**motion_gate_params) if use_motion_gate else None
+
+        self.object_map = {}
+        self.finalized_ids = set()
+
+        self.inference_times = []
+        self.tracking_times = []
+
+        # Detections of the last fully processed frame, reused for unchanged frames
+        self.last_detections = []
+        self.total_frames = 0
+        self.skipped_frames = 0
+
+    def _detect(self, frame):
+        # Inference
+        inference_start_time = time.time()
+        results = self.model(frame, verbose=False)[0]
+        self.inference_times.append(time.time() - inference_start_time)
+        metrics.observe("face_inference_seconds", self.inference_times[-1])
 
-            h, w = img.shape[:2]
-            x1, y1 = max(0, bbox["x1"]), max(0, bbox["y1"])
-            x2, y2 = min(w, bbox["x2"]), min(h, bbox["y2"])
+        # Prepare detections, without empty boxes
+        detections = []
+        for box in results.boxes:
+            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+            conf = float(box.conf[0])
+            cls_id = int(box.cls[0])
 
-            crop = img[y1:y2, x1:x2]
-            if crop.size == 0:
-                logger.warning(f"Empty crop for image {image_path}, track {track_id}")
+            if cls_id in self.target_classes and x2 > x1 and y2 > y1:
+                detections.append(([x1, y1, x2 - x1, y2 - y1], conf, cls_id))
+        return detections
+
+    def update(self, image_name, frame):
+        self.total_frames += 1
+
+        if self.motion_gate is not None and self.motion_gate.is_unchanged(frame):
+            # The tracker is still updated on skipped frames so track ages advance exactly as before,
+            # and trackers with appearance embeddings reuse the ones of the reused detections
+            self.skipped_frames += 1
+            metrics.inc("motion_gate_skipped_frames_total")
+        else:
+            self.last_detections = self._detect(frame)
+
+        # Tracking
+        tracking_start_time = time.time()
+        tracks = self.tracker.update(self.last_detections, frame)
+        self.tracking_times.append(time.time() - tracking_start_time)
+        # Kept under its original name for existing dashboards, although it now times every tracker backend
+        metrics.observe("deepsort_update_seconds", self.tracking_times[-1])
+        metrics.inc("tracked_frames_total")
+
+        for track in tracks:
+            if not track.is_confirmed():
                 continue
 
-            save_path = os.path.join(track_dir, image_name)
-            cv2.imwrite(save_path, crop)
+            track_id = track.track_id
+            x1, y1, x2, y2 = (int(value * self.decode_reduction) for value in track.to_ltrb())
 
-def deepsort(capture_dir, max_age=5, target_classes=[0], save_intermediate_results=False):
-    model = YOLO(os.path.join(models_dir, 'cow_face_yolo11n_v1.pt'))
+            if track_id not in self.object_map:
+                self.object_map[track_id] = {
+                    "id": track_id,
+                    "images": []
+                }
 
-    images_dir = os.path.join(capture_dir, "images")
-    image_paths = sorted(glob.glob(os.path.join(images_dir, "*.png")))
+            self.object_map[track_id]["images"].append({
+                "name": image_name,
+                "track_bbox": {
+                    "x1": x1,
+                    "y1": y1,
+                    "x2": x2,
+                    "y2": y2
+                },
+            })
 
-    if not image_paths:
-        logger.warning(f"No images found in directory: {images_dir}")
-        return []
+        # Deleted tracks are removed from the tracker during the update
+        active_ids = {track.track_id for track in tracks}
+        return self._finalize([track_id for track_id in self.object_map if track_id not in active_ids])
 
-    logger.info("Starting tracking")
-    tracker = DeepSort(max_age=max_age, n_init=2, half=True)
-    object_map = {}
+    def finish(self):
+        return self._finalize(list(self.object_map))
+
+    def _finalize(self, track_ids):
+        finalized = []
+        for track_id in track_ids:
+            if track_id not in self.finalized_ids:
+                self.finalized_ids.add(track_id)
+                finalized.append(self.object_map[track_id])
+        return finalized
+
+    def motion_gate_summary(self):
+        # Time saved is estimated from the average inference and embedding time of fully processed frames
+        processed_frames = self.total_frames - self.skipped_frames
+        full_frame_time = (sum(self.inference_times) + self.tracker.embedding_time) / processed_frames if processed_frames else 0.0
+        return {
+            "frames": self.total_frames,
+            "skipped_frames": self.skipped_frames,
+            "skip_ratio": self.skipped_frames / self.total_frames if self.total_frames else 0.0,
+            "estimated_time_saved": self.skipped_frames * full_frame_time
+        }
+
+    def log_summary(self):
+        avg_inference = sum(self.inference_times) / len(self.inference_times) if self.inference_times else 0
+        avg_tracking = sum(self.tracking_times) / len(self.tracking_times) if self.tracking_times else 0
+
+        logger.info(f"Number of objects tracked: {len(self.object_map)}")
+        logger.info(f"Average inference time per frame: {avg_inference:.4f} seconds")
+        logger.info(f"Average tracking update time per frame: {avg_tracking:.4f} seconds")
 
-    inference_times = []
-    tracking_times = []
-    total_images = len(image_paths)
+        if self.motion_gate is not None:
+            summary = self.motion_gate_summary()
+            logger.info(
+                f"Motion gating skipped {summary['skipped_frames']}/{summary['frames']} frames "
+                f"({summary['skip_ratio']:.1%}), saving an estimated {summary['estimated_time_saved']:.2f} seconds"
+            )
 
+def run_tracking(capture_dir, max_age=5, target_classes=[0], save_intermediate_results=False, frame_store=None):
+    # Returns the tracks and whether every frame was tracked. An error stops tracking and is logged, and the
+    # tracks found until then are returned as incomplete; interrupts are raised after the summary is logged.
+    if frame_store is None:
+        frame_store = FrameStore(open_session(capture_dir))
+
+    image_names = frame_store.names()
+    if not image_names:
+        logger.warning(f"No images found in capture directory: {capture_dir}")
+        return [], True
+
+    logger.info("Starting tracking")
+    model = load_face_model()
+    decode_reduction = resolve_decode_reduction(frame_store, model)
+    session = TrackingSession(max_age=max_age, target_classes=target_classes, model=model, decode_reduction=decode_reduction)
+    total_images = len(image_names)
+    if decode_reduction > 1:
+        logger.info(f"Decoding frames at 1/{decode_reduction} resolution for tracking")
+
+    # The next frames are decoded while the current one goes through inference and the tracker
+    prefetcher = FramePrefetcher(frame_store, image_names, decode_reduction)
+    complete = False
     try:
-        for idx, image_path in enumerate(image_paths, 1):
-            frame = cv2.imread(image_path)
+        for idx, (image_name, frame) in enumerate(prefetcher, 1):
             if frame is None:
-                logger.warning(f"Failed to load image: {image_path}")
+                logger.warning(f"Failed to load image: {image_name}")
                 continue
 
-            # Inference
-            inference_start_time = time.time()
-            results = model(frame, verbose=False)[0]
-            inference_times.append(time.time() - inference_start_time)
-
-            # Prepare detections
-            detections = []
-            for box in results.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                conf = float(box.conf[0])
-                cls_id = int(box.cls[0])
-
-                if cls_id in target_classes:
-                    detections.append(([x1, y1, x2 - x1, y2 - y1], conf, cls_id))
-
-            # Tracking
-            tracking_start_time = time.time()
-            tracks = tracker.update_tracks(detections, frame=frame)
-            tracking_times.append(time.time() - tracking_start_time)
-
-            for track in tracks:
-                if not track.is_confirmed():
-                    continue
-
-                track_id = track.track_id
-                x1, y1, x2, y2 = map(int, track.to_ltrb())
-                base_name = os.path.basename(image_path)
-
-                if track_id not in object_map:
-                    object_map[track_id] = {
-                        "id": track_id,
-                        "images": []
-                    }
-
-                object_map[track_id]["images"].append({
-                    "name": base_name,
-                    "track_bbox": {
-                        "x1": x1,
-                        "y1": y1,
-                        "x2": x2,
-                        "y2": y2
-                    },
-                })
-
+            session.update(image_name, frame)
             logger.info(f"Processed {idx}/{total_images} images")
+        complete = True
 
     except Exception as e:
         logger.exception(f"An error occurred during tracking: {e}")
     finally:
-        logger.info("Completed tracking")
-
-        avg_inference = sum(inference_times) / len(inference_times) if inference_times else 0
-        avg_tracking = sum(tracking_times) / len(tracking_times) if tracking_times else 0
-
-        logger.info(f"Number of objects tracked: {len(object_map)}")
-        logger.info(f"Average inference time per frame: {avg_inference:.4f} seconds")
-        logger.info(f"Average tracking update time per frame: {avg_tracking:.4f} seconds")
+        logger.info("Completed tracking" if complete else "Tracking stopped before the last frame")
+        session.log_summary()
+        prefetcher.log_stats()
 
         if save_intermediate_results:
-            _save_tracking_results(object_map, capture_dir)
+            _save_tracking_results(session.object_map, capture_dir, frame_store)
+
+    return list(session.object_map.values()), complete
 
-        return list(object_map.values())
\ No newline at end of file
+def deepsort(capture_dir, max_age=5, target_classes=[0], save_intermediate_results=False, frame_store=None):
+    return run_tracking(capture_dir, max_age, target_classes, save_intermediate_results, frame_store)[0]
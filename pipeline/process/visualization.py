@@ -1,162 +1,268 @@
 import os
+import html
+import base64
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import cv2
 
+from pipeline.utils.config import get_config
+from pipeline.utils.frame_store import FrameStore
+from pipeline.utils.session_store import open_session, jpeg_quality
+
 logger = logging.getLogger(__name__)
+config = get_config()
+gallery_workers = config.get("gallery_workers", 4)
 
-def visualize_analysis_results(analysis_results, capture_dir):
-    images_dir = os.path.join(capture_dir, "images")
+# Gallery layout
+font = cv2.FONT_HERSHEY_SIMPLEX
+font_scale = 0.9
+font_color = (0, 0, 0)
+font_thickness = 2
+figure_size = (150, 150)
+figure_spacing = 10
+label_margin_top = 10
+max_row_images = 10
 
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    font_scale = 0.9
-    font_color = (0, 0, 0)
-    font_thickness = 2
-    figure_size = (150, 150)
-    figure_spacing = 10
-    label_margin_top = 10
-    max_row_images = 10
+GALLERY_FORMATS = ("png", "jpg", "html")
+GALLERY_DIRNAME = "gallery"
 
-    for obj in analysis_results:
-        track_id = obj.get("id", "N/A")
-        result = obj.get("result", {})
-        eartag_number = result.get("eartag_number", "N/A")
-        is_muzzle_clean = result.get("is_muzzle_clean", "N/A")
+def _label_images(images, labels):
+    labeled = []
+    for img, label in zip(images, labels):
+        img_copy = img.copy()
+        label_height = 30 + label_margin_top
+        margin_img = cv2.copyMakeBorder(
+            img_copy, 0, label_height, 0, 0, cv2.BORDER_CONSTANT, value=(255, 255, 255)
+        )
+        text_position = (5, img_copy.shape[0] + label_margin_top + 20)
+        cv2.putText(margin_img, str(label), text_position, font, font_scale, font_color, font_thickness)
+        labeled.append(margin_img)
+    return labeled
 
-        total_images = len(obj.get("images", []))
-        total_eartags = 0
-        total_muzzles = 0        
+def _stack_horizontally(images):
+    if not images:
+        # Create blank images
+        blank_img = 0 * np.ones((figure_size[1], figure_size[0], 3), dtype=np.uint8)
+        images = [blank_img.copy() for _ in range(max_row_images)]
 
-        track_crops = []
-        eartag_crops = []
-        muzzle_crops = []
+    spaced_images = []
+    for img in images:
+        img_with_margin = cv2.copyMakeBorder(
+            img,
+            0, 0, 0, figure_spacing,
+            cv2.BORDER_CONSTANT,
+            value=(255, 255, 255)
+        )
+        spaced_images.append(img_with_margin)
 
-        track_names = []
-        eartag_texts = []
-        muzzle_flags = []
+    # Remove extra spacing from the last image
+    spaced_images[-1] = spaced_images[-1][:, :-figure_spacing]
 
-        for image_entry in obj.get("images", []):
-            image_name = image_entry.get("name", "unknown")
-            image_path = os.path.join(images_dir, image_name)
-            original_img = cv2.imread(image_path)
-            if original_img is None:
+    return cv2.hconcat(spaced_images)
+
+def _pad_to_width(image, target_width):
+    _, w = image.shape[:2]
+    if w == target_width:
+        return image
+    padding = target_width - w
+    return cv2.copyMakeBorder(image, 0, 0, 0, padding, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+
+_GALLERY_CLASSES = ("tag", "muzzle")
+
+def _new_track_crops():
+    # Thumbnails per gallery row with their image name or detection, and the tag and muzzle crop totals of the banner
+    return {"track": [], "tag": [], "muzzle": [], "totals": {"tag": 0, "muzzle": 0}}
+
+# Gallery thumbnails kept while analysis crops the frames anyway, so rendering galleries afterwards doesn't decode
+# frames that were evicted from the frame store again. Only the first max_row_images crops of each row are kept per
+# track, resized to the figure size, which is under 2 MB per track. Totals count every non-empty tag and muzzle crop.
+class GalleryCrops:
+    def __init__(self):
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def add_track(self, track_id):
+        with self._lock:
+            self._tracks.setdefault(track_id, _new_track_crops())
+
+    def needs_track_crop(self, track_id):
+        # The track row shows the first max_row_images frames of the track, whether or not they have detections
+        with self._lock:
+            rows = self._tracks.get(track_id)
+            return rows is None or len(rows["track"]) < max_row_images
+
+    def add_track_crop(self, track_id, image_name, crop):
+        if crop.size == 0:
+            return
+        with self._lock:
+            rows = self._tracks.setdefault(track_id, _new_track_crops())
+            if len(rows["track"]) < max_row_images:
+                rows["track"].append((image_name, cv2.resize(crop, figure_size)))
+
+    def add_detection_crop(self, track_id, detection, crop):
+        cls_name = detection["class"].lower()
+        if cls_name not in _GALLERY_CLASSES or crop.size == 0:
+            return
+        with self._lock:
+            rows = self._tracks.setdefault(track_id, _new_track_crops())
+            rows["totals"][cls_name] += 1
+            if len(rows[cls_name]) < max_row_images:
+                rows[cls_name].append((detection, cv2.resize(crop, figure_size)))
+
+    def get(self, track_id):
+        with self._lock:
+            return self._tracks.get(track_id)
+
+def _frame_store_crops(obj, frame_store, with_detections=True):
+    # Crops cut from the frames in the frame store, for tracks whose analysis crops weren't kept, e.g. when
+    # analysis results come from a checkpoint. Frames with tag or muzzle detections are all read for the totals.
+    track_crops = _new_track_crops()
+    for image_entry in obj.get("images", []):
+        image_name = image_entry.get("name", "unknown")
+        detections = [
+            det for det in image_entry.get("detections", []) if det.get("class", "").lower() in _GALLERY_CLASSES
+        ] if with_detections else []
+        if len(track_crops["track"]) >= max_row_images and not detections:
+            if not with_detections:
+                break
+            continue
+
+        bbox_track = image_entry.get("track_bbox", None)
+        track_crop = frame_store.get_region(image_name, bbox_track) if bbox_track else frame_store.get(image_name)
+        if track_crop is None:
+            continue
+
+        if len(track_crops["track"]) < max_row_images and track_crop.size > 0:
+            track_crops["track"].append((image_name, cv2.resize(track_crop, figure_size)))
+
+        for det in detections:
+            cls_name = det["class"].lower()
+            bbox = det.get("bbox", {})
+            dx1 = max(0, bbox.get("x1", 0))
+            dy1 = max(0, bbox.get("y1", 0))
+            det_crop = track_crop[dy1:bbox.get("y2", dy1), dx1:bbox.get("x2", dx1)]
+            if det_crop.size == 0:
                 continue
 
-            bbox_track = image_entry.get("track_bbox", None)
-            if bbox_track:
-                x1 = max(0, bbox_track["x1"])
-                y1 = max(0, bbox_track["y1"])
-                x2 = bbox_track["x2"]
-                y2 = bbox_track["y2"]
-                track_crop = original_img[y1:y2, x1:x2]
-            else:
-                track_crop = original_img
-
-            track_crops.append(track_crop)
-            track_names.append(image_name)
-
-            for det in image_entry.get("detections", []):
-                cls_name = det.get("class", "").lower()
-                bbox = det.get("bbox", {})
-                dx1 = max(0, bbox.get("x1", 0))
-                dy1 = max(0, bbox.get("y1", 0))
-                dx2 = bbox.get("x2", dx1)
-                dy2 = bbox.get("y2", dy1)
-                det_crop = track_crop[dy1:dy2, dx1:dx2]
-
-                if det_crop.size == 0:
-                    continue
-
-                if cls_name == "tag":   
-                        total_eartags += 1
-                        eartag_crops.append(det_crop)
-                        label = det.get("eartag_number", "").strip()
-                        eartag_texts.append(label if label else "N/A")
-
-                elif cls_name == "muzzle":
-                        total_muzzles += 1
-                        muzzle_crops.append(det_crop)
-                        muzzle_flags.append("Clean" if det.get("is_muzzle_clean", False) else "Dirty")
-
-        def resize_images(images):
-            return [cv2.resize(img, figure_size) for img in images]
-
-        def label_images(images, labels):
-            labeled = []
-            for img, label in zip(images, labels):
-                img_copy = img.copy()
-                label_height = 30 + label_margin_top
-                margin_img = cv2.copyMakeBorder(
-                    img_copy, 0, label_height, 0, 0, cv2.BORDER_CONSTANT, value=(255, 255, 255)
-                )
-                text_position = (5, img_copy.shape[0] + label_margin_top + 20)
-                cv2.putText(margin_img, str(label), text_position, font, font_scale, font_color, font_thickness)
-                labeled.append(margin_img)
-            return labeled
-        
-        def stack_horizontally(images):
-            if not images:
-                # Create blank images
-                blank_img = 0 * np.ones((figure_size[1], figure_size[0], 3), dtype=np.uint8)
-                images = [blank_img.copy() for _ in range(max_row_images)]
-
-            spaced_images = []
-            for img in images:
-                img_with_margin = cv2.copyMakeBorder(
-                    img,
-                    0, 0, 0, figure_spacing,
-                    cv2.BORDER_CONSTANT,
-                    value=(255, 255, 255)
-                )
-                spaced_images.append(img_with_margin)
-
-            # Remove extra spacing from the last image
-            spaced_images[-1] = spaced_images[-1][:, :-figure_spacing]
-
-            return cv2.hconcat(spaced_images)
-        
-        def pad_to_width(image, target_width):
-            _, w = image.shape[:2]
-            if w == target_width:
-                return image
-            padding = target_width - w
-            return cv2.copyMakeBorder(image, 0, 0, 0, padding, cv2.BORDER_CONSTANT, value=(255, 255, 255))       
-
-        track_labeled = label_images(resize_images(track_crops[:max_row_images]), track_names[:max_row_images])
-        eartag_labeled = label_images(resize_images(eartag_crops[:max_row_images]), eartag_texts[:max_row_images])
-        muzzle_labeled = label_images(resize_images(muzzle_crops[:max_row_images]), muzzle_flags[:max_row_images])
-       
-        track_row = stack_horizontally(track_labeled)
-        eartag_row = stack_horizontally(eartag_labeled)
-        muzzle_row = stack_horizontally(muzzle_labeled)
-
-        min_row_width = (figure_size[0] + figure_spacing) * max_row_images - figure_spacing
-        max_row_width = max(
-            max(img.shape[1] if img is not None else 0 for img in [track_row, eartag_row, muzzle_row]),
-            min_row_width
-        )
-        track_row = pad_to_width(track_row, max_row_width)
-        eartag_row = pad_to_width(eartag_row, max_row_width)
-        muzzle_row = pad_to_width(muzzle_row, max_row_width)
+            track_crops["totals"][cls_name] += 1
+            if len(track_crops[cls_name]) < max_row_images:
+                track_crops[cls_name].append((det, cv2.resize(det_crop, figure_size)))
+    return track_crops
+
+def render_track_gallery(obj, frame_store, gallery_crops=None):
+    # Thumbnails kept by analysis are used when there are any for the track, otherwise crops are cut from the
+    # frames in the frame store. The track row falls back to the frame store when analysis cropped no frame of the track.
+    track_id = obj.get("id", "N/A")
+    result = obj.get("result", {})
+    eartag_number = result.get("eartag_number", "N/A")
+    is_muzzle_clean = result.get("is_muzzle_clean", "N/A")
+
+    track_crops = gallery_crops.get(track_id) if gallery_crops is not None else None
+    if track_crops is None:
+        track_crops = _frame_store_crops(obj, frame_store)
+    elif not track_crops["track"]:
+        track_crops = dict(track_crops, track=_frame_store_crops(obj, frame_store, with_detections=False)["track"])
+
+    total_images = len(obj.get("images", []))
+    total_eartags = track_crops["totals"]["tag"]
+    total_muzzles = track_crops["totals"]["muzzle"]
+
+    track_names = [image_name for image_name, _ in track_crops["track"]]
+    eartag_texts = [det.get("eartag_number", "").strip() or "N/A" for det, _ in track_crops["tag"]]
+    muzzle_flags = ["Clean" if det.get("is_muzzle_clean", False) else "Dirty" for det, _ in track_crops["muzzle"]]
+
+    track_row = _stack_horizontally(_label_images([crop for _, crop in track_crops["track"]], track_names))
+    eartag_row = _stack_horizontally(_label_images([crop for _, crop in track_crops["tag"]], eartag_texts))
+    muzzle_row = _stack_horizontally(_label_images([crop for _, crop in track_crops["muzzle"]], muzzle_flags))
+
+    min_row_width = (figure_size[0] + figure_spacing) * max_row_images - figure_spacing
+    max_row_width = max(
+        max(img.shape[1] if img is not None else 0 for img in [track_row, eartag_row, muzzle_row]),
+        min_row_width
+    )
+    track_row = _pad_to_width(track_row, max_row_width)
+    eartag_row = _pad_to_width(eartag_row, max_row_width)
+    muzzle_row = _pad_to_width(muzzle_row, max_row_width)
+
+    banner_height = 60
+    banner = np.ones((banner_height, max_row_width, 3), dtype=np.uint8) * 255
+
+    banner_left_text = f"Track ID: {track_id} | Eartag: {eartag_number} | Muzzle Clean: {is_muzzle_clean}"
+    cv2.putText(banner, banner_left_text, (10, 40), font, font_scale, font_color, font_thickness)
 
-        banner_height = 60
-        banner = np.ones((banner_height, max_row_width, 3), dtype=np.uint8) * 255
+    banner_right_text = f"Total Images: {total_images} | Eartags: {total_eartags} | Muzzles: {total_muzzles}"
+    (w, _), _ = cv2.getTextSize(banner_right_text, font, font_scale, font_thickness)
+    cv2.putText(banner, banner_right_text, (max_row_width - w - 10, 40), font, font_scale, font_color, font_thickness)
 
-        banner_left_text = f"Track ID: {track_id} | Eartag: {eartag_number} | Muzzle Clean: {is_muzzle_clean}"
-        cv2.putText(banner, banner_left_text, (10, 40), font, font_scale, font_color, font_thickness)
+    return cv2.vconcat([banner, track_row, eartag_row, muzzle_row])
 
-        banner_right_text = f"Total Images: {total_images} | Eartags: {total_eartags} | Muzzles: {total_muzzles}"
-        (w, _), _ = cv2.getTextSize(banner_right_text, font, font_scale, font_thickness)
-        cv2.putText(banner, banner_right_text, (max_row_width - w - 10, 40), font, font_scale, font_color, font_thickness)
+def visualize_analysis_results(analysis_results, capture_dir, frame_store=None, gallery_crops=None):
+    if frame_store is None:
+        frame_store = FrameStore(open_session(capture_dir))
 
-        gallery = cv2.vconcat([banner, track_row, eartag_row, muzzle_row])
+    for obj in analysis_results:
+        gallery = render_track_gallery(obj, frame_store, gallery_crops)
 
-        window_title = f"Track {track_id} Summary"
+        window_title = f"Track {obj.get('id', 'N/A')} Summary"
         cv2.imshow(window_title, gallery)
         cv2.waitKey(0)
         cv2.destroyWindow(window_title)
 
+def _encode_gallery(obj, frame_store, image_format, gallery_crops=None):
+    # The HTML index embeds PNG galleries
+    params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if image_format == "jpg" else []
+    success, encoded = cv2.imencode(f".{image_format}", render_track_gallery(obj, frame_store, gallery_crops), params)
+    if not success:
+        raise IOError(f"Failed to encode gallery of Track ID {obj.get('id', 'N/A')}")
+    return encoded.tobytes()
+
+def _write_html_index(analysis_results, galleries, path):
+    sections = []
+    for obj, data in zip(analysis_results, galleries):
+        track_id = html.escape(str(obj.get("id", "N/A")))
+        sections.append(
+            f'<section id="track-{track_id}"><h2>Track {track_id}</h2>'
+            f'<img src="data:image/png;base64,{base64.b64encode(data).decode()}" alt="Track {track_id} summary"></section>'
+        )
+
+    with open(path, "w") as f:
+        f.write(
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Track summaries</title></head><body>\n"
+            + "\n".join(sections)
+            + "\n</body></html>\n"
+        )
+
+def export_analysis_results(analysis_results, capture_dir, frame_store=None, output_format="png", num_workers=None, gallery_crops=None):
+    # Headless alternative to visualize_analysis_results: track galleries are rendered in parallel and saved
+    # as one image file per track, or as a single self-contained HTML index, under <capture_dir>/gallery
+    if output_format not in GALLERY_FORMATS:
+        raise ValueError(f"Unknown gallery format: {output_format} (expected one of {GALLERY_FORMATS})")
+    if frame_store is None:
+        frame_store = FrameStore(open_session(capture_dir))
+
+    gallery_dir = os.path.join(capture_dir, GALLERY_DIRNAME)
+    os.makedirs(gallery_dir, exist_ok=True)
+    image_format = "png" if output_format == "html" else output_format
+
+    # OpenCV releases the GIL while resizing and encoding, so threads render galleries in parallel
+    with ThreadPoolExecutor(max_workers=num_workers or gallery_workers) as executor:
+        galleries = list(executor.map(lambda obj: _encode_gallery(obj, frame_store, image_format, gallery_crops), analysis_results))
+
+    if output_format == "html":
+        output_path = os.path.join(gallery_dir, "index.html")
+        _write_html_index(analysis_results, galleries, output_path)
+    else:
+        for obj, data in zip(analysis_results, galleries):
+            with open(os.path.join(gallery_dir, f"track_{obj.get('id', 'N/A')}.{image_format}"), "wb") as f:
+                f.write(data)
+        output_path = gallery_dir
+
+    logger.info(f"Exported {len(galleries)} track summaries to: {output_path}")
+    return output_path
+
 def log_analysis_results(analysis_results):
     for obj in analysis_results:
         track_id = obj.get("id", "N/A")
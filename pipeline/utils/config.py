@@ -1,5 +1,114 @@
+import os
+import logging
+
 import yaml
 
+logger = logging.getLogger(__name__)
+
+# The config file shipped with the package, unless another one is given in CATTLE_MONITOR_CONFIG
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yaml")
+CONFIG_PATH_ENV = "CATTLE_MONITOR_CONFIG"
+
+# Environment variables named CATTLE_MONITOR_<KEY> override single config values, e.g. CATTLE_MONITOR_PIPELINE_MODE=pipelined
+CONFIG_ENV_PREFIX = "CATTLE_MONITOR_"
+
+_positive_int = (lambda value: isinstance(value, int) and not isinstance(value, bool) and value > 0, "a positive integer")
+_non_negative_int = (lambda value: isinstance(value, int) and not isinstance(value, bool) and value >= 0, "a non-negative integer")
+_positive_number = (lambda value: isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0, "a positive number")
+_non_negative_number = (lambda value: isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0, "a non-negative number")
+_boolean = (lambda value: isinstance(value, bool), "true or false")
+
+def _one_of(*choices):
+    return (lambda value: value in choices, f"one of {', '.join(map(str, choices))}")
+
+# Checks of the values that would otherwise only fail deep inside a stage, often after the models are loaded
+_VALIDATORS = {
+    "capture_image_format": _one_of("png", "jpg", "raw"),
+    "capture_storage": _one_of("files", "chunked"),
+    "capture_fps": _positive_number,
+    "frame_cache_budget_mb": _non_negative_number,
+    "frame_prefetch_depth": _non_negative_int,
+    "frame_prefetch_workers": _positive_int,
+    "frame_prefetch_budget_mb": _non_negative_number,
+    "tracking_decode_reduction": _one_of(1, 2, 4, 8, "auto"),
+    "detection_batch_size": _positive_int,
+    "ocr_batch_size": _positive_int,
+    "live_processing": _boolean,
+    "archive_captures": _boolean,
+    "live_queue_size": _positive_int,
+    "image_writer_workers": _positive_int,
+    "image_writer_full_policy": _one_of("block", "drop"),
+    "inference_backend": _one_of("pytorch", "onnx", "openvino"),
+    "inference_int8": _boolean,
+    "ocr_max_distance": _non_negative_number,
+    "rfid_candidates": _boolean,
+    "rfid_window_captures": _non_negative_int,
+    "pipeline_mode": _one_of("sequential", "pipelined"),
+    "pipeline_detection_workers": _positive_int,
+    "pipeline_analysis_workers": _positive_int,
+    "pipeline_queue_size": _positive_int,
+    "batch_workers": _positive_int,
+    "checkpoint_interval_tracks": _positive_int,
+    "metrics_enabled": _boolean,
+    "tracker_backend": _one_of("deepsort", "bytetrack", "deepsort_lazy"),
+    "motion_gating": _boolean,
+    "key_frames_per_track": _non_negative_int,
+    "key_frame_vote_margin": _non_negative_int,
+    "key_frame_ocr_round_size": _positive_int,
+    "gallery_output": _one_of("show", "none", "png", "jpg", "html"),
+    "gallery_workers": _positive_int
+}
+
+# Values taken verbatim from overrides instead of parsed as YAML, so secrets like "0x1f", "yes" or "a: b" stay strings
+_VERBATIM_KEYS = {"processing_server_authkey", "processing_server_authkey_file"}
+
+_config = None
+
 def load_yaml_config(path):
     with open(path, "r") as f:
-        return yaml.safe_load(f)
\ No newline at end of file
+        return yaml.safe_load(f)
+
+def _parse_value(key, value):
+    # Override values are parsed as YAML, so "8" is an int, "true" a bool and "null" None
+    if key in _VERBATIM_KEYS:
+        return value
+    return yaml.safe_load(value) if value != "" else None
+
+def validate_config(config):
+    for key, value in config.items():
+        check = _VALIDATORS.get(key)
+        if check is not None and not check[0](value):
+            raise ValueError(f"Invalid config value {key}={value!r}: expected {check[1]}")
+
+def get_config():
+    # The config is read and validated once per process, and every module shares the same dict
+    global _config
+    if _config is None:
+        path = os.environ.get(CONFIG_PATH_ENV, DEFAULT_CONFIG_PATH)
+        config = load_yaml_config(path) or {}
+
+        for name, value in os.environ.items():
+            key = name[len(CONFIG_ENV_PREFIX):].lower()
+            if name.startswith(CONFIG_ENV_PREFIX) and key in config:
+                config[key] = _parse_value(key, value)
+
+        validate_config(config)
+        _config = config
+    return _config
+
+def apply_overrides(overrides):
+    # Applies KEY=VALUE overrides, e.g. from the command line. The shared config is updated in place, so only
+    # modules imported afterwards see them in their module-level settings.
+    config = get_config()
+    updates = {}
+    for override in overrides:
+        key, separator, value = override.partition("=")
+        if not separator:
+            raise ValueError(f"Invalid config override {override!r}: expected KEY=VALUE")
+        if key not in config:
+            logger.warning(f"Overriding unknown config key: {key}")
+        updates[key] = _parse_value(key, value)
+
+    validate_config(updates)
+    config.update(updates)
+    return config
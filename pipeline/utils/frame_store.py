@@ -0,0 +1,255 @@
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.utils.config import get_config
+from pipeline.utils import metrics
+from pipeline.utils.session_store import reduce_frame
+
+logger = logging.getLogger(__name__)
+config = get_config()
+frame_cache_budget_mb = config.get("frame_cache_budget_mb", 1024)
+frame_prefetch_depth = config.get("frame_prefetch_depth", 4)
+frame_prefetch_workers = config.get("frame_prefetch_workers", 2)
+frame_prefetch_budget_mb = config.get("frame_prefetch_budget_mb", 256)
+
+# Decoded frames of a capture session shared by all processing stages, kept in an LRU cache keyed by
+# image name, and by image name and reduction for frames decoded at reduced resolution. Frames that the session
+# can't decode at reduced resolution, like PNG images or video frames, are decoded whole once and only the
+# full-resolution frame is cached, with reduced frames downscaled from it on every request so the cache never
+# holds both copies of a frame. Cached frames are shared and must not be modified in place. Pinned frames are held outside the LRU cache until they are
+# unpinned as often as they were pinned, for frames that can't be read back from the session.
+class FrameStore:
+    def __init__(self, session_reader, budget_mb=None):
+        self.session_reader = session_reader
+        self.budget_bytes = int((budget_mb if budget_mb is not None else frame_cache_budget_mb) * 1024 * 1024)
+
+        self._frames = OrderedDict()
+        self._pinned = {}
+        self._pin_counts = {}
+        self._lock = threading.Lock()
+
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, image_name, reduction=1):
+        key = image_name if reduction == 1 else (image_name, reduction)
+        full_frame = None
+        with self._lock:
+            frame = self._pinned.get(key)
+            if frame is not None:
+                self.hits += 1
+                metrics.inc("frame_cache_hits_total")
+                return frame
+
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                metrics.inc("frame_cache_hits_total")
+                return frame
+            if reduction != 1:
+                full_frame = self._frames.get(image_name)
+                if full_frame is None:
+                    full_frame = self._pinned.get(image_name)
+            self.misses += 1
+        metrics.inc("frame_cache_misses_total")
+
+        # A cached full-resolution frame is cheaper to downscale than decoding the image again, and the reduced
+        # frame isn't cached next to it
+        if full_frame is not None:
+            return reduce_frame(full_frame, reduction)
+
+        if reduction != 1 and not self._decodes_reduced(image_name):
+            # Without a reduced decode (e.g. PNG) the whole image is decoded anyway, so the full frame is cached
+            # instead and detection and analysis crop from it without decoding the image a second time
+            with metrics.timed("frame_decode_seconds"):
+                full_frame = self.session_reader.read(image_name)
+            if full_frame is None:
+                return None
+            frame = reduce_frame(full_frame, reduction)
+            if not self._put(image_name, full_frame):
+                self._put(key, frame)
+            return frame
+
+        with metrics.timed("frame_decode_seconds"):
+            frame = self.session_reader.read(image_name, reduction)
+
+        # Full-resolution memory-mapped frames are already cheap to read, so they don't take up the cache budget
+        if frame is not None and (reduction != 1 or not self.session_reader.memory_mapped):
+            self._put(key, frame)
+        return frame
+
+    def _decodes_reduced(self, image_name):
+        # Memory-mapped frames aren't decoded at all, so reading them reduced never reads more than needed
+        if self.session_reader.memory_mapped:
+            return True
+        decodes_reduced = getattr(self.session_reader, "decodes_reduced", None)
+        return decodes_reduced is not None and decodes_reduced(image_name)
+
+    def get_region(self, image_name, bbox):
+        # Full-resolution crop of the bbox clamped to the frame. Memory-mapped frames are sliced in place,
+        # so only the rows of the region are read from disk.
+        frame = self.get(image_name)
+        if frame is None:
+            return None
+
+        h, w = frame.shape[:2]
+        return frame[max(0, bbox["y1"]):min(h, bbox["y2"]), max(0, bbox["x1"]):min(w, bbox["x2"])]
+
+    def names(self):
+        return self.session_reader.names()
+
+    def put(self, image_name, frame):
+        self._put(image_name, frame)
+
+    def pin(self, image_name):
+        # Returns False when the full-resolution frame is no longer cached and can't be pinned
+        with self._lock:
+            if image_name not in self._pinned:
+                frame = self._frames.pop(image_name, None)
+                if frame is None:
+                    return False
+                self.cached_bytes -= frame.nbytes
+                self._pinned[image_name] = frame
+            self._pin_counts[image_name] = self._pin_counts.get(image_name, 0) + 1
+            return True
+
+    def unpin(self, image_name):
+        # The last unpin hands the frame back to the LRU cache
+        with self._lock:
+            count = self._pin_counts.get(image_name, 0) - 1
+            if count > 0:
+                self._pin_counts[image_name] = count
+                return
+            self._pin_counts.pop(image_name, None)
+            frame = self._pinned.pop(image_name, None)
+        if frame is not None:
+            self._put(image_name, frame)
+
+    def _put(self, key, frame):
+        # Returns False for frames larger than the whole budget, which are never cached
+        if frame.nbytes > self.budget_bytes:
+            return False
+
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self.cached_bytes -= previous.nbytes
+
+            self._frames[key] = frame
+            self.cached_bytes += frame.nbytes
+
+            while self.cached_bytes > self.budget_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.cached_bytes -= evicted.nbytes
+                self.evictions += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "cached_frames": len(self._frames),
+                "cached_mb": self.cached_bytes / (1024 * 1024),
+                "pinned_frames": len(self._pinned),
+                "budget_mb": self.budget_bytes / (1024 * 1024),
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Frame cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"(hit rate {stats['hit_rate']:.1%}), {stats['evictions']} evictions, "
+            f"{stats['cached_frames']} frames / {stats['cached_mb']:.1f} MB cached "
+            f"of {stats['budget_mb']:.0f} MB budget, {stats['pinned_frames']} frames pinned"
+        )
+
+
+# Iterates (image name, frame) pairs in the given order while the next frames are decoded ahead on a thread pool,
+# so decoding overlaps with whatever the caller does with each frame. At most depth frames are read ahead, fewer
+# when that many frames of the size seen so far would exceed the memory budget. Frames that fail to load are
+# yielded as None. Sources that have to be read in order, like videos, are read ahead by a single thread.
+class FramePrefetcher:
+    def __init__(self, frame_store, image_names, reduction=1, depth=None, workers=None, budget_mb=None):
+        self.frame_store = frame_store
+        self.image_names = image_names
+        self.reduction = reduction
+        self.depth = depth if depth is not None else frame_prefetch_depth
+        self.workers = workers if workers is not None else frame_prefetch_workers
+        self.budget_bytes = int((budget_mb if budget_mb is not None else frame_prefetch_budget_mb) * 1024 * 1024)
+        if getattr(frame_store.session_reader, "sequential_reads", False):
+            self.workers = 1
+
+        self.frame_bytes = 0
+        self.frames = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+
+    def _window(self):
+        if not self.frame_bytes:
+            return self.depth
+        return max(1, min(self.depth, self.budget_bytes // self.frame_bytes))
+
+    def _wait(self, get_frame):
+        # Time the caller spends blocked on a frame that isn't decoded yet
+        wait_start_time = time.time()
+        frame = get_frame()
+        stall_time = time.time() - wait_start_time
+
+        self.frames += 1
+        self.stall_time += stall_time
+        if stall_time > 0.001:
+            self.stalls += 1
+        metrics.observe("frame_prefetch_stall_seconds", stall_time)
+
+        if frame is not None:
+            self.frame_bytes = max(self.frame_bytes, frame.nbytes)
+        return frame
+
+    def __iter__(self):
+        if self.depth <= 0:
+            for image_name in self.image_names:
+                yield image_name, self._wait(lambda: self.frame_store.get(image_name, self.reduction))
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="frame-prefetch")
+        pending = deque()
+        next_idx = 0
+        try:
+            while pending or next_idx < len(self.image_names):
+                while next_idx < len(self.image_names) and len(pending) < self._window():
+                    image_name = self.image_names[next_idx]
+                    pending.append((image_name, executor.submit(self.frame_store.get, image_name, self.reduction)))
+                    next_idx += 1
+
+                image_name, future = pending.popleft()
+                yield image_name, self._wait(future.result)
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "stalls": self.stalls,
+            "stall_time": self.stall_time,
+            "depth": self.depth,
+            "window": self._window()
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Frame prefetch: waited {stats['stall_time']:.2f} seconds for frames, stalled on {stats['stalls']}/{stats['frames']} "
+            f"frames (depth {stats['depth']}, window {stats['window']})"
+        )
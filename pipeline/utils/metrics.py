@@ -0,0 +1,202 @@
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pipeline.utils.config import get_config
+
+logger = logging.getLogger(__name__)
+config = get_config()
+metrics_enabled = config.get("metrics_enabled", False)
+metrics_host = config.get("metrics_host", "127.0.0.1")
+metrics_port = config.get("metrics_port")
+
+METRICS_FILENAME = "metrics.json"
+METRICS_PREFIX = "cattle_monitor"
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Shared no-op context returned by timed() while metrics are disabled
+_null_timer = nullcontext()
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+# Latency histogram with fixed buckets; quantiles are estimated as the upper bound of the bucket they fall in
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[idx] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def _quantile(self, q):
+        rank = q * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else 0.0,
+                "max": self.max,
+                "p50": self._quantile(0.5) if self.count else 0.0,
+                "p95": self._quantile(0.95) if self.count else 0.0,
+                "buckets": {str(bound): bucket_count for bound, bucket_count in zip(self.buckets + ("+Inf",), self.bucket_counts)}
+            }
+
+class _Timer:
+    __slots__ = ("histogram", "start_time")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start_time)
+
+# Process-wide counters and latency histograms, created on first use by name. While disabled every
+# recording call returns right after checking the enabled flag, so instrumented hot paths cost next to nothing.
+class MetricsRegistry:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name):
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def inc(self, name, amount=1):
+        if self.enabled:
+            self.counter(name).inc(amount)
+
+    def observe(self, name, seconds, count=1):
+        # Records count observations of the same latency, e.g. the per-item share of a batched call
+        if self.enabled:
+            histogram = self.histogram(name)
+            for _ in range(count):
+                histogram.observe(seconds)
+
+    def timed(self, name):
+        if not self.enabled:
+            return _null_timer
+        return _Timer(self.histogram(name))
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def snapshot(self):
+        with self._lock:
+            counters, histograms = dict(self._counters), dict(self._histograms)
+        return {
+            "timestamp": time.time(),
+            "counters": {name: counter.snapshot() for name, counter in sorted(counters.items())},
+            "histograms": {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+        }
+
+    def save_snapshot(self, path):
+        if not self.enabled:
+            return
+
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=4)
+        logger.info(f"Metrics snapshot saved to: {path}")
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} counter")
+            lines.append(f"{METRICS_PREFIX}_{name} {value}")
+
+        for name, histogram in snapshot["histograms"].items():
+            metric = f"{METRICS_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+
+            cumulative = 0
+            for bound, bucket_count in histogram["buckets"].items():
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum {histogram['sum']}")
+            lines.append(f"{metric}_count {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry(enabled=metrics_enabled)
+inc = registry.inc
+observe = registry.observe
+timed = registry.timed
+save_snapshot = registry.save_snapshot
+
+def start_metrics_server(port=None, host=None):
+    # Serves the registry in the Prometheus text format on /metrics from a background thread
+    port = port or metrics_port
+    host = host or metrics_host
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+
+            body = registry.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return server
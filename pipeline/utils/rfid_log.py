@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import logging
+
+from pipeline.utils.config import get_config
+
+logger = logging.getLogger(__name__)
+config = get_config()
+rfid_log_flush_interval = config.get("rfid_log_flush_interval", 10)
+rfid_log_fsync_interval = config.get("rfid_log_fsync_interval", 100)
+
+RFID_LOG_FILENAME = "rfid_readings.jsonl"
+LEGACY_RFID_READINGS_FILENAME = "rfid_readings.json"
+
+# Append-only log of RFID readings with one JSON record per capture. Records are
+# flushed to the OS every flush_interval appends and fsynced every fsync_interval appends.
+class RfidLogWriter:
+    def __init__(self, path, flush_interval=None, fsync_interval=None):
+        self.path = path
+        self.flush_interval = flush_interval or rfid_log_flush_interval
+        self.fsync_interval = fsync_interval or rfid_log_fsync_interval
+
+        self._file = open(path, "a")
+        self._appended = 0
+
+    def append(self, capture_id, rfid_readings, timestamp=None):
+        record = {
+            "capture_id": capture_id,
+            "timestamp": timestamp if timestamp is not None else time.time(),
+            "readings": rfid_readings
+        }
+        self._file.write(json.dumps(record) + "\n")
+        self._appended += 1
+
+        if self._appended % self.fsync_interval == 0:
+            self.flush(fsync=True)
+        elif self._appended % self.flush_interval == 0:
+            self.flush()
+
+    def flush(self, fsync=False):
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.flush(fsync=True)
+            self._file.close()
+
+def read_rfid_log(path):
+    records = []
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash mid-write can only leave the last record truncated
+                logger.warning(f"Skipping unreadable RFID record at {path}:{line_number}")
+
+    return records
+
+def load_rfid_readings(session_dir):
+    # Returns the readings of a session as {capture_id: [tags]}, from the append-only log or the legacy JSON file
+    log_path = os.path.join(session_dir, RFID_LOG_FILENAME)
+    if os.path.exists(log_path):
+        return {record["capture_id"]: record["readings"] for record in read_rfid_log(log_path)}
+
+    legacy_path = os.path.join(session_dir, LEGACY_RFID_READINGS_FILENAME)
+    if os.path.exists(legacy_path):
+        with open(legacy_path, "r") as f:
+            return json.load(f)
+
+    logger.warning(f"No RFID readings found in session directory: {session_dir}")
+    return {}
@@ -0,0 +1,287 @@
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+import cv2
+
+from pipeline.utils.config import get_config
+from pipeline.utils import metrics
+
+logger = logging.getLogger(__name__)
+config = get_config()
+session_chunk_frames = config.get("session_chunk_frames", 256)
+session_index_flush_interval = config.get("session_index_flush_interval", 10)
+jpeg_quality = config.get("jpeg_quality", 95)
+
+STORAGE_BACKENDS = ("files", "chunked")
+CHUNKED_IMAGE_FORMATS = ("raw", "png", "jpg")
+LEGACY_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+# Only JPEG images can be decoded at a reduced resolution, other formats are decoded whole and downscaled
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+
+# cv2 read flags that decode an image at 1/1, 1/2, 1/4 or 1/8 of its resolution
+REDUCED_READ_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+IMAGES_DIRNAME = "images"
+FRAMES_DIRNAME = "frames"
+FRAMES_INDEX_FILENAME = "index.jsonl"
+
+def _chunk_filename(chunk_idx):
+    return f"chunk_{chunk_idx:05d}.bin"
+
+def _decode_record(data, record, reduction):
+    if record["format"] == "raw":
+        return reduce_frame(data.view(np.dtype(record["dtype"])).reshape(record["shape"]), reduction)
+    return cv2.imdecode(np.asarray(data), REDUCED_READ_FLAGS[reduction])
+
+def reduce_frame(frame, reduction):
+    # Downscales an already decoded frame the way a reduced read would
+    if reduction == 1:
+        return frame
+    h, w = frame.shape[:2]
+    return cv2.resize(frame, ((w + reduction - 1) // reduction, (h + reduction - 1) // reduction), interpolation=cv2.INTER_AREA)
+
+# Legacy layout: one image file per frame under <session>/images
+class DirectorySessionWriter:
+    def __init__(self, session_dir):
+        self.images_dir = os.path.join(session_dir, IMAGES_DIRNAME)
+        os.makedirs(self.images_dir, exist_ok=True)
+
+    def write(self, name, image):
+        # Encoded and written in two steps, which produces the same file as cv2.imwrite
+        with metrics.timed("capture_encode_seconds"):
+            success, encoded = cv2.imencode(os.path.splitext(name)[1], image)
+        if not success:
+            return False
+
+        with metrics.timed("capture_write_seconds"):
+            with open(os.path.join(self.images_dir, name), "wb") as f:
+                f.write(encoded.tobytes())
+        return True
+
+    def open_reader(self):
+        # Files are complete once written, so the plain directory reader sees frames as they are saved
+        return DirectorySessionReader(os.path.dirname(self.images_dir))
+
+    def close(self):
+        pass
+
+# Chunked layout: frames appended to <session>/frames/chunk_NNNNN.bin files, located through an
+# append-only index. Raw frames are stored uncompressed so they can be memory-mapped on read.
+class ChunkedSessionWriter:
+    def __init__(self, session_dir, image_format, frames_per_chunk=None):
+        if image_format not in CHUNKED_IMAGE_FORMATS:
+            raise ValueError(f"Unsupported chunked image format: {image_format} (expected one of {CHUNKED_IMAGE_FORMATS})")
+
+        self.frames_dir = os.path.join(session_dir, FRAMES_DIRNAME)
+        os.makedirs(self.frames_dir, exist_ok=True)
+
+        self.image_format = image_format
+        self.frames_per_chunk = frames_per_chunk or session_chunk_frames
+
+        self._lock = threading.Lock()
+        self._index_file = open(os.path.join(self.frames_dir, FRAMES_INDEX_FILENAME), "a")
+        self._chunk_idx = -1
+        self._chunk_file = None
+        self._chunk_frames = 0
+        self._written = 0
+        self._records = {}
+
+    def encode(self, image):
+        # Frames are stored as 3-channel BGR, like frames read back from the legacy PNG files
+        if image.ndim == 3 and image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+
+        if self.image_format == "raw":
+            return np.ascontiguousarray(image).tobytes(), image.shape, str(image.dtype)
+
+        params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if self.image_format == "jpg" else []
+        success, encoded = cv2.imencode(f".{self.image_format}", image, params)
+        if not success:
+            raise IOError(f"Failed to encode frame as {self.image_format}")
+        return encoded.tobytes(), image.shape, str(image.dtype)
+
+    def write(self, name, image):
+        # Encoding happens outside the lock so several writer threads can encode in parallel
+        with metrics.timed("capture_encode_seconds"):
+            data, shape, dtype = self.encode(image)
+
+        with metrics.timed("capture_write_seconds"), self._lock:
+            if self._chunk_file is None or self._chunk_frames >= self.frames_per_chunk:
+                self._open_next_chunk()
+
+            offset = self._chunk_file.tell()
+            self._chunk_file.write(data)
+            self._chunk_frames += 1
+
+            record = {
+                "name": name,
+                "chunk": self._chunk_idx,
+                "offset": offset,
+                "size": len(data),
+                "format": self.image_format,
+                "shape": list(shape),
+                "dtype": dtype
+            }
+            self._index_file.write(json.dumps(record) + "\n")
+            self._records[name] = record
+
+            self._written += 1
+            if self._written % session_index_flush_interval == 0:
+                self._chunk_file.flush()
+                self._index_file.flush()
+
+        return True
+
+    def open_reader(self):
+        return _WrittenChunkReader(self)
+
+    def _record(self, name):
+        # Record of a written frame, with the chunk it is in flushed so the frame can be read back
+        with self._lock:
+            record = self._records.get(name)
+            if record is not None and record["chunk"] == self._chunk_idx and self._chunk_file is not None:
+                self._chunk_file.flush()
+            return record
+
+    def _names(self):
+        with self._lock:
+            return sorted(self._records)
+
+    def _open_next_chunk(self):
+        if self._chunk_file is not None:
+            self._chunk_file.close()
+
+        self._chunk_idx += 1
+        self._chunk_frames = 0
+        self._chunk_file = open(os.path.join(self.frames_dir, _chunk_filename(self._chunk_idx)), "ab")
+
+    def close(self):
+        with self._lock:
+            if self._chunk_file is not None:
+                self._chunk_file.close()
+                self._chunk_file = None
+            self._index_file.close()
+
+# Reads back frames of a session that is still being written, through the writer's in-memory index. The
+# index file is only flushed every few frames, and chunks still grow, so neither is opened directly.
+class _WrittenChunkReader:
+    memory_mapped = False
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def names(self):
+        return self.writer._names()
+
+    def decodes_reduced(self, name):
+        return self.writer.image_format == "jpg"
+
+    def read(self, name, reduction=1):
+        record = self.writer._record(name)
+        if record is None:
+            return None
+
+        with open(os.path.join(self.writer.frames_dir, _chunk_filename(record["chunk"])), "rb") as f:
+            f.seek(record["offset"])
+            data = f.read(record["size"])
+        if len(data) < record["size"]:
+            logger.warning(f"Frame {name} is truncated in chunk {record['chunk']}")
+            return None
+
+        return _decode_record(np.frombuffer(data, dtype=np.uint8), record, reduction)
+
+    def close(self):
+        pass
+
+def open_session_writer(session_dir, storage, image_format):
+    if storage == "files":
+        if image_format == "raw":
+            raise ValueError("Raw frames are only supported with chunked session storage")
+        return DirectorySessionWriter(session_dir)
+
+    if storage == "chunked":
+        return ChunkedSessionWriter(session_dir, image_format)
+
+    raise ValueError(f"Unknown session storage: {storage} (expected one of {STORAGE_BACKENDS})")
+
+class DirectorySessionReader:
+    memory_mapped = False
+
+    def __init__(self, session_dir):
+        self.images_dir = os.path.join(session_dir, IMAGES_DIRNAME)
+
+    def names(self):
+        if not os.path.isdir(self.images_dir):
+            return []
+        return sorted(name for name in os.listdir(self.images_dir) if name.lower().endswith(LEGACY_IMAGE_EXTENSIONS))
+
+    def decodes_reduced(self, name):
+        return name.lower().endswith(JPEG_EXTENSIONS)
+
+    def read(self, name, reduction=1):
+        # JPEG files are decoded directly at the reduced size, other formats are downscaled by OpenCV after decoding
+        return cv2.imread(os.path.join(self.images_dir, name), REDUCED_READ_FLAGS[reduction])
+
+    def close(self):
+        pass
+
+class ChunkedSessionReader:
+    def __init__(self, session_dir):
+        self.frames_dir = os.path.join(session_dir, FRAMES_DIRNAME)
+        self._index = {}
+        self._chunks = {}
+        self._lock = threading.Lock()
+
+        with open(os.path.join(self.frames_dir, FRAMES_INDEX_FILENAME), "r") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable frame index record at line {line_number} in {self.frames_dir}")
+                    continue
+                self._index[record["name"]] = record
+
+        self.memory_mapped = all(record["format"] == "raw" for record in self._index.values())
+
+    def names(self):
+        return sorted(self._index)
+
+    def decodes_reduced(self, name):
+        record = self._index.get(name)
+        return record is not None and record["format"] == "jpg"
+
+    def _chunk(self, chunk_idx):
+        with self._lock:
+            chunk = self._chunks.get(chunk_idx)
+            if chunk is None:
+                chunk = np.memmap(os.path.join(self.frames_dir, _chunk_filename(chunk_idx)), dtype=np.uint8, mode="r")
+                self._chunks[chunk_idx] = chunk
+            return chunk
+
+    def read(self, name, reduction=1):
+        record = self._index.get(name)
+        if record is None:
+            return None
+
+        chunk = self._chunk(record["chunk"])
+        start, end = record["offset"], record["offset"] + record["size"]
+        if end > len(chunk):
+            logger.warning(f"Frame {name} is truncated in chunk {record['chunk']}")
+            return None
+
+        # Raw frames are zero-copy views of the memory-mapped chunk, so crops of them only read the rows they cover
+        return _decode_record(chunk[start:end], record, reduction)
+
+    def close(self):
+        with self._lock:
+            self._chunks.clear()
+
+def open_session(session_dir):
+    # Reads frames from the chunked layout when present, otherwise from the legacy image directory
+    if os.path.exists(os.path.join(session_dir, FRAMES_DIRNAME, FRAMES_INDEX_FILENAME)):
+        return ChunkedSessionReader(session_dir)
+    return DirectorySessionReader(session_dir)
@@ -1,32 +1,177 @@
 import os
+import math
+import time
+import logging
+import threading
 
 import cv2
 
-def extract_frames_from_video(video_path, output_path, target_fps, image_format='png'):
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise IOError(f"Cannot open video file: {video_path}")
-    
-    os.makedirs(output_path, exist_ok=True)
+from pipeline.utils.session_store import reduce_frame
+
+logger = logging.getLogger(__name__)
+
+# Seeking restarts decoding from the previous keyframe, so short jumps forward are grabbed through instead
+_max_grab_ahead = 250
+
+# Frames sampled at target_fps from a video file, readable like a capture session. Frames are named like the
+# images written by extract_frames_from_video. Reading frames in order streams through the video: frames
+# between samples are only grabbed, which skips their conversion to BGR images, and reading a frame out of
+# order seeks to it, so frames are best read by a single thread. The frame count reported by the container
+# is only an estimate, and missing for many streams, so it is never used: frames() reads to the end of the
+# video, and names() counts the frames by grabbing through the video up to end_time once.
+class VideoFrameSource:
+    memory_mapped = False
+    sequential_reads = True
+
+    def __init__(self, video_path, target_fps=None, start_time=0.0, end_time=None, image_format="png"):
+        self.video_path = video_path
+        self.image_format = image_format
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open video file: {video_path}")
+
+        self.source_fps = self.cap.get(cv2.CAP_PROP_FPS) or target_fps or 1.0
+
+        # Determine how many frames to skip based on FPS ratio
+        self.frame_interval = int(round(self.source_fps / target_fps)) if target_fps and target_fps < self.source_fps else 1
+
+        self.start_frame = int(round(start_time * self.source_fps))
+        self.end_frame = int(round(end_time * self.source_fps)) if end_time is not None else None
+        self._names = None
+
+        # Identifies the sampled frames for checkpoint fingerprints
+        stat = os.stat(video_path)
+        self.source_id = f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime}:{self.frame_interval}:{self.start_frame}:{self.end_frame}"
+
+        self._lock = threading.Lock()
+        self._position = 0
+
+        self.decoded = 0
+        self.grabbed = 0
+        self.seeks = 0
+        self.read_time = 0.0
+
+    def _name(self, sample_idx):
+        return f"{sample_idx:04d}.{self.image_format}"
+
+    def _frame_index(self, name):
+        # Source frame of a sampled frame name, or None for names that aren't sampled frames of this video
+        sample_idx = os.path.splitext(name)[0]
+        if not sample_idx.isdigit() or name != self._name(int(sample_idx)):
+            return None
+
+        frame_idx = self.start_frame + int(sample_idx) * self.frame_interval
+        if self.end_frame is not None and frame_idx >= self.end_frame:
+            return None
+        return frame_idx
 
-    original_fps = cap.get(cv2.CAP_PROP_FPS)
+    def _count_frames(self):
+        # Grabs until a grab fails or end_frame is reached, through a separate capture so the read position of
+        # this one is untouched. Grabbing skips the conversion to BGR images, so counting costs a fraction of a read.
+        cap = cv2.VideoCapture(self.video_path)
+        frame_count = 0
+        while (self.end_frame is None or frame_count < self.end_frame) and cap.grab():
+            frame_count += 1
+        cap.release()
+        return frame_count
 
-    # Determine how many frames to skip based on FPS ratio
-    frame_interval = int(round(original_fps / target_fps)) if target_fps < original_fps else 1
+    def names(self):
+        if self._names is None:
+            end_frame = self._count_frames()
+            logger.info(f"Counted {end_frame} frames of {self.video_path}")
+            self._names = [self._name(idx) for idx in range(len(range(self.start_frame, end_frame, self.frame_interval)))]
+        return list(self._names)
 
-    frame_index = 0
-    saved_frame_index = 0
+    def _read_frame(self, frame_idx):
+        if frame_idx < self._position or frame_idx - self._position > _max_grab_ahead:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            self._position = frame_idx
+            self.seeks += 1
 
-    while True:
-        ret, frame = cap.read()
+        while self._position < frame_idx:
+            if not self.cap.grab():
+                return None
+            self._position += 1
+            self.grabbed += 1
+
+        ret, frame = self.cap.read()
+        self._position += 1
         if not ret:
-            break
+            return None
+
+        self.decoded += 1
+        return frame
+
+    def _timed_read(self, frame_idx):
+        with self._lock:
+            read_start_time = time.time()
+            frame = self._read_frame(frame_idx)
+            self.read_time += time.time() - read_start_time
+        return frame
+
+    def read(self, name, reduction=1):
+        frame_idx = self._frame_index(name)
+        if frame_idx is None:
+            return None
+
+        frame = self._timed_read(frame_idx)
+        if frame is None:
+            logger.warning(f"Failed to decode frame {frame_idx} of {self.video_path}")
+            return None
+        return reduce_frame(frame, reduction)
+
+    def name_at(self, timestamp):
+        # Name of the first sampled frame at or after the timestamp in seconds
+        frame_idx = timestamp * self.source_fps
+        return self._name(max(0, math.ceil((frame_idx - self.start_frame) / self.frame_interval)))
+
+    def frames(self, start_time=None):
+        # Streams (name, frame) pairs in order until the end of the video or end_time, optionally starting from
+        # a timestamp in seconds. The reported frame count isn't used, so no trailing frames are dropped.
+        sample_idx = int(os.path.splitext(self.name_at(start_time))[0]) if start_time is not None else 0
+        while True:
+            frame_idx = self._frame_index(self._name(sample_idx))
+            if frame_idx is None:
+                return
 
-        if frame_index % frame_interval == 0:
-            filename = os.path.join(output_path, f"{saved_frame_index:04d}.{image_format}")
-            cv2.imwrite(filename, frame)
-            saved_frame_index += 1
+            frame = self._timed_read(frame_idx)
+            if frame is None:
+                return
+            yield self._name(sample_idx), frame
+            sample_idx += 1
+
+    def __iter__(self):
+        return self.frames()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "decoded": self.decoded,
+                "grabbed": self.grabbed,
+                "seeks": self.seeks,
+                "read_time": self.read_time,
+                "decoded_per_second": self.decoded / self.read_time if self.read_time else 0.0,
+                "source_frames_per_second": (self.decoded + self.grabbed) / self.read_time if self.read_time else 0.0
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Video decode: {stats['decoded']} frames decoded, {stats['grabbed']} skipped by grab, {stats['seeks']} seeks "
+            f"in {stats['read_time']:.2f} seconds ({stats['decoded_per_second']:.1f} sampled frames/s, "
+            f"{stats['source_frames_per_second']:.1f} source frames/s)"
+        )
+
+    def close(self):
+        with self._lock:
+            self.cap.release()
+
+def extract_frames_from_video(video_path, output_path, target_fps, image_format='png'):
+    source = VideoFrameSource(video_path, target_fps, image_format=image_format)
+    os.makedirs(output_path, exist_ok=True)
 
-        frame_index += 1
+    for name, frame in source:
+        cv2.imwrite(os.path.join(output_path, name), frame)
 
-    cap.release()
\ No newline at end of file
+    source.log_stats()
+    source.close()
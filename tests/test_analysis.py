@@ -0,0 +1,51 @@
+import numpy as np
+
+from pipeline.process import analysis
+from pipeline.process.analysis import analyze_detections
+
+class _FrameStore:
+    def __init__(self, frames):
+        self.frames = frames
+
+    def get(self, image_name, reduction=1):
+        return self.frames.get(image_name)
+
+def _track(track_id, names):
+    bbox = {"x1": 0, "y1": 0, "x2": 40, "y2": 40}
+    return {"id": track_id, "images": [
+        {"name": name, "track_bbox": bbox, "detections": [{"class": "tag", "bbox": {"x1": 5, "y1": 5, "x2": 25, "y2": 25}}]}
+        for name in names
+    ]}
+
+def _fake_ocr(monkeypatch, texts):
+    # OCR reading each crop as the text of its pixel value, recording the batches it was given
+    batches = []
+
+    def perform_batch_ocr(images, ocr_model=None, correct=True):
+        batches.append(len(images))
+        return [texts[int(image[0, 0, 0])] for image in images]
+
+    monkeypatch.setattr(analysis, "perform_batch_ocr", perform_batch_ocr)
+    return batches
+
+def test_identical_crops_are_recognized_once(monkeypatch):
+    batches = _fake_ocr(monkeypatch, {0: "1785", 1: "1120"})
+    frames = {"0000.png": np.zeros((40, 40, 3), np.uint8), "0001.png": np.zeros((40, 40, 3), np.uint8), "0002.png": np.ones((40, 40, 3), np.uint8)}
+    results = [_track("1", ["0000.png", "0001.png"]), _track("2", ["0002.png"])]
+
+    analyze_detections(results, "unused", frame_store=_FrameStore(frames), vote_margin=0, rfid_index=None)
+
+    assert batches == [2]
+    assert results[0]["result"]["eartag_number"] == "1785"
+    assert results[1]["result"]["eartag_number"] == "1120"
+
+def test_voting_stops_once_a_number_leads_by_the_margin(monkeypatch):
+    batches = _fake_ocr(monkeypatch, {idx: "1785" for idx in range(6)})
+    frames = {f"{idx:04d}.png": np.full((40, 40, 3), idx, np.uint8) for idx in range(6)}
+    results = [_track("1", list(frames))]
+
+    analyze_detections(results, "unused", frame_store=_FrameStore(frames), vote_margin=2, rfid_index=None)
+
+    # Rounds stop as soon as two votes agree, instead of reading all six crops
+    assert sum(batches) == max(2, analysis.key_frame_ocr_round_size)
+    assert results[0]["result"]["eartag_number"] == "1785"
@@ -0,0 +1,19 @@
+from pipeline.bench.runner import compare_reports
+
+def _stage(items_per_second, latency=0.01, peak_rss_mb=100.0):
+    return {"items_per_second": items_per_second, "latency_p50": latency, "latency_p95": latency, "peak_rss_mb": peak_rss_mb}
+
+def test_changes_within_tolerance_are_not_regressions():
+    baseline = {"stages": {"tracking": _stage(100)}}
+    report = {"stages": {"tracking": _stage(95, latency=0.0105), "detection": _stage(1)}}
+
+    assert compare_reports(report, baseline) == []
+
+def test_slower_and_bigger_stages_are_regressions():
+    baseline = {"stages": {"tracking": _stage(100), "analysis": _stage(10)}}
+    report = {"stages": {"tracking": _stage(80), "analysis": _stage(10, latency=0.02, peak_rss_mb=200.0)}}
+
+    regressions = compare_reports(report, baseline)
+    assert len(regressions) == 4
+    assert regressions[0].startswith("tracking: throughput")
+    assert all(regression.startswith("analysis") for regression in regressions[1:])
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from pipeline.process.checkpoint import StageCheckpoint, file_hash, fingerprint
+from pipeline.process import main as main_module
+from pipeline.process.main import _run_resumable_stage
+
+def _track(track_id):
+    return {"id": track_id, "images": [{"name": "0000.png", "track_bbox": {"x1": 0, "y1": 0, "x2": 10, "y2": 10}, "detections": []}]}
+
+def test_fingerprint_depends_on_every_input():
+    assert fingerprint(a=1, b="x") == fingerprint(b="x", a=1)
+    assert fingerprint(a=1, b="x") != fingerprint(a=2, b="x")
+    assert fingerprint(a=1) != fingerprint(a=1, b=None)
+
+def test_file_hash_follows_the_file_contents(tmp_path):
+    path = tmp_path / "weights.pt"
+    assert file_hash(str(path)) is None
+
+    path.write_bytes(b"one")
+    first = file_hash(str(path))
+    path.write_bytes(b"two!")
+    assert file_hash(str(path)) != first
+
+def test_results_are_only_loaded_for_the_same_fingerprint(tmp_path):
+    results = [_track("1"), _track("2")]
+    StageCheckpoint(str(tmp_path), "detection", "a").save(results)
+
+    assert StageCheckpoint(str(tmp_path), "detection", "a").load() == results
+    assert StageCheckpoint(str(tmp_path), "detection", "b").load() is None
+    assert StageCheckpoint(str(tmp_path), "detection", "a", enabled=False).load() is None
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    checkpoint = StageCheckpoint(str(tmp_path), "detection", "a")
+    checkpoint.save([_track("1")])
+    with open(checkpoint.path, "r+b") as f:
+        f.truncate(20)
+
+    assert checkpoint.load() is None
+
+def test_partial_progress_is_kept_until_the_stage_is_saved(tmp_path):
+    checkpoint = StageCheckpoint(str(tmp_path), "analysis", "a")
+    checkpoint.save_partial([_track("1")])
+    checkpoint.save_partial([_track("2"), _track("3")])
+
+    assert list(checkpoint.load_partial()) == ["1", "2", "3"]
+    checkpoint.save([_track("1"), _track("2"), _track("3")])
+    assert not os.path.exists(checkpoint.partial_dir)
+    assert checkpoint.load_partial() == {}
+
+def test_partial_progress_of_other_inputs_is_discarded(tmp_path):
+    StageCheckpoint(str(tmp_path), "analysis", "a").save_partial([_track("1")])
+    checkpoint = StageCheckpoint(str(tmp_path), "analysis", "b")
+
+    assert checkpoint.load_partial() == {}
+    assert not os.path.exists(checkpoint.partial_dir)
+
+def test_disabled_checkpoint_keeps_saved_progress(tmp_path):
+    StageCheckpoint(str(tmp_path), "analysis", "a").save_partial([_track("1")])
+    disabled = StageCheckpoint(str(tmp_path), "analysis", "a", enabled=False)
+
+    assert disabled.load_partial() == {}
+    disabled.save([_track("1")])
+    assert list(StageCheckpoint(str(tmp_path), "analysis", "a").load_partial()) == ["1"]
+
+def test_interrupted_stage_resumes_with_the_remaining_tracks(tmp_path, monkeypatch):
+    monkeypatch.setitem(main_module.config, "checkpoint_interval_tracks", 2)
+    objs = [_track(str(idx)) for idx in range(5)]
+    processed = []
+
+    def interrupted_stage(chunk):
+        if chunk[0]["id"] == "2":
+            raise KeyboardInterrupt
+        processed.extend(obj["id"] for obj in chunk)
+
+    checkpoint = StageCheckpoint(str(tmp_path), "analysis", "a")
+    with pytest.raises(KeyboardInterrupt):
+        _run_resumable_stage(checkpoint, objs, interrupted_stage)
+    assert processed == ["0", "1"]
+
+    resumed = []
+    results = _run_resumable_stage(checkpoint, objs, lambda chunk: processed.extend(obj["id"] for obj in chunk), on_resume=resumed.extend)
+
+    assert processed == ["0", "1", "2", "3", "4"]
+    assert [obj["id"] for obj in resumed] == ["0", "1"]
+    assert [obj["id"] for obj in results] == ["0", "1", "2", "3", "4"]
+    assert StageCheckpoint(str(tmp_path), "analysis", "a").load() == results
@@ -0,0 +1,92 @@
+import pytest
+
+from pipeline.utils import config as config_module
+from pipeline.utils.config import apply_overrides, get_config, validate_config
+
+@pytest.fixture(autouse=True)
+def fresh_config(monkeypatch, tmp_path):
+    # Every test reads its own config file instead of the shared one
+    path = tmp_path / "config.yaml"
+    path.write_text("capture_dir: captures\ncapture_fps: 1\npipeline_mode: sequential\nframe_cache_budget_mb: 1024\n")
+    monkeypatch.setenv(config_module.CONFIG_PATH_ENV, str(path))
+    monkeypatch.setattr(config_module, "_config", None)
+    return path
+
+def test_config_is_loaded_once():
+    config = get_config()
+
+    assert config["capture_fps"] == 1
+    assert get_config() is config
+
+def test_environment_overrides_known_keys(monkeypatch):
+    monkeypatch.setenv("CATTLE_MONITOR_PIPELINE_MODE", "pipelined")
+    monkeypatch.setenv("CATTLE_MONITOR_FRAME_CACHE_BUDGET_MB", "256")
+    monkeypatch.setenv("CATTLE_MONITOR_NOT_A_KEY", "1")
+
+    config = get_config()
+    assert config["pipeline_mode"] == "pipelined"
+    assert config["frame_cache_budget_mb"] == 256
+    assert "not_a_key" not in config
+
+@pytest.mark.parametrize("secret", ["0x1f", "yes", "null", "a: b", "[key]", "007", " padded "])
+def test_secrets_are_taken_verbatim(monkeypatch, fresh_config, secret):
+    fresh_config.write_text(fresh_config.read_text() + "processing_server_authkey: null\n")
+    monkeypatch.setenv("CATTLE_MONITOR_PROCESSING_SERVER_AUTHKEY", secret)
+
+    assert get_config()["processing_server_authkey"] == secret
+    assert apply_overrides([f"processing_server_authkey={secret}"])["processing_server_authkey"] == secret
+
+def test_invalid_environment_override_is_rejected(monkeypatch):
+    monkeypatch.setenv("CATTLE_MONITOR_PIPELINE_MODE", "parallel")
+
+    with pytest.raises(ValueError, match="pipeline_mode"):
+        get_config()
+
+@pytest.mark.parametrize("value", [0, -1, "1", True])
+def test_capture_fps_must_be_positive(value):
+    with pytest.raises(ValueError, match="capture_fps"):
+        validate_config({"capture_fps": value})
+
+@pytest.mark.parametrize("key, value", [
+    ("capture_fps", 0.5),
+    ("frame_cache_budget_mb", 0),
+    ("tracking_decode_reduction", "auto"),
+    ("detection_batch_size", 8),
+    ("eartag_registry_path", None)
+])
+def test_valid_values_pass(key, value):
+    validate_config({key: value})
+
+@pytest.mark.parametrize("key, value", [
+    ("detection_batch_size", 0),
+    ("tracking_decode_reduction", 3),
+    ("metrics_enabled", "yes"),
+    ("frame_prefetch_depth", -1)
+])
+def test_invalid_values_are_rejected(key, value):
+    with pytest.raises(ValueError, match=key):
+        validate_config({key: value})
+
+def test_overrides_are_parsed_as_yaml():
+    config = apply_overrides(["pipeline_mode=pipelined", "frame_cache_budget_mb=512", "capture_dir="])
+
+    assert config is get_config()
+    assert config["pipeline_mode"] == "pipelined"
+    assert config["frame_cache_budget_mb"] == 512
+    assert config["capture_dir"] is None
+
+def test_invalid_override_leaves_config_unchanged():
+    with pytest.raises(ValueError, match="capture_fps"):
+        apply_overrides(["pipeline_mode=pipelined", "capture_fps=0"])
+
+    assert get_config()["pipeline_mode"] == "sequential"
+
+def test_override_needs_a_value():
+    with pytest.raises(ValueError, match="KEY=VALUE"):
+        apply_overrides(["pipeline_mode"])
+
+def test_unknown_override_key_is_added_with_a_warning(caplog):
+    config = apply_overrides(["new_setting=true"])
+
+    assert config["new_setting"] is True
+    assert "unknown config key: new_setting" in caplog.text
@@ -0,0 +1,163 @@
+import numpy as np
+
+from pipeline.utils.frame_store import FrameStore, FramePrefetcher
+
+# Session reader over in-memory frames that counts reads, decoding reduced frames itself only when asked to
+class _Reader:
+    memory_mapped = False
+
+    def __init__(self, names, reduced_decode=False):
+        self.frames = {name: np.full((40, 60, 3), idx, dtype=np.uint8) for idx, name in enumerate(names)}
+        self.reduced_decode = reduced_decode
+        self.reads = []
+
+    def names(self):
+        return list(self.frames)
+
+    def decodes_reduced(self, name):
+        return self.reduced_decode
+
+    def read(self, name, reduction=1):
+        self.reads.append((name, reduction))
+        frame = self.frames.get(name)
+        if frame is None or reduction == 1:
+            return frame
+        return frame[::reduction, ::reduction]
+
+def test_reduced_read_without_reduced_decode_caches_only_the_full_frame():
+    reader = _Reader(["0000.png"])
+    store = FrameStore(reader, budget_mb=1)
+
+    reduced = store.get("0000.png", 2)
+    assert reduced.shape == (20, 30, 3)
+    assert reader.reads == [("0000.png", 1)]
+    assert store.stats()["misses"] == 1
+    assert store.stats()["cached_frames"] == 1
+
+    # Detection crops from the full frame cached by the reduced read
+    assert store.get("0000.png") is reader.frames["0000.png"]
+    assert store.get("0000.png", 2).shape == (20, 30, 3)
+    assert reader.reads == [("0000.png", 1)]
+    assert store.stats()["cached_frames"] == 1
+
+def test_reduced_decode_caches_the_reduced_frame():
+    reader = _Reader(["0000.jpg"], reduced_decode=True)
+    store = FrameStore(reader, budget_mb=1)
+
+    store.get("0000.jpg", 2)
+    store.get("0000.jpg", 2)
+    assert reader.reads == [("0000.jpg", 2)]
+    assert store.stats()["hits"] == 1
+    assert store.stats()["misses"] == 1
+
+def test_reduced_frame_is_cached_when_the_full_frame_exceeds_the_budget():
+    reader = _Reader(["0000.png"])
+    store = FrameStore(reader, budget_mb=5000 / (1024 * 1024))
+
+    store.get("0000.png", 2)
+    store.get("0000.png", 2)
+    assert reader.reads == [("0000.png", 1)]
+    assert store.stats()["cached_frames"] == 1
+
+def _frame_mb():
+    return 40 * 60 * 3 / (1024 * 1024)
+
+def test_repeated_reads_are_served_from_the_cache():
+    reader = _Reader(["0000.png", "0001.png"])
+    store = FrameStore(reader, budget_mb=1)
+
+    frame = store.get("0000.png")
+    assert store.get("0000.png") is frame
+    assert store.get("missing.png") is None
+    assert reader.reads == [("0000.png", 1), ("missing.png", 1)]
+    assert store.stats()["hits"] == 1
+    assert store.stats()["misses"] == 2
+
+def test_least_recently_used_frames_are_evicted_over_budget():
+    reader = _Reader(["0000.png", "0001.png", "0002.png"])
+    store = FrameStore(reader, budget_mb=2.5 * _frame_mb())
+
+    store.get("0000.png")
+    store.get("0001.png")
+    store.get("0000.png")
+    store.get("0002.png")
+
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["cached_frames"] == 2
+    store.get("0000.png")
+    store.get("0001.png")
+    assert reader.reads == [("0000.png", 1), ("0001.png", 1), ("0002.png", 1), ("0001.png", 1)]
+
+def test_pinned_frames_are_kept_until_the_last_unpin():
+    reader = _Reader(["0000.png", "0001.png", "0002.png"])
+    store = FrameStore(reader, budget_mb=1.5 * _frame_mb())
+
+    store.get("0000.png")
+    assert store.pin("0000.png")
+    assert store.pin("0000.png")
+    assert not store.pin("0001.png")
+
+    store.get("0001.png")
+    store.get("0002.png")
+    store.unpin("0000.png")
+    assert store.get("0000.png") is reader.frames["0000.png"]
+    assert store.stats()["pinned_frames"] == 1
+
+    store.unpin("0000.png")
+    assert store.stats()["pinned_frames"] == 0
+    assert reader.reads.count(("0000.png", 1)) == 1
+
+def test_memory_mapped_frames_do_not_take_up_the_budget():
+    reader = _Reader(["0000.raw"])
+    reader.memory_mapped = True
+    store = FrameStore(reader, budget_mb=1)
+
+    store.get("0000.raw")
+    store.get("0000.raw", 2)
+    assert store.stats()["cached_frames"] == 1
+    assert reader.reads == [("0000.raw", 1), ("0000.raw", 2)]
+
+def test_get_region_clamps_the_bbox_to_the_frame():
+    reader = _Reader(["0000.png"])
+    store = FrameStore(reader, budget_mb=1)
+
+    region = store.get_region("0000.png", {"x1": -5, "y1": 30, "x2": 70, "y2": 50})
+    assert region.shape == (10, 60, 3)
+    assert store.get_region("missing.png", {"x1": 0, "y1": 0, "x2": 1, "y2": 1}) is None
+
+def test_prefetcher_yields_frames_in_order():
+    names = [f"{idx:04d}.png" for idx in range(10)]
+    reader = _Reader(names)
+    store = FrameStore(reader, budget_mb=1)
+
+    prefetcher = FramePrefetcher(store, names + ["missing.png"], depth=3, workers=2)
+    frames = list(prefetcher)
+
+    assert [name for name, _ in frames] == names + ["missing.png"]
+    assert all(frame is reader.frames[name] for name, frame in frames[:-1])
+    assert frames[-1][1] is None
+    assert prefetcher.stats()["frames"] == 11
+
+def test_prefetcher_window_shrinks_to_the_budget():
+    names = [f"{idx:04d}.png" for idx in range(4)]
+    store = FrameStore(_Reader(names), budget_mb=1)
+
+    prefetcher = FramePrefetcher(store, names, depth=8, budget_mb=2.5 * _frame_mb())
+    assert prefetcher.stats()["window"] == 8
+    list(prefetcher)
+    assert prefetcher.stats()["window"] == 2
+
+def test_prefetcher_reads_sequential_sources_on_one_thread():
+    reader = _Reader(["0000.png"])
+    reader.sequential_reads = True
+
+    assert FramePrefetcher(FrameStore(reader, budget_mb=1), ["0000.png"], workers=4).workers == 1
+
+def test_prefetcher_stops_reading_ahead_when_the_caller_stops():
+    names = [f"{idx:04d}.png" for idx in range(50)]
+    reader = _Reader(names)
+
+    for name, _ in FramePrefetcher(FrameStore(reader, budget_mb=0), names, depth=4, workers=1):
+        if name == names[1]:
+            break
+    assert len(reader.reads) <= 6
@@ -0,0 +1,64 @@
+import numpy as np
+
+from pipeline.process.analysis import analyze_detections
+from pipeline.process.visualization import GalleryCrops, max_row_images, render_track_gallery
+
+# Frame store over in-memory frames that records which frames were read
+class _FrameStore:
+    def __init__(self, names):
+        self.frames = {name: np.full((60, 80, 3), idx, dtype=np.uint8) for idx, name in enumerate(names)}
+        self.reads = []
+
+    def get(self, image_name, reduction=1):
+        self.reads.append(image_name)
+        return self.frames.get(image_name)
+
+    def get_region(self, image_name, bbox):
+        frame = self.get(image_name)
+        return frame[max(0, bbox["y1"]):bbox["y2"], max(0, bbox["x1"]):bbox["x2"]] if frame is not None else None
+
+def _track(names, detection_names):
+    bbox = {"x1": 10, "y1": 10, "x2": 50, "y2": 50}
+    images = []
+    for name in names:
+        image_entry = {"name": name, "track_bbox": bbox}
+        if name in detection_names:
+            image_entry["detections"] = [{"class": "muzzle", "bbox": {"x1": 0, "y1": 0, "x2": 20, "y2": 20}}]
+        images.append(image_entry)
+    return {"id": "1", "images": images}
+
+def test_track_row_comes_from_the_first_frames_of_the_track(tmp_path):
+    names = [f"{idx:04d}.png" for idx in range(max_row_images + 5)]
+    frame_store = _FrameStore(names)
+    gallery_crops = GalleryCrops()
+
+    analyze_detections([_track(names, {names[3], names[-1]})], str(tmp_path), frame_store=frame_store, vote_margin=0, gallery_crops=gallery_crops)
+
+    track_crops = gallery_crops.get("1")
+    assert [image_name for image_name, _ in track_crops["track"]] == names[:max_row_images]
+    assert track_crops["totals"]["muzzle"] == 2
+
+    # Frames past the track row are only read for their detections
+    assert frame_store.reads == names[:max_row_images] + [names[-1]]
+
+def test_missing_frames_are_skipped_in_the_track_row(tmp_path):
+    names = [f"{idx:04d}.png" for idx in range(max_row_images + 2)]
+    frame_store = _FrameStore(names)
+    del frame_store.frames[names[0]]
+    gallery_crops = GalleryCrops()
+
+    analyze_detections([_track(names, set())], str(tmp_path), frame_store=frame_store, vote_margin=0, gallery_crops=gallery_crops)
+
+    assert [image_name for image_name, _ in gallery_crops.get("1")["track"]] == names[1:max_row_images + 1]
+
+def test_gallery_renders_from_kept_crops_without_reading_frames(tmp_path):
+    names = [f"{idx:04d}.png" for idx in range(3)]
+    frame_store = _FrameStore(names)
+    gallery_crops = GalleryCrops()
+    obj = _track(names, {names[1]})
+    analyze_detections([obj], str(tmp_path), frame_store=frame_store, vote_margin=0, gallery_crops=gallery_crops)
+    frame_store.reads.clear()
+
+    gallery = render_track_gallery(obj, frame_store, gallery_crops)
+    assert gallery.ndim == 3
+    assert frame_store.reads == []
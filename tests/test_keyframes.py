@@ -0,0 +1,61 @@
+import numpy as np
+import cv2
+
+from pipeline.process.keyframes import frame_features, score_frames, select_key_frames
+
+_bbox = {"x1": 20, "y1": 20, "x2": 100, "y2": 100}
+
+def _textured(seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 255, size=(120, 120, 3), dtype=np.uint8)
+
+class _FrameStore:
+    def __init__(self, frames):
+        self.frames = frames
+
+    def get(self, image_name, reduction=1):
+        return self.frames.get(image_name)
+
+def _track(frames, bboxes=None):
+    bboxes = bboxes or {}
+    return {"id": "1", "images": [{"name": name, "track_bbox": bboxes.get(name, _bbox)} for name in frames]}
+
+def test_sharp_frames_are_selected_in_frame_order():
+    sharp = _textured(0)
+    blurred = cv2.GaussianBlur(sharp, (15, 15), 5)
+    frames = {"0000.png": blurred, "0001.png": sharp, "0002.png": blurred, "0003.png": sharp}
+    obj = _track(frames)
+
+    selected = select_key_frames(obj, _FrameStore(frames), top_k=2)
+    assert [entry["name"] for entry in selected] == ["0001.png", "0003.png"]
+    assert all("key_frame_score" in entry for entry in obj["images"])
+
+def test_missing_and_empty_frames_are_never_selected():
+    frames = {"0000.png": _textured(0), "0001.png": _textured(1), "0002.png": _textured(2)}
+    obj = _track(list(frames) + ["0003.png"], {"0002.png": {"x1": 50, "y1": 50, "x2": 50, "y2": 90}})
+
+    selected = select_key_frames(obj, _FrameStore(frames), top_k=3)
+    assert [entry["name"] for entry in selected] == ["0000.png", "0001.png"]
+
+def test_short_tracks_and_disabled_selection_keep_every_frame():
+    frames = {"0000.png": _textured(0), "0001.png": _textured(1)}
+    obj = _track(frames)
+
+    assert select_key_frames(obj, _FrameStore(frames), top_k=2) is obj["images"]
+    assert select_key_frames(obj, _FrameStore(frames), top_k=0) is obj["images"]
+
+def test_truncated_faces_are_penalized():
+    crop = _textured(0)[20:100, 20:100]
+    inside = frame_features(crop, _bbox, (120, 120))
+    truncated = frame_features(crop, {"x1": 0, "y1": 20, "x2": 80, "y2": 100}, (120, 120))
+
+    assert not inside["truncated"] and truncated["truncated"]
+    inside_score, truncated_score = score_frames([inside, truncated])
+    assert inside_score > truncated_score
+
+def test_mirrored_faces_score_full_symmetry():
+    half = _textured(0)[:, :60]
+    symmetric = np.concatenate([half, half[:, ::-1]], axis=1)
+
+    assert frame_features(symmetric, _bbox, (240, 240))["symmetry"] > 0.99
+    assert frame_features(_textured(1), _bbox, (240, 240))["symmetry"] < 0.1
@@ -0,0 +1,39 @@
+import random
+
+from pipeline.process.matcher import EartagMatcher
+
+def _matcher():
+    return EartagMatcher(["1785", "1120", "1032", "2292", "321", "0042"])
+
+def test_exact_and_confused_digits_match():
+    matcher = _matcher()
+
+    assert matcher.match("1785") == "1785"
+    # 3 and 8 are confused by OCR, so the read costs half a mismatch
+    assert matcher.match("1735", max_distance=0.5) == "1785"
+    assert matcher.match("1735", max_distance=0.4) == "1735"
+
+def test_values_of_other_lengths_never_match():
+    matcher = _matcher()
+
+    assert matcher.match("17850", max_distance=10) == "17850"
+    assert matcher.match("", max_distance=10) == ""
+
+def test_characters_outside_latin1_never_match_each_other():
+    matcher = EartagMatcher(["12一"])
+
+    assert matcher.match("12二", max_distance=0.5) == "12二"
+    assert matcher.match("12一", max_distance=0) == "12一"
+
+def test_batch_matches_single_queries():
+    rng = random.Random(0)
+    registry = [f"{rng.randrange(10 ** 6):0{rng.choice([4, 5, 6])}d}" for _ in range(500)]
+    detected_values = [
+        "".join(char if rng.random() > 0.25 else rng.choice("0123456789") for char in rng.choice(registry))
+        for _ in range(300)
+    ] + ["", "12", "abcd"]
+    matcher = EartagMatcher(registry)
+
+    # Small distances prune candidates through the inverted lists, large ones compare every candidate
+    for max_distance in (0, 0.5, 1, 2, 3, 10):
+        assert matcher.match_batch(detected_values, max_distance) == [matcher.match(value, max_distance) for value in detected_values]
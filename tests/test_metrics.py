@@ -0,0 +1,58 @@
+import json
+
+from pipeline.utils.metrics import Histogram, MetricsRegistry
+
+def test_disabled_registry_records_nothing(tmp_path):
+    registry = MetricsRegistry(enabled=False)
+    registry.inc("frames_total")
+    registry.observe("decode_seconds", 0.01)
+    with registry.timed("decode_seconds"):
+        pass
+    registry.save_snapshot(str(tmp_path / "metrics.json"))
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == {}
+    assert snapshot["histograms"] == {}
+    assert not (tmp_path / "metrics.json").exists()
+
+def test_counters_and_histograms_are_recorded(tmp_path):
+    registry = MetricsRegistry(enabled=True)
+    registry.inc("frames_total")
+    registry.inc("frames_total", 2)
+    registry.observe("match_seconds", 0.002, count=3)
+    with registry.timed("decode_seconds"):
+        pass
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == {"frames_total": 3}
+    assert snapshot["histograms"]["match_seconds"]["count"] == 3
+    assert snapshot["histograms"]["decode_seconds"]["count"] == 1
+
+    registry.save_snapshot(str(tmp_path / "metrics.json"))
+    assert json.loads((tmp_path / "metrics.json").read_text())["counters"] == {"frames_total": 3}
+
+    registry.reset()
+    assert registry.snapshot()["counters"] == {}
+
+def test_histogram_quantiles_are_bucket_bounds():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["p50"] == 0.1
+    assert snapshot["p95"] == 5.0
+    assert snapshot["buckets"] == {"0.1": 2, "1.0": 1, "+Inf": 1}
+
+def test_prometheus_buckets_are_cumulative():
+    registry = MetricsRegistry(enabled=True)
+    registry.inc("frames_total")
+    for value in (0.0001, 0.2, 20.0):
+        registry.observe("decode_seconds", value)
+
+    lines = registry.to_prometheus().splitlines()
+    assert "cattle_monitor_frames_total 1" in lines
+    assert 'cattle_monitor_decode_seconds_bucket{le="0.0005"} 1' in lines
+    assert 'cattle_monitor_decode_seconds_bucket{le="0.25"} 2' in lines
+    assert 'cattle_monitor_decode_seconds_bucket{le="+Inf"} 3' in lines
+    assert "cattle_monitor_decode_seconds_count 3" in lines
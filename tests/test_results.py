@@ -0,0 +1,126 @@
+import io
+
+import numpy as np
+import pytest
+
+from pipeline.process.results import ResultStore
+
+def _results():
+    return [
+        {
+            "id": "1",
+            "images": [
+                {"name": "0001.png", "track_bbox": {"x1": -4, "y1": 10, "x2": 120, "y2": 140}, "key_frame_score": 0.75},
+                {
+                    "name": "0002.png",
+                    "track_bbox": {"x1": 0, "y1": 12, "x2": 118, "y2": 142},
+                    "detections": [
+                        {"class": "tag", "bbox": {"x1": 5, "y1": 6, "x2": 40, "y2": 30}, "confidence": 0.8, "eartag_number": "1785"},
+                        {"class": "muzzle", "bbox": {"x1": 30, "y1": 60, "x2": 90, "y2": 110}, "confidence": 0.6, "is_muzzle_clean": True}
+                    ]
+                }
+            ],
+            "result": {"eartag_number": "1785", "is_muzzle_clean": True}
+        },
+        {
+            "id": "2",
+            "images": [
+                {"name": "0002.png", "track_bbox": {"x1": 200, "y1": 20, "x2": 300, "y2": 150}, "detections": []}
+            ],
+            "result": {"eartag_number": None, "is_muzzle_clean": None}
+        },
+        {"id": "3", "images": [{"name": "0003.png", "track_bbox": {"x1": 1, "y1": 2, "x2": 3, "y2": 4}}]}
+    ]
+
+def _round_trip(results):
+    buffer = io.BytesIO()
+    ResultStore.from_results(results).save(buffer)
+    buffer.seek(0)
+    with np.load(buffer, allow_pickle=False) as data:
+        return ResultStore(data).to_results()
+
+def test_round_trip_restores_nested_results():
+    results = _results()
+    restored = _round_trip(results)
+
+    # Confidences are stored at single precision
+    for obj in restored:
+        for image_entry in obj["images"]:
+            for detection in image_entry.get("detections", []):
+                detection["confidence"] = pytest.approx(detection["confidence"], abs=1e-6)
+    assert restored == results
+
+def test_confidences_are_single_precision():
+    restored = _round_trip(_results())
+
+    confidence = restored[0]["images"][1]["detections"][0]["confidence"]
+    assert confidence == float(np.float32(0.8))
+    assert confidence != 0.8
+
+def test_strings_are_stored_once():
+    store = ResultStore.from_results(_results())
+
+    assert store.frame_names.tolist() == ["0001.png", "0002.png", "0003.png"]
+    assert store.texts.tolist() == ["1785"]
+    assert store.image_frame.tolist() == [0, 1, 1, 2]
+    assert store.det_image.tolist() == [1, 1]
+
+def test_round_trip_of_empty_results():
+    assert _round_trip([]) == []
+
+def test_load_reads_saved_columns():
+    buffer = io.BytesIO()
+    store = ResultStore.from_results(_results())
+    store.save(buffer)
+    buffer.seek(0)
+
+    loaded = ResultStore.load(buffer)
+    assert loaded.stats() == store.stats()
+    assert loaded.stats()["detections"] == 2
+
+def test_class_mask_is_case_insensitive():
+    results = _results()
+    results[0]["images"][1]["detections"][1]["class"] = "Muzzle"
+    store = ResultStore.from_results(results)
+
+    assert store.class_mask("muzzle").tolist() == [False, True]
+    assert store.class_mask("TAG", "muzzle").tolist() == [True, True]
+
+def _random_results(rng, frame_height, frame_width):
+    def bbox(limit_x, limit_y):
+        # Boxes reach past every border and some are inverted, but none end before the origin
+        x1, x2 = rng.integers(-20, limit_x), rng.integers(0, limit_x + 20)
+        y1, y2 = rng.integers(-20, limit_y), rng.integers(0, limit_y + 20)
+        return {"x1": int(x1), "y1": int(y1), "x2": int(x2), "y2": int(y2)}
+
+    images = []
+    for idx in range(50):
+        detections = [{"class": "tag", "bbox": bbox(120, 120)} for _ in range(rng.integers(0, 4))]
+        images.append({"name": f"{idx:04d}.png", "track_bbox": bbox(frame_width, frame_height), "detections": detections})
+    return [{"id": "1", "images": images}]
+
+def test_crops_match_nested_slicing():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, size=(90, 160, 3), dtype=np.uint8)
+    results = _random_results(rng, *frame.shape[:2])
+    store = ResultStore.from_results(results)
+
+    for image_row, image_entry in enumerate(results[0]["images"]):
+        bbox = image_entry["track_bbox"]
+        h, w = frame.shape[:2]
+        expected_track_crop = frame[max(0, bbox["y1"]):min(h, bbox["y2"]), max(0, bbox["x1"]):min(w, bbox["x2"])]
+        np.testing.assert_array_equal(store.track_crop(image_row, frame), expected_track_crop)
+
+        detection_crops = store.detection_crops(image_row, frame)
+        assert len(detection_crops) == len(image_entry["detections"])
+        for detection, crop in zip(image_entry["detections"], detection_crops):
+            det_bbox = detection["bbox"]
+            dx1, dy1 = max(0, det_bbox["x1"]), max(0, det_bbox["y1"])
+            expected = expected_track_crop[dy1:max(dy1, det_bbox["y2"]), dx1:max(dx1, det_bbox["x2"])]
+            np.testing.assert_array_equal(crop, expected)
+
+def test_frame_bboxes_are_computed_once_per_frame_size():
+    store = ResultStore.from_results(_results())
+
+    assert store.frame_bboxes((480, 640, 3)) is store.frame_bboxes((480, 640))
+    assert store.frame_bboxes((480, 640)) is not store.frame_bboxes((240, 320))
@@ -0,0 +1,53 @@
+from pipeline.process.rfid_index import RfidIndex
+
+def _index(window=2):
+    return RfidIndex({
+        "0001": ["A"],
+        "0005": ["B", "B"],
+        "0010": ["C", "A"],
+        "0020": [],
+        "check": ["X"]
+    }, window=window)
+
+def test_readings_of_non_numeric_captures_are_ignored():
+    index = _index()
+
+    assert len(index) == 4
+    assert index.tags == ["A", "B", "C"]
+
+def test_window_is_inclusive_on_both_sides():
+    index = _index()
+
+    assert index.tags_between(3, 3) == ["A", "B"]
+    assert index.tags_between(7, 7) == ["B"]
+    assert index.tags_between(8, 8) == ["A", "C"]
+    assert index.tags_between(12, 12) == ["A", "C"]
+    assert index.tags_between(13, 13) == []
+
+def test_window_spans_the_given_range():
+    index = _index()
+
+    assert index.tags_between(4, 9) == ["A", "B", "C"]
+    assert index.tags_between(100, 200) == []
+
+def test_zero_window_only_covers_the_range():
+    index = _index(window=0)
+
+    assert index.tags_between(1, 4) == ["A"]
+    assert index.tags_between(2, 4) == []
+
+def test_tags_near_frames():
+    index = _index()
+
+    assert index.tags_near(["0002.png", "0003.png"]) == ["A", "B"]
+    assert index.tags_near(["mock.png"]) == []
+
+def test_matcher_is_shared_by_tracks_with_the_same_tags():
+    index = _index()
+
+    # A track on capture 3 and one on captures 2 and 3 both see A at capture 1 and B at capture 5
+    matcher = index.matcher_for(["0003.png"])
+    assert matcher is index.matcher_for(["0002.png", "0003.png"])
+    assert matcher.values == ["A", "B"]
+    assert index.matcher_for(["0002.png"]) is not matcher
+    assert index.matcher_for(["0050.png"]) is None
@@ -0,0 +1,34 @@
+import json
+
+from pipeline.utils.rfid_log import LEGACY_RFID_READINGS_FILENAME, RFID_LOG_FILENAME, RfidLogWriter, load_rfid_readings
+
+def test_appended_readings_load_by_capture(tmp_path):
+    writer = RfidLogWriter(str(tmp_path / RFID_LOG_FILENAME), flush_interval=2, fsync_interval=4)
+    writer.append("0000", ["A"], timestamp=1.0)
+    writer.append("0001", [])
+    writer.append("0002", ["B", "A"])
+    writer.close()
+
+    assert load_rfid_readings(str(tmp_path)) == {"0000": ["A"], "0001": [], "0002": ["B", "A"]}
+
+def test_records_are_flushed_every_flush_interval(tmp_path):
+    path = tmp_path / RFID_LOG_FILENAME
+    writer = RfidLogWriter(str(path), flush_interval=2, fsync_interval=4)
+
+    writer.append("0000", ["A"])
+    assert path.read_text() == ""
+    writer.append("0001", ["B"])
+    assert len(path.read_text().splitlines()) == 2
+    writer.close()
+
+def test_truncated_last_record_is_skipped(tmp_path):
+    path = tmp_path / RFID_LOG_FILENAME
+    path.write_text(json.dumps({"capture_id": "0000", "timestamp": 1.0, "readings": ["A"]}) + "\n" + '{"capture_id": "00')
+
+    assert load_rfid_readings(str(tmp_path)) == {"0000": ["A"]}
+
+def test_legacy_readings_file_is_read_without_a_log(tmp_path):
+    (tmp_path / LEGACY_RFID_READINGS_FILENAME).write_text(json.dumps({"0000": ["A"]}))
+
+    assert load_rfid_readings(str(tmp_path)) == {"0000": ["A"]}
+    assert load_rfid_readings(str(tmp_path / "missing")) == {}
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from pipeline.utils.session_store import (
+    ChunkedSessionReader, DirectorySessionReader, FRAMES_DIRNAME, FRAMES_INDEX_FILENAME, open_session, open_session_writer
+)
+
+def _frames(count):
+    rng = np.random.default_rng(0)
+    return {f"{idx:04d}.png": rng.integers(0, 255, size=(24, 32, 3), dtype=np.uint8) for idx in range(count)}
+
+def _write(session_dir, storage, image_format, frames, frames_per_chunk=None):
+    writer = open_session_writer(str(session_dir), storage, image_format)
+    if frames_per_chunk is not None:
+        writer.frames_per_chunk = frames_per_chunk
+    for name, frame in frames.items():
+        writer.write(name, frame)
+    writer.close()
+
+@pytest.mark.parametrize("image_format", ["raw", "png"])
+def test_chunked_frames_read_back_exactly(tmp_path, image_format):
+    frames = _frames(7)
+    _write(tmp_path, "chunked", image_format, frames, frames_per_chunk=3)
+
+    reader = open_session(str(tmp_path))
+    assert isinstance(reader, ChunkedSessionReader)
+    assert reader.memory_mapped == (image_format == "raw")
+    assert reader.names() == sorted(frames)
+    assert len(os.listdir(tmp_path / FRAMES_DIRNAME)) == 4
+    for name, frame in frames.items():
+        np.testing.assert_array_equal(reader.read(name), frame)
+    assert reader.read("missing.png") is None
+
+def test_reduced_reads_match_the_frame_size(tmp_path):
+    frames = _frames(1)
+    _write(tmp_path, "chunked", "jpg", frames)
+
+    reader = open_session(str(tmp_path))
+    assert reader.decodes_reduced("0000.png")
+    assert reader.read("0000.png", 2).shape == (12, 16, 3)
+
+def test_unreadable_index_records_and_truncated_frames_are_skipped(tmp_path):
+    frames = _frames(3)
+    _write(tmp_path, "chunked", "raw", frames)
+
+    frames_dir = tmp_path / FRAMES_DIRNAME
+    with open(frames_dir / FRAMES_INDEX_FILENAME, "a") as f:
+        f.write('{"name": "0003.p')
+    with open(frames_dir / "chunk_00000.bin", "r+b") as f:
+        f.truncate(os.path.getsize(frames_dir / "chunk_00000.bin") - 1)
+
+    reader = open_session(str(tmp_path))
+    assert reader.names() == sorted(frames)
+    assert reader.read("0001.png") is not None
+    assert reader.read("0002.png") is None
+
+def test_frames_are_readable_while_the_session_is_written(tmp_path):
+    frames = _frames(2)
+    writer = open_session_writer(str(tmp_path), "chunked", "raw")
+    reader = writer.open_reader()
+
+    writer.write("0000.png", frames["0000.png"])
+    np.testing.assert_array_equal(reader.read("0000.png"), frames["0000.png"])
+    assert reader.names() == ["0000.png"]
+    writer.close()
+
+def test_sessions_without_chunks_read_the_image_directory(tmp_path):
+    frames = _frames(2)
+    _write(tmp_path, "files", "png", frames)
+
+    reader = open_session(str(tmp_path))
+    assert isinstance(reader, DirectorySessionReader)
+    assert reader.names() == sorted(frames)
+    np.testing.assert_array_equal(reader.read("0001.png"), frames["0001.png"])
+
+def test_raw_frames_need_chunked_storage(tmp_path):
+    with pytest.raises(ValueError, match="chunked"):
+        open_session_writer(str(tmp_path), "files", "raw")
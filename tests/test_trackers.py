@@ -0,0 +1,71 @@
+from pipeline.process.trackers import ByteTracker
+
+def _detection(left, top, width=50, height=60, confidence=0.9):
+    return ([left, top, width, height], confidence, 0)
+
+def _confirmed(tracks):
+    return {track.track_id: track for track in tracks if track.is_confirmed()}
+
+def test_track_is_confirmed_after_two_hits():
+    tracker = ByteTracker(max_age=3)
+
+    assert _confirmed(tracker.update([_detection(100, 100)])) == {}
+    tracks = _confirmed(tracker.update([_detection(102, 101)]))
+
+    assert list(tracks) == ["1"]
+    left, top, right, bottom = tracks["1"].to_ltrb()
+    assert abs(left - 102) < 5 and abs(top - 101) < 5 and abs(right - 152) < 5 and abs(bottom - 161) < 5
+
+def test_detections_are_associated_by_overlap():
+    tracker = ByteTracker(max_age=3)
+    for step in range(4):
+        tracks = tracker.update([_detection(100 + 2 * step, 100), _detection(400 - 2 * step, 300)])
+
+    assert sorted(_confirmed(tracks)) == ["1", "2"]
+    positions = {track_id: track.to_ltrb()[0] for track_id, track in _confirmed(tracks).items()}
+    assert abs(positions["1"] - 106) < 5
+    assert abs(positions["2"] - 394) < 5
+
+def test_confirmed_track_coasts_through_missed_frames():
+    tracker = ByteTracker(max_age=3)
+    tracker.update([_detection(100, 100)])
+    tracker.update([_detection(100, 100)])
+
+    for _ in range(3):
+        assert list(_confirmed(tracker.update([]))) == ["1"]
+
+    # The same track picks the object up again within max_age
+    assert list(_confirmed(tracker.update([_detection(100, 100)]))) == ["1"]
+
+def test_confirmed_track_is_dropped_after_max_age():
+    tracker = ByteTracker(max_age=3)
+    tracker.update([_detection(100, 100)])
+    tracker.update([_detection(100, 100)])
+
+    for _ in range(3):
+        tracker.update([])
+    assert tracker.update([]) == []
+
+    # An object reappearing afterwards starts a new track
+    tracker.update([_detection(100, 100)])
+    assert list(_confirmed(tracker.update([_detection(100, 100)]))) == ["2"]
+
+def test_tentative_track_is_dropped_when_missed():
+    tracker = ByteTracker(max_age=3)
+    tracker.update([_detection(100, 100)])
+
+    assert tracker.update([]) == []
+
+def test_low_confidence_detection_keeps_recent_track_alive():
+    tracker = ByteTracker(max_age=3)
+    tracker.update([_detection(100, 100)])
+    tracker.update([_detection(100, 100)])
+
+    tracks = tracker.update([_detection(100, 100, confidence=0.3)])
+    assert list(_confirmed(tracks)) == ["1"]
+    assert tracks[0].time_since_update == 0
+
+def test_low_confidence_detection_does_not_start_a_track():
+    tracker = ByteTracker(max_age=3)
+
+    assert tracker.update([_detection(100, 100, confidence=0.3)]) == []
@@ -0,0 +1,46 @@
+import numpy as np
+
+from pipeline.process.tracking import MotionGate
+
+def _frame(value=100, patch=None):
+    frame = np.full((120, 160, 3), value, dtype=np.uint8)
+    if patch is not None:
+        y, x, size = patch
+        frame[y:y + size, x:x + size] = 255
+    return frame
+
+def test_first_frame_is_never_skipped():
+    assert not MotionGate().is_unchanged(_frame())
+
+def test_static_frames_are_skipped_until_max_skip():
+    gate = MotionGate(max_skip=3)
+    gate.is_unchanged(_frame())
+
+    assert [gate.is_unchanged(_frame()) for _ in range(5)] == [True, True, True, False, True]
+
+def test_noise_below_the_pixel_threshold_is_ignored():
+    gate = MotionGate()
+    gate.is_unchanged(_frame(100))
+
+    assert gate.is_unchanged(_frame(108))
+
+def test_moving_object_is_a_change():
+    gate = MotionGate()
+    gate.is_unchanged(_frame(patch=(10, 10, 30)))
+
+    assert not gate.is_unchanged(_frame(patch=(10, 60, 30)))
+    assert gate.is_unchanged(_frame(patch=(10, 60, 30)))
+
+def test_slow_drift_adds_up_against_the_reference():
+    gate = MotionGate(max_skip=100)
+    gate.is_unchanged(_frame(100))
+
+    # Each step is below the pixel threshold, but the difference to the last processed frame grows
+    unchanged = [gate.is_unchanged(_frame(100 + 5 * step)) for step in range(1, 5)]
+    assert unchanged == [True, True, False, True]
+
+def test_frame_size_change_resets_the_reference():
+    gate = MotionGate()
+    gate.is_unchanged(_frame())
+
+    assert not gate.is_unchanged(np.full((60, 160, 3), 100, dtype=np.uint8))
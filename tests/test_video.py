@@ -0,0 +1,48 @@
+import numpy as np
+import cv2
+import pytest
+
+from pipeline.utils.video import VideoFrameSource
+
+_fps = 10
+_frame_count = 23
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("video") / "session.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), _fps, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("No video encoder available")
+
+    # The brightness of each frame encodes its index, so reads can be checked against the source frame
+    for idx in range(_frame_count):
+        writer.write(np.full((48, 64, 3), idx * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+def _frame_index(frame):
+    return int(round(frame.mean() / 10))
+
+def test_names_cover_every_sampled_frame(video_path):
+    source = VideoFrameSource(video_path, target_fps=5)
+
+    names = source.names()
+    assert names == [f"{idx:04d}.png" for idx in range(12)]
+    assert names == [name for name, _ in source.frames()]
+
+def test_names_stop_at_end_time(video_path):
+    source = VideoFrameSource(video_path, target_fps=5, start_time=0.4, end_time=1.5)
+
+    names = source.names()
+    assert len(names) == 6
+    assert [_frame_index(frame) for _, frame in source.frames()] == [4, 6, 8, 10, 12, 14]
+
+def test_read_by_name_in_any_order(video_path):
+    source = VideoFrameSource(video_path, target_fps=5)
+
+    assert _frame_index(source.read("0005.png")) == 10
+    assert _frame_index(source.read("0001.png")) == 2
+    assert _frame_index(source.read("0011.png")) == 22
+    assert source.read("0012.png") is None
+    assert source.read("check.png") is None
+    assert source.stats()["seeks"] == 1